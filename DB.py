@@ -0,0 +1,357 @@
+"""
+Storage backends.
+
+Every module talks to the database through DB-API connections that behave
+like mysql.connector's: `%s` placeholders, `cursor(dictionary=True)`,
+`start_transaction()`, and the MySQL functions the app uses (CURDATE(),
+CURTIME(), GET_LOCK(), RELEASE_LOCK(), RELEASE_ALL_LOCKS()).
+
+    BMC_DB_BACKEND=mysql    (default) MySQL server, see BMC_DB_* variables
+    BMC_DB_BACKEND=sqlite   embedded SQLite file at BMC_SQLITE_PATH
+
+SQLite runs in WAL mode with pragmas tuned for read-heavy kiosk/department
+deployments; initialise it with `BMC_DB_BACKEND=sqlite python migrations.py up`.
+"""
+import datetime
+import os
+import re
+import sqlite3
+import threading
+
+# =========================================================
+# BASE
+# =========================================================
+class Backend:
+    """
+    Creates connections and papers over dialect differences.
+    """
+    name = None
+
+    def connect(self):
+        raise NotImplementedError
+
+    def ping(self, conn):
+        raise NotImplementedError
+
+    def ddl(self, statement):
+        """
+        Rewrite a (MySQL-flavoured) DDL statement for this backend.
+        """
+        return statement
+
+    def has_index(self, cursor, table, index):
+        raise NotImplementedError
+
+    def has_column(self, cursor, table, column):
+        raise NotImplementedError
+
+    def upsert_add(self, table, keys, counters):
+        """
+        INSERT of one row into `table` that, when a row with the same `keys`
+        exists, adds the new `counters` values to it instead.
+        """
+        raise NotImplementedError
+
+    def _insert(self, table, keys, counters):
+        columns = list(keys) + list(counters)
+        return f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join(['%s'] * len(columns))})"
+
+
+# =========================================================
+# MYSQL
+# =========================================================
+class MySQLBackend(Backend):
+    name = "mysql"
+
+    def __init__(self, host=None, user=None, password=None, database=None):
+        self.config = {
+            "host": host or os.environ.get("BMC_DB_HOST", "localhost"),
+            "user": user or os.environ.get("BMC_DB_USER", "root"),
+            "password": password or os.environ.get("BMC_DB_PASSWORD", "nidhi06yash"),   # <-- adjust if needed
+            "database": database or os.environ.get("BMC_DB_NAME", "bookmyclassroom"),
+        }
+
+    def connect(self):
+        import mysql.connector   # only needed when MySQL is the configured backend
+        return mysql.connector.connect(**self.config)
+
+    def ping(self, conn):
+        conn.ping(reconnect=False)
+
+    def has_index(self, cursor, table, index):
+        cursor.execute("""
+            SELECT 1 FROM information_schema.statistics
+            WHERE table_schema = DATABASE() AND table_name = %s AND index_name = %s LIMIT 1
+        """, (table, index))
+        return bool(cursor.fetchall())
+
+    def has_column(self, cursor, table, column):
+        cursor.execute("""
+            SELECT 1 FROM information_schema.columns
+            WHERE table_schema = DATABASE() AND table_name = %s AND column_name = %s
+        """, (table, column))
+        return bool(cursor.fetchall())
+
+    def upsert_add(self, table, keys, counters):
+        updates = ", ".join(f"{c} = {c} + VALUES({c})" for c in counters)
+        return f"{self._insert(table, keys, counters)} ON DUPLICATE KEY UPDATE {updates}"
+
+
+# =========================================================
+# SQLITE
+# =========================================================
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",          # readers never block the writer and vice versa
+    "synchronous": "NORMAL",        # safe with WAL, avoids an fsync per commit
+    "busy_timeout": 5000,           # ms to wait for the write lock instead of failing
+    "foreign_keys": "ON",
+    "temp_store": "MEMORY",
+    "cache_size": -65536,           # 64 MiB page cache per connection
+    "mmap_size": 268435456,         # 256 MiB memory-mapped reads
+}
+
+
+def _adapt_time(value):
+    return value.strftime("%H:%M:%S")
+
+
+def _adapt_timedelta(value):
+    # Zero-padded so TIME values compare correctly as text
+    seconds = int(value.total_seconds())
+    return f"{seconds // 3600:02d}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}"
+
+
+def _convert_time(value):
+    # mysql.connector returns TIME columns as timedelta; do the same here
+    h, m, s = (int(float(p)) for p in value.decode().split(":"))
+    return datetime.timedelta(hours=h, minutes=m, seconds=s)
+
+
+sqlite3.register_adapter(datetime.date, lambda d: d.isoformat())
+sqlite3.register_adapter(datetime.datetime, lambda d: d.isoformat(" ", "seconds"))
+sqlite3.register_adapter(datetime.time, _adapt_time)
+sqlite3.register_adapter(datetime.timedelta, _adapt_timedelta)
+sqlite3.register_converter("DATE", lambda v: datetime.date.fromisoformat(v.decode()))
+sqlite3.register_converter("TIME", _convert_time)
+
+
+class _NamedLocks:
+    """
+    In-process emulation of MySQL user-level locks (GET_LOCK and friends).
+    Locks are owned by a connection and re-entrant for it, like MySQL 5.7+.
+    Cross-process writers are still serialised by SQLite's own write lock.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._owners = {}   # lock name -> (owner id, depth)
+
+    def get(self, owner, name, timeout):
+        deadline = None if timeout is None or timeout < 0 else timeout
+        with self._cond:
+            ok = self._cond.wait_for(
+                lambda: self._owners.get(name, (owner,))[0] == owner, deadline)
+            if not ok:
+                return 0
+            _, depth = self._owners.get(name, (owner, 0))
+            self._owners[name] = (owner, depth + 1)
+            return 1
+
+    def release(self, owner, name):
+        with self._cond:
+            holder = self._owners.get(name)
+            if holder is None:
+                return None
+            if holder[0] != owner:
+                return 0
+            if holder[1] > 1:
+                self._owners[name] = (owner, holder[1] - 1)
+            else:
+                del self._owners[name]
+                self._cond.notify_all()
+            return 1
+
+    def release_all(self, owner):
+        with self._cond:
+            mine = [name for name, (holder, _) in self._owners.items() if holder == owner]
+            released = sum(self._owners.pop(name)[1] for name in mine)
+            if mine:
+                self._cond.notify_all()
+            return released
+
+
+_named_locks = _NamedLocks()
+_PLACEHOLDER = re.compile(r"%s")
+
+
+class SQLiteCursor:
+    """
+    sqlite3 cursor with mysql.connector's calling conventions.
+    """
+
+    def __init__(self, raw, dictionary=False):
+        self._raw = raw
+        self._dictionary = dictionary
+
+    def _row(self, row):
+        if row is None or not self._dictionary:
+            return row
+        return dict(zip(self.column_names, row))
+
+    def execute(self, operation, params=()):
+        self._raw.execute(_PLACEHOLDER.sub("?", operation), tuple(params or ()))
+        return self
+
+    def executemany(self, operation, seq_params):
+        self._raw.executemany(_PLACEHOLDER.sub("?", operation), [tuple(p) for p in seq_params])
+        return self
+
+    def fetchone(self):
+        return self._row(self._raw.fetchone())
+
+    def fetchmany(self, size=1):
+        return [self._row(r) for r in self._raw.fetchmany(size)]
+
+    def fetchall(self):
+        return [self._row(r) for r in self._raw.fetchall()]
+
+    def __iter__(self):
+        return (self._row(r) for r in self._raw)
+
+    @property
+    def column_names(self):
+        return tuple(d[0] for d in self._raw.description or ())
+
+    @property
+    def description(self):
+        return self._raw.description
+
+    @property
+    def lastrowid(self):
+        return self._raw.lastrowid
+
+    @property
+    def rowcount(self):
+        return self._raw.rowcount
+
+    def close(self):
+        self._raw.close()
+
+
+class SQLiteConnection:
+    """
+    sqlite3 connection with the parts of mysql.connector's API the app uses.
+    """
+
+    def __init__(self, raw):
+        self._raw = raw
+        owner = id(self)
+        raw.create_function("CURDATE", 0, lambda: datetime.date.today().isoformat())
+        raw.create_function("CURTIME", 0, lambda: datetime.datetime.now().strftime("%H:%M:%S"))
+        raw.create_function("GET_LOCK", 2, lambda name, timeout: _named_locks.get(owner, name, timeout))
+        raw.create_function("RELEASE_LOCK", 1, lambda name: _named_locks.release(owner, name))
+        raw.create_function("RELEASE_ALL_LOCKS", 0, lambda: _named_locks.release_all(owner))
+
+    def cursor(self, dictionary=False, **_):
+        return SQLiteCursor(self._raw.cursor(), dictionary=dictionary)
+
+    def start_transaction(self):
+        # IMMEDIATE takes the write lock up front, so check-then-insert cannot race
+        if not self._raw.in_transaction:
+            self._raw.execute("BEGIN IMMEDIATE")
+
+    @property
+    def in_transaction(self):
+        return self._raw.in_transaction
+
+    def commit(self):
+        self._raw.commit()
+
+    def rollback(self):
+        self._raw.rollback()
+
+    def is_connected(self):
+        try:
+            self._raw.execute("SELECT 1")
+            return True
+        except sqlite3.Error:
+            return False
+
+    def close(self):
+        _named_locks.release_all(id(self))
+        self._raw.close()
+
+
+class SQLiteBackend(Backend):
+    name = "sqlite"
+
+    def __init__(self, path=None, pragmas=None):
+        self.path = path or os.environ.get("BMC_SQLITE_PATH", "bookmyclassroom.db")
+        self.pragmas = dict(SQLITE_PRAGMAS, **(pragmas or {}))
+
+    def connect(self):
+        raw = sqlite3.connect(
+            self.path,
+            detect_types=sqlite3.PARSE_DECLTYPES,
+            isolation_level="IMMEDIATE",      # implicit write transactions grab the lock up front
+            check_same_thread=False,          # pooled connections move between threads (one at a time)
+            timeout=self.pragmas["busy_timeout"] / 1000,
+        )
+        for pragma, value in self.pragmas.items():
+            raw.execute(f"PRAGMA {pragma} = {value}")
+        return SQLiteConnection(raw)
+
+    def ping(self, conn):
+        if not conn.is_connected():
+            raise sqlite3.OperationalError("SQLite connection is closed.")
+
+    def ddl(self, statement):
+        return re.sub(r"\bINT\s+AUTO_INCREMENT\s+PRIMARY\s+KEY\b",
+                      "INTEGER PRIMARY KEY AUTOINCREMENT", statement, flags=re.IGNORECASE)
+
+    def has_index(self, cursor, table, index):
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'index' AND tbl_name = %s AND name = %s",
+                       (table, index))
+        return bool(cursor.fetchall())
+
+    def has_column(self, cursor, table, column):
+        cursor.execute(f"PRAGMA table_info({table})")
+        return any(row[1] == column for row in cursor.fetchall())
+
+    def upsert_add(self, table, keys, counters):
+        updates = ", ".join(f"{c} = {c} + excluded.{c}" for c in counters)
+        return f"{self._insert(table, keys, counters)} ON CONFLICT ({', '.join(keys)}) DO UPDATE SET {updates}"
+
+
+# =========================================================
+# SELECTION
+# =========================================================
+BACKENDS = {"mysql": MySQLBackend, "sqlite": SQLiteBackend}
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_backend():
+    """
+    Process-wide backend chosen by BMC_DB_BACKEND (mysql or sqlite).
+    """
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                name = os.environ.get("BMC_DB_BACKEND", "mysql").lower()
+                if name not in BACKENDS:
+                    raise ValueError(f"Unknown BMC_DB_BACKEND {name!r}; use one of {sorted(BACKENDS)}.")
+                _backend = BACKENDS[name]()
+    return _backend
+
+
+def set_backend(backend):
+    """
+    Use a specific backend instance (scripts, benchmarks, local experiments).
+    Call before the first connection is borrowed from the pool.
+    """
+    global _backend
+    with _backend_lock:
+        _backend = backend
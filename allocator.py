@@ -0,0 +1,306 @@
+"""
+Batch room allocation for timetable requests.
+
+    python allocator.py sessions.csv            # plan only: print the report
+    python allocator.py sessions.csv --commit   # plan and book everything placed
+
+A request is one course session, repeated by a weekly rule:
+
+    session,username,first_date,start,end,weeks,interval,weekdays,size,features,kind,description
+    DBMS-A,teacher01,2025-09-01,10:00,11:00,15,1,Mon Wed,60,projector;computers,classroom,DBMS lecture
+
+Rooms are assigned by greedy interval colouring over every occurrence:
+requests are taken most-constrained first (fewest suitable rooms, then the
+largest classes and the longest total time), and each gets the smallest
+suitable room (room index, best fit) that is free on every one of its dates,
+counting existing bookings and the requests already placed. A request no
+single room can take is split across rooms date by date. Everything placed
+is then booked with reserve_batch(): one transaction, all locks held.
+"""
+import argparse
+import csv
+import datetime
+import io
+import re
+import sys
+
+import catalog
+import recurring
+import repository
+from availability import DaySlots, to_seconds
+from booking import BookingBusy, reserve_batch
+from slot_finder import fetch_busy
+
+CSV_COLUMNS = ["session", "username", "first_date", "start", "end", "weeks", "interval", "weekdays",
+               "size", "features", "kind", "description"]
+WEEKDAYS = {"mon": 0, "tue": 1, "wed": 2, "thu": 3, "fri": 4, "sat": 5, "sun": 6}
+
+
+# =========================================================
+# REQUESTS
+# =========================================================
+def occurrence_dates(request):
+    """
+    Dates of a request: its explicit `dates`, or the weekly rule from
+    first_date (weeks, interval, weekdays), or first_date alone.
+    """
+    if request.get("dates"):
+        return recurring.custom(request["dates"])
+    if request.get("weeks"):
+        return recurring.weekly(request["first_date"], weeks=int(request["weeks"]),
+                                interval=int(request.get("interval") or 1), weekdays=request.get("weekdays"))
+    return [request["first_date"]]
+
+
+def _weekdays(text):
+    days = []
+    for token in re.split(r"[\s;|/]+", (text or "").strip().lower()):
+        if token:
+            days.append(int(token) if token.isdigit() else WEEKDAYS[token[:3]])
+    return days or None
+
+
+def parse_csv(data):
+    """
+    Parse a requests CSV (see the module docstring; only session, username,
+    first_date, start and end are required). `data` may be text, bytes or a
+    file object. Returns (requests, errors as (line number, message)).
+    """
+    if isinstance(data, bytes):
+        data = data.decode("utf-8-sig")
+    if isinstance(data, str):
+        data = io.StringIO(data)
+    reader = csv.DictReader(data)
+    missing = [c for c in CSV_COLUMNS[:5] if c not in (reader.fieldnames or [])]
+    if missing:
+        raise ValueError(f"CSV is missing column(s): {', '.join(missing)}")
+
+    requests, errors = [], []
+    for line, row in enumerate(reader, start=2):
+        row = {k: (v or "").strip() for k, v in row.items() if k}
+        try:
+            requests.append({
+                "session": row["session"] or f"line {line}",
+                "username": row["username"],
+                "first_date": datetime.date.fromisoformat(row["first_date"]),
+                "start": datetime.time.fromisoformat(row["start"]),
+                "end": datetime.time.fromisoformat(row["end"]),
+                "weeks": int(row["weeks"]) if row.get("weeks") else None,
+                "interval": int(row["interval"]) if row.get("interval") else 1,
+                "weekdays": _weekdays(row.get("weekdays")),
+                "size": int(row["size"]) if row.get("size") else 0,
+                "features": [f for f in re.split(r"[;,]", row.get("features", "")) if f.strip()],
+                "kind": row.get("kind") or "classroom",
+                "description": row.get("description", ""),
+            })
+        except (ValueError, KeyError) as e:
+            errors.append((line, f"Could not parse row: {e}"))
+    return requests, errors
+
+
+# =========================================================
+# PLANNING
+# =========================================================
+def _candidates(request):
+    """
+    (name, floor, capacity) of every resource that can host the request, best fit first.
+    Labs carry no capacity or features, so any lab fits a lab request without feature needs.
+    """
+    if request.get("kind", "classroom") == "classroom":
+        return catalog.room_index().matches(request.get("size") or 0, request.get("features") or ())
+    if request.get("features"):
+        return []
+    return [(name, floor, None) for name, floor in catalog.labs()]
+
+
+def _invalid(request, dates, today):
+    if request.get("kind", "classroom") not in repository.KINDS:
+        return f"Kind must be one of {', '.join(repository.KINDS)}."
+    if not request.get("username"):
+        return "No teacher given."
+    if request["start"] >= request["end"]:
+        return "End time must be after start time."
+    if not dates:
+        return "The rule yields no dates."
+    if dates[0] < today:
+        return "Date cannot be in the past."
+    return None
+
+
+def plan(requests, allow_split=True, today=None, busy=None):
+    """
+    Assign rooms to every request. Returns (rows, report):
+
+      rows    booking dicts for reserve_batch(), each with the index of its request
+      report  one dict per request (input order): session, username, kind,
+              occurrences, placed, rooms, status (Placed / Split / Partial /
+              Unplaced / Invalid), reason, wasted_seats
+
+    `busy` ({(kind, name, date): [(start_s, end_s)]}) defaults to every
+    existing booking in the requests' date span, read in one query.
+    """
+    today = today or datetime.date.today()
+    report, work = [], []
+    for i, request in enumerate(requests):
+        entry = {"session": request.get("session", i + 1), "username": request.get("username"),
+                 "kind": request.get("kind", "classroom"), "occurrences": 0, "placed": 0, "rooms": "",
+                 "status": "Invalid", "reason": "", "wasted_seats": 0}
+        report.append(entry)
+        try:
+            dates = occurrence_dates(request)
+        except ValueError as e:
+            entry["reason"] = str(e)
+            continue
+        entry["occurrences"] = len(dates)
+        entry["reason"] = _invalid(request, dates, today) or ""
+        if entry["reason"]:
+            continue
+        candidates = _candidates(request)
+        if not candidates:
+            entry.update(status="Unplaced", reason="No room has enough seats and all required features.")
+            continue
+        work.append((i, dates, candidates))
+    if not work:
+        return [], report
+
+    if busy is None:
+        busy = fetch_busy(min(w[1][0] for w in work), max(w[1][-1] for w in work),
+                           {requests[i].get("kind", "classroom") for i, _, _ in work})
+    taken = {}
+
+    def slots(kind, name, date):
+        key = (kind, name, date)
+        if key not in taken:
+            taken[key] = DaySlots()
+            for start, end in busy.get(key, ()):
+                taken[key].add(start, end, None)
+        return taken[key]
+
+    # Most constrained first: fewest suitable rooms, then biggest class, then most hours
+    def difficulty(item):
+        i, dates, candidates = item
+        request = requests[i]
+        hours = len(dates) * (to_seconds(request["end"]) - to_seconds(request["start"]))
+        return len(candidates), -(request.get("size") or 0), -hours, to_seconds(request["start"])
+
+    rows = []
+    for i, dates, candidates in sorted(work, key=difficulty):
+        request, entry = requests[i], report[i]
+        kind = entry["kind"]
+        start, end = to_seconds(request["start"]), to_seconds(request["end"])
+
+        # Best fit: the smallest room free on every date; else room by room per date
+        whole = next((room for room in candidates
+                      if not any(slots(kind, room[0], d).overlaps(start, end) for d in dates)), None)
+        if whole is not None:
+            assigned = [(d, whole) for d in dates]
+        elif allow_split:
+            assigned = []
+            for d in dates:
+                room = next((r for r in candidates if not slots(kind, r[0], d).overlaps(start, end)), None)
+                if room is not None:
+                    assigned.append((d, room))
+        else:
+            assigned = []
+
+        placed = []
+        for d, (name, floor, capacity) in assigned:
+            slots(kind, name, d).add(start, end, None)
+            placed.append({
+                "request": i, "kind": kind, "username": request["username"], "name": name, "floor": floor,
+                "date": d, "start": request["start"], "end": request["end"],
+                "duration": str(datetime.timedelta(seconds=end - start)),
+                "description": request.get("description") or request.get("session") or "",
+                "capacity": capacity,
+            })
+        rows += placed
+        _summarise(entry, request, placed)
+        if not placed:
+            entry["reason"] = "No suitable room is free at that time."
+    return rows, report
+
+
+def _summarise(entry, request, placed_rows):
+    rooms = sorted({row["name"] for row in placed_rows})
+    entry["placed"] = len(placed_rows)
+    entry["rooms"] = ", ".join(rooms)
+    entry["wasted_seats"] = sum(row["capacity"] - (request.get("size") or 0)
+                                for row in placed_rows if row["capacity"] is not None)
+    if not placed_rows:
+        entry["status"] = "Unplaced"
+    elif len(placed_rows) < entry["occurrences"]:
+        entry["status"] = "Partial"
+    else:
+        entry["status"] = "Split" if len(rooms) > 1 else "Placed"
+
+
+def summary(report):
+    """
+    Totals over a plan's report: placement rate and wasted seats.
+    """
+    occurrences = sum(e["occurrences"] for e in report if e["status"] != "Invalid")
+    placed = sum(e["placed"] for e in report)
+    statuses = {}
+    for e in report:
+        statuses[e["status"]] = statuses.get(e["status"], 0) + 1
+    return {"requests": len(report), **statuses, "occurrences": occurrences, "placed": placed,
+            "placement_rate": round(placed / occurrences, 4) if occurrences else None,
+            "wasted_seats": sum(e["wasted_seats"] for e in report),
+            "wasted_seats_per_booking": round(sum(e["wasted_seats"] for e in report) / placed, 2) if placed else None}
+
+
+# =========================================================
+# COMMIT
+# =========================================================
+def commit(conn, requests, rows, report):
+    """
+    Book every planned row in one transaction (reserve_batch). Rows taken by
+    someone else since planning are dropped from the report. Returns the
+    number of bookings made. Raises BookingBusy if the rooms stay locked.
+    """
+    results = reserve_batch(conn, rows)
+    booked = {}
+    for row, (booking_id, reason) in zip(rows, results):
+        if reason is None:
+            booked.setdefault(row["request"], []).append(row)
+    for i, entry in enumerate(report):
+        if entry["status"] in ("Placed", "Split", "Partial"):
+            lost = entry["placed"] - len(booked.get(i, ()))
+            _summarise(entry, requests[i], booked.get(i, []))
+            if lost:
+                entry["reason"] = f"{lost} date(s) were booked by someone else meanwhile."
+    return sum(len(r) for r in booked.values())
+
+
+def allocate(conn, requests, allow_split=True, dry_run=False):
+    """
+    Plan and (unless dry_run) book a batch of requests; returns the report.
+    """
+    rows, report = plan(requests, allow_split)
+    if not dry_run and rows:
+        commit(conn, requests, rows, report)
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Assign rooms to a batch of timetable requests.")
+    parser.add_argument("path", help="requests CSV")
+    parser.add_argument("--commit", action="store_true", help="book the placed sessions (default: plan only)")
+    parser.add_argument("--no-split", action="store_true", help="never split a session across rooms")
+    args = parser.parse_args()
+
+    with open(args.path, "rb") as f:
+        requests, errors = parse_csv(f.read())
+    for line, message in errors:
+        print(f"line {line}: {message}", file=sys.stderr)
+    conn = repository.connect()
+    try:
+        report = allocate(conn, requests, allow_split=not args.no_split, dry_run=not args.commit)
+    except BookingBusy as e:
+        sys.exit(str(e))
+    finally:
+        conn.close()
+    for entry in report:
+        print(f"{entry['status']:<9} {entry['session']}: {entry['placed']}/{entry['occurrences']} "
+              f"in {entry['rooms'] or '-'} {entry['reason']}")
+    print(summary(report))
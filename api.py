@@ -0,0 +1,463 @@
+"""
+Headless JSON API for timetable integrations and digital signage.
+
+    python api.py --port 8080                # BMC_DB_BACKEND=sqlite works for local testing
+
+Endpoints (JSON in, JSON out):
+
+    GET  /health
+    POST /v1/availability     many resources x many slots in one call (no login)
+    POST /v1/bookings         book one or many slots               (Basic auth, faculty login)
+    GET  /v1/history          the caller's booking history, keyset-paged (Basic auth)
+    GET  /v1/signage/day      upcoming bookings for a date / floor, with ETag (no login)
+
+Runs on asyncio.start_server from the standard library. Blocking database
+work runs in worker threads on pooled connections, one fewer at a time than
+the pool holds (AsyncPool), and reuses the same booking, availability and history code as
+the Streamlit app.
+"""
+import argparse
+import asyncio
+import base64
+import datetime
+import hashlib
+import json
+import os
+from urllib.parse import parse_qs, urlsplit
+
+import catalog
+import history
+import perf
+import pool
+import repository
+import versions
+from availability import get_index, to_seconds
+from booking import BookingBusy, BookingConflict, reserve_batch, validate
+
+HOST = os.environ.get("BMC_API_HOST", "127.0.0.1")
+PORT = int(os.environ.get("BMC_API_PORT", "8080"))
+MAX_BODY = 1024 * 1024          # bytes
+MAX_AVAILABILITY_CELLS = 20000  # resources x slots per availability call
+MAX_BOOKINGS = 1000             # slots per booking call
+READ_TIMEOUT = 30.0             # seconds to wait for the next request on a kept-alive connection
+# Paths served by Api.route(); anything else is timed as "api unknown"
+ROUTES = ("/health", "/v1/availability", "/v1/bookings", "/v1/history", "/v1/signage/day")
+
+REASONS = {200: "OK", 207: "Multi-Status", 304: "Not Modified", 400: "Bad Request", 401: "Unauthorized",
+           403: "Forbidden", 404: "Not Found", 405: "Method Not Allowed", 409: "Conflict",
+           413: "Payload Too Large", 500: "Internal Server Error", 503: "Service Unavailable"}
+
+
+class ApiError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+# =========================================================
+# ASYNC POOL
+# =========================================================
+class AsyncPool:
+    """
+    Async facade over the process-wide connection pool: at most `size`
+    blocking calls run at once in worker threads, each on its own pooled
+    connection, so the event loop never blocks on the database.
+
+    `size` defaults to one less than the pool: a worker may briefly borrow a
+    second connection (catalogue or availability-index cache misses), and
+    that borrow must always find a free one instead of waiting on the pool.
+    """
+
+    def __init__(self, size=None):
+        self.size = size or pool.get_pool().size - 1
+        if self.size < 1:
+            raise ValueError("The API needs a connection pool of at least 2 (BMC_POOL_SIZE).")
+        self._slots = asyncio.Semaphore(self.size)
+
+    async def run(self, fn, *args):
+        """
+        await fn(conn, *args) on a pooled connection.
+        """
+        def call():
+            conn = pool.get_connection()
+            try:
+                return fn(conn, *args)
+            finally:
+                conn.close()
+
+        async with self._slots:
+            return await asyncio.to_thread(call)
+
+    async def call(self, fn, *args):
+        """
+        await fn(*args) in a worker thread (for code that borrows its own connections).
+        """
+        async with self._slots:
+            return await asyncio.to_thread(fn, *args)
+
+
+# =========================================================
+# ENCODING / PARSING
+# =========================================================
+def _json_default(value):
+    if isinstance(value, datetime.timedelta):
+        seconds = to_seconds(value)
+        return f"{seconds // 3600:02d}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}"
+    if isinstance(value, (datetime.date, datetime.time)):
+        return value.isoformat()
+    return str(value)
+
+
+def _dumps(data):
+    return json.dumps(data, default=_json_default, separators=(",", ":")).encode()
+
+
+def _date(value, field):
+    try:
+        return datetime.date.fromisoformat(str(value))
+    except ValueError:
+        raise ApiError(400, f"{field}: expected YYYY-MM-DD, got {value!r}") from None
+
+
+def _time(value, field):
+    try:
+        return datetime.time.fromisoformat(str(value))
+    except ValueError:
+        raise ApiError(400, f"{field}: expected HH:MM[:SS], got {value!r}") from None
+
+
+def _text(value, field, default=None):
+    if value is None and default is not None:
+        return default
+    if not isinstance(value, str):
+        raise ApiError(400, f"{field}: expected a string, got {value!r}")
+    return value
+
+
+def _int(value, field):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise ApiError(400, f"{field}: expected an integer, got {value!r}") from None
+
+
+def _list(value, field, item_type):
+    if not isinstance(value, list) or not all(isinstance(item, item_type) for item in value):
+        raise ApiError(400, f"{field}: expected an array of {'objects' if item_type is dict else 'strings'}")
+    return value
+
+
+def _kind(value):
+    if value not in repository.KINDS:
+        raise ApiError(400, f"kind must be one of {', '.join(repository.KINDS)}")
+    return value
+
+
+def _encode_cursor(after):
+    if after is None:
+        return None
+    return base64.urlsafe_b64encode(_dumps(list(after))).decode()
+
+
+def _decode_cursor(token):
+    try:
+        date, start, kind, booking_id = json.loads(base64.urlsafe_b64decode(token.encode()))
+        return datetime.date.fromisoformat(date), _time(start, "after"), kind, int(booking_id)
+    except (ValueError, TypeError):
+        raise ApiError(400, "after: invalid cursor") from None
+
+
+def _resources(kind):
+    """
+    {name: floor} for every classroom or lab in the catalogue.
+    """
+    if kind == "classroom":
+        return {name: floor for name, floor, _, _ in catalog.classrooms()}
+    return dict(catalog.labs())
+
+
+# =========================================================
+# HANDLERS
+# =========================================================
+def _authenticate(conn, headers):
+    auth = headers.get("authorization", "")
+    if not auth.lower().startswith("basic "):
+        raise ApiError(401, "Basic authentication with a faculty login is required.")
+    try:
+        username, _, password = base64.b64decode(auth[6:]).decode().partition(":")
+    except ValueError:
+        raise ApiError(401, "Malformed Authorization header.") from None
+    user = repository.login(conn, username, password)
+    if not user:
+        raise ApiError(401, "Invalid username or password.")
+    return user
+
+
+def availability(body):
+    """
+    {"kind": "classroom", "resources": [...] | "floor": "3rd" | neither (= all),
+     "slots": [{"date", "start", "end"}, ...]}
+    -> {"results": [{"date", "start", "end", "free": [...], "busy": [...]}, ...]}
+
+    Answered from the in-memory availability index: each date is loaded once
+    (one query) however many resources and slots are asked about.
+    """
+    kind = _kind(body.get("kind", "classroom"))
+    known = _resources(kind)
+    names = body.get("resources")
+    if names is None:
+        names = [n for n, floor in known.items() if body.get("floor") in (None, floor)]
+    unknown = [n for n in _list(names, "resources", str) if n not in known]
+    if unknown:
+        raise ApiError(400, f"Unknown {kind}(s): {', '.join(map(str, unknown[:10]))}")
+    slots = _list(body.get("slots") or [], "slots", dict)
+    if len(slots) * max(1, len(names)) > MAX_AVAILABILITY_CELLS:
+        raise ApiError(413, f"At most {MAX_AVAILABILITY_CELLS} resource x slot combinations per call.")
+
+    index = get_index()
+    results = []
+    for i, slot in enumerate(slots):
+        date = _date(slot.get("date"), f"slots[{i}].date")
+        start, end = _time(slot.get("start"), f"slots[{i}].start"), _time(slot.get("end"), f"slots[{i}].end")
+        if start >= end:
+            raise ApiError(400, f"slots[{i}]: end must be after start")
+        free = index.free_resources(kind, names, date, start, end)
+        free_set = set(free)
+        results.append({"date": date, "start": start, "end": end, "free": free,
+                        "busy": [n for n in names if n not in free_set]})
+    return {"kind": kind, "results": results}
+
+
+def book(conn, headers, body):
+    """
+    {"bookings": [{"kind", "name", "date", "start", "end", "description"}, ...], "atomic": false}
+    Booked as the authenticated user with the same validations as the UI;
+    returns one {"status", "booking_id" | "reason"} per row, in order. With
+    "atomic": true the rows are booked all or nothing (409 if any is refused).
+    """
+    user = _authenticate(conn, headers)
+    conn.rollback()   # end the login read; reserve_batch() starts its own transaction
+    rows = _list(body.get("bookings", [body]), "bookings", dict)
+    if not rows or len(rows) > MAX_BOOKINGS:
+        raise ApiError(400, f"Send between 1 and {MAX_BOOKINGS} bookings.")
+
+    report = [{"status": "rejected", "reason": None, "booking_id": None} for _ in rows]
+    valid, slots = [], []
+    today = datetime.date.today()
+    for i, row in enumerate(rows):
+        kind = _kind(row.get("kind", "classroom"))
+        date = _date(row.get("date"), f"bookings[{i}].date")
+        start, end = _time(row.get("start"), f"bookings[{i}].start"), _time(row.get("end"), f"bookings[{i}].end")
+        name = _text(row.get("name"), f"bookings[{i}].name")
+        description = _text(row.get("description"), f"bookings[{i}].description", "")
+        report[i]["reason"] = validate(kind, name, date, start, end, today)
+        if report[i]["reason"] is None:
+            duration = datetime.datetime.combine(today, end) - datetime.datetime.combine(today, start)
+            valid.append(i)
+            slots.append({
+                "kind": kind, "username": user["username"], "name": name,
+                "floor": _resources(kind)[name], "date": date, "start": start, "end": end,
+                "duration": str(duration), "description": description,
+            })
+
+    atomic = bool(body.get("atomic"))
+    if atomic and len(valid) < len(rows):
+        raise ApiError(409, "; ".join(f"bookings[{i}]: {r['reason']}" for i, r in enumerate(report) if r["reason"]))
+    try:
+        # Classrooms and labs together: one transaction, one set of locks
+        results = reserve_batch(conn, slots, atomic=atomic)
+    except BookingConflict as e:
+        raise ApiError(409, str(e)) from None
+    except BookingBusy as e:
+        raise ApiError(503, str(e)) from None
+    for i, (booking_id, reason) in zip(valid, results):
+        if booking_id is not None:
+            report[i].update(status="booked", booking_id=booking_id)
+        else:
+            report[i]["reason"] = reason
+    return {"results": report}
+
+
+def booking_history(conn, headers, query):
+    """
+    ?kinds=classroom,lab&from=&to=&past=1&page_size=25&after=<cursor>
+    Admins may pass username= to read someone else's history.
+    """
+    user = _authenticate(conn, headers)
+    username = user["username"]
+    if query.get("username") and query["username"] != username:
+        if user.get("role") != "admin":
+            raise ApiError(403, "Only admins can read other users' history.")
+        username = query["username"]
+    kinds = [_kind(k) for k in query.get("kinds", "classroom,lab").split(",") if k]
+    past = query.get("past") in ("1", "true", "yes")
+    after = _decode_cursor(query["after"]) if query.get("after") else None
+    rows, next_after = history.history_page(
+        conn, username, kinds=kinds,
+        date_from=_date(query["from"], "from") if query.get("from") else None,
+        date_to=_date(query["to"], "to") if query.get("to") else None,
+        upcoming_only=not past, after=after,
+        page_size=_int(query.get("page_size", 25), "page_size"), descending=past,
+    )
+    return {"rows": rows, "next": _encode_cursor(next_after)}
+
+
+def signage_etag(conn, date, floor):
+    """
+    Cheap validator for the signage feed: the data version of the date, plus
+    the current minute on the day itself (finished bookings drop off the feed
+    as time passes).
+    """
+    version = versions.current(conn, repository.KINDS, date, date)
+    digest = hashlib.sha1(repr((date, floor, version, versions.minute_of(date))).encode()).hexdigest()[:20]
+    return f'W/"{digest}"'
+
+
+def signage_day(conn, date, floor):
+    return {
+        "date": date, "floor": floor,
+        "classrooms": repository.student_bookings(conn, "classroom", date, floor) if floor else [],
+        "labs": repository.student_bookings(conn, "lab", date),
+    }
+
+
+# =========================================================
+# HTTP
+# =========================================================
+class Api:
+    def __init__(self, async_pool=None):
+        self.db = async_pool or AsyncPool()
+
+    async def route(self, method, path, query, headers, body):
+        """
+        Returns (status, extra headers, payload or None).
+        """
+        if path == "/health":
+            return 200, {}, {"status": "ok"}
+
+        if path == "/v1/availability":
+            if method != "POST":
+                raise ApiError(405, "Use POST.")
+            return 200, {}, await self.db.call(availability, self._json(body))
+
+        if path == "/v1/bookings":
+            if method != "POST":
+                raise ApiError(405, "Use POST.")
+            result = await self.db.run(book, headers, self._json(body))
+            ok = all(r["status"] == "booked" for r in result["results"])
+            return (200 if ok else 207), {}, result
+
+        if path == "/v1/history":
+            if method != "GET":
+                raise ApiError(405, "Use GET.")
+            return 200, {}, await self.db.run(booking_history, headers, query)
+
+        if path == "/v1/signage/day":
+            if method != "GET":
+                raise ApiError(405, "Use GET.")
+            date = _date(query.get("date", datetime.date.today().isoformat()), "date")
+            floor = query.get("floor")
+            etag = await self.db.run(signage_etag, date, floor)
+            cache = {"ETag": etag, "Cache-Control": "no-cache"}
+            if etag in [t.strip() for t in headers.get("if-none-match", "").split(",")]:
+                return 304, cache, None
+            return 200, cache, await self.db.run(signage_day, date, floor)
+
+        raise ApiError(404, f"No route for {path}")
+
+    @staticmethod
+    def _json(body):
+        try:
+            data = json.loads(body or b"{}")
+        except ValueError:
+            raise ApiError(400, "Body must be JSON.") from None
+        if not isinstance(data, dict):
+            raise ApiError(400, "Body must be a JSON object.")
+        return data
+
+    async def respond(self, method, target, headers, body):
+        url = urlsplit(target)
+        query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        # Label metrics by route, not by raw path: clients must not be able to add metric keys
+        with perf.page(f"api {url.path if url.path in ROUTES else 'unknown'}"):
+            try:
+                status, extra, payload = await self.route(method, url.path, query, headers, body)
+            except ApiError as e:
+                status, extra, payload = e.status, {}, {"error": str(e)}
+            except Exception as e:   # never drop the connection without an answer
+                status, extra, payload = 500, {}, {"error": f"{type(e).__name__}: {e}"}
+        return status, extra, (b"" if payload is None else _dumps(payload))
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                try:
+                    request_line = await asyncio.wait_for(reader.readline(), READ_TIMEOUT)
+                except asyncio.TimeoutError:
+                    break
+                if not request_line.strip():
+                    break
+                try:
+                    method, target, version = request_line.decode("latin-1").split()
+                except ValueError:
+                    await self._write(writer, 400, {}, _dumps({"error": "Malformed request line."}), False)
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                try:
+                    length = int(headers.get("content-length") or 0)
+                except ValueError:
+                    length = -1
+                if length < 0:
+                    await self._write(writer, 400, {}, _dumps({"error": "Invalid Content-Length."}), False)
+                    break
+                if length > MAX_BODY:
+                    await self._write(writer, 413, {}, _dumps({"error": "Body too large."}), False)
+                    break
+                body = await reader.readexactly(length) if length else b""
+
+                connection = headers.get("connection", "").lower()
+                keep_alive = connection != "close" if version == "HTTP/1.1" else connection == "keep-alive"
+                status, extra, payload = await self.respond(method.upper(), target, headers, body)
+                await self._write(writer, status, extra, payload, keep_alive, head=method.upper() == "HEAD")
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def _write(writer, status, extra, payload, keep_alive, head=False):
+        lines = [f"HTTP/1.1 {status} {REASONS.get(status, '')}"]
+        headers = {"Content-Length": str(len(payload)), "Connection": "keep-alive" if keep_alive else "close"}
+        if status != 304:
+            headers["Content-Type"] = "application/json"
+        headers.update(extra)
+        lines += [f"{k}: {v}" for k, v in headers.items()]
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + (b"" if head or status == 304 else payload))
+        await writer.drain()
+
+
+async def serve(host=HOST, port=PORT):
+    api = Api()
+    server = await asyncio.start_server(api.handle, host, port)
+    print(f"BookMyClassroom API on http://{host}:{port}")
+    async with server:
+        await server.serve_forever()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Headless JSON API for BookMyClassroom.")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,154 @@
+"""
+Archival of past bookings.
+
+    python archive.py                  # archive everything older than the horizon
+    python archive.py --days 90        # custom horizon
+    python archive.py --max-batches 10 # bounded run
+
+Bookings whose date is more than ARCHIVE_AFTER_DAYS in the past move from
+bookings / lab_bookings into bookings_archive / lab_bookings_archive (same
+columns, same ids), so the live tables only hold recent and upcoming rows.
+Rows move in small batches, each its own short transaction that touches
+only the rows it moves by primary key, with a pause in between, so booking
+traffic is never blocked behind the job.
+
+"Show past bookings", reports and rollup rebuilds read both tables.
+"""
+import argparse
+import datetime
+import os
+import threading
+import time
+
+import repository
+import versions
+from availability import get_index
+
+ARCHIVE_AFTER_DAYS = int(os.environ.get("BMC_ARCHIVE_AFTER_DAYS", "180"))
+ARCHIVE_BATCH = int(os.environ.get("BMC_ARCHIVE_BATCH", "1000"))
+ARCHIVE_PAUSE = 0.2          # seconds between batches
+ARCHIVE_INTERVAL = float(os.environ.get("BMC_ARCHIVE_INTERVAL", "3600"))   # background job; 0 disables
+ARCHIVE_LOCK = "bmc:archive"   # only one process archives at a time
+
+COLUMNS = "id, username, {column}, floor, date, start_time, end_time, duration, description"
+
+
+def cutoff_for(days=None, today=None):
+    """
+    First date that stays live: bookings dated before it are archived.
+    """
+    days = ARCHIVE_AFTER_DAYS if days is None else days
+    return (today or datetime.date.today()) - datetime.timedelta(days=max(1, days))
+
+
+def move_sql(kind, count):
+    """
+    (copy, delete) statements moving `count` bookings of `kind`, by id, into the archive.
+    """
+    table, column = repository.RESOURCE_TABLES[kind]
+    columns = COLUMNS.format(column=column)
+    placeholders = ", ".join(["%s"] * count)
+    return (f"""
+        INSERT INTO {repository.ARCHIVE_TABLES[kind]} ({columns})
+        SELECT {columns} FROM {table} WHERE id IN ({placeholders})
+    """, f"DELETE FROM {table} WHERE id IN ({placeholders})")
+
+
+def archive_batch(conn, kind, cutoff, batch_size=ARCHIVE_BATCH):
+    """
+    Move up to `batch_size` of the oldest bookings of `kind` dated before
+    `cutoff` into the archive in one transaction; returns how many moved.
+    """
+    conn.start_transaction()
+    try:
+        candidates = repository.fetch_all(conn, f"archive_candidates_{kind}", (cutoff, batch_size))
+        ids = [booking_id for booking_id, _ in candidates]
+        if ids:
+            copy, delete = move_sql(kind, len(ids))
+            repository.run(conn, f"archive_copy_{kind}", ids, sql=copy, prepare=False)
+            repository.run(conn, f"archive_delete_{kind}", ids, sql=delete, prepare=False)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    versions.bump(conn, [(kind, date) for _, date in candidates])
+    return len(ids)
+
+
+def run(conn, cutoff=None, batch_size=ARCHIVE_BATCH, pause=ARCHIVE_PAUSE, max_batches=None, log=print):
+    """
+    Archive every booking dated before `cutoff` (default: the configured
+    horizon), batch by batch. Returns {kind: rows moved}. Skips the run and
+    returns None if another process holds the archival lock.
+    """
+    cutoff = cutoff or cutoff_for()
+    (acquired,) = repository.fetch_one(conn, "get_lock", (ARCHIVE_LOCK, 0))
+    if acquired != 1:
+        log("Archival already running elsewhere, skipping.")
+        return None
+    moved = dict.fromkeys(repository.KINDS, 0)
+    batches = 0
+    try:
+        for kind in repository.KINDS:
+            while max_batches is None or batches < max_batches:
+                count = archive_batch(conn, kind, cutoff, batch_size)
+                moved[kind] += count
+                batches += 1
+                if count < batch_size:
+                    break
+                time.sleep(pause)
+            log(f"  {kind}: {moved[kind]} bookings archived (before {cutoff})")
+    finally:
+        repository.fetch_one(conn, "release_lock", (ARCHIVE_LOCK,))
+    # Archived days are in the past; drop them from the index if a page ever loaded one
+    if any(moved.values()):
+        get_index().invalidate()
+    return moved
+
+
+# =========================================================
+# BACKGROUND JOB
+# =========================================================
+_job = None
+_job_lock = threading.Lock()
+
+
+def _loop(interval):
+    while True:
+        conn = repository.connect()
+        try:
+            run(conn, log=lambda _: None)
+        except Exception:
+            pass   # e.g. archive tables not migrated yet; try again next interval
+        finally:
+            conn.close()
+        time.sleep(interval)
+
+
+def start_background(interval=ARCHIVE_INTERVAL):
+    """
+    Start the archival loop in a daemon thread, once per process (safe to call
+    on every Streamlit rerun). interval <= 0 disables it.
+    """
+    global _job
+    if interval <= 0:
+        return None
+    with _job_lock:
+        if _job is None:
+            _job = threading.Thread(target=_loop, args=(interval,), name="bmc-archive", daemon=True)
+            _job.start()
+    return _job
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Move past bookings into the archive tables.")
+    parser.add_argument("--days", type=int, default=ARCHIVE_AFTER_DAYS, help="archive bookings older than this")
+    parser.add_argument("--batch-size", type=int, default=ARCHIVE_BATCH)
+    parser.add_argument("--max-batches", type=int)
+    args = parser.parse_args()
+
+    conn = repository.connect()
+    try:
+        run(conn, cutoff_for(args.days), args.batch_size, max_batches=args.max_batches)
+    finally:
+        conn.close()
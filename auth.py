@@ -1,21 +1,20 @@
-from db import connect
+from repository import connect, login, register_faculty as _insert_faculty
 
-def register_faculty(email, password):
+def register_faculty(username, password, name=None, role="teacher"):
     conn = connect()
-    c = conn.cursor()
-
     try:
-        c.execute("INSERT INTO faculty (email, password) VALUES (%s, %s)", (email, password))
+        _insert_faculty(conn, name, username, password, role)
         conn.commit()
-        conn.close()
         return True
-    except:
-        return False  # Email already exists
+    except Exception:
+        conn.rollback()
+        return False  # Username already exists
+    finally:
+        conn.close()
 
-def validate_faculty_login(email, password):
+def validate_faculty_login(username, password):
     conn = connect()
-    c = conn.cursor()
-    c.execute("SELECT * FROM faculty WHERE email=%s AND password=%s", (email, password))
-    user = c.fetchone()
-    conn.close()
-    return user
+    try:
+        return login(conn, username, password)
+    finally:
+        conn.close()
@@ -0,0 +1,280 @@
+import bisect
+import datetime
+import random
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+import repository
+import versions
+from repository import KINDS
+
+DAY_TTL = 15.0        # seconds before a loaded day is re-validated (picks up other processes' writes)
+MAX_DAYS = 366        # loaded days kept in memory (least recently used are dropped)
+
+
+def to_seconds(value):
+    """
+    Normalise a time-of-day to seconds since midnight.
+    mysql.connector returns TIME columns as timedelta, Streamlit gives datetime.time.
+    """
+    if isinstance(value, datetime.timedelta):
+        return int(value.total_seconds())
+    if isinstance(value, datetime.time):
+        return value.hour * 3600 + value.minute * 60 + value.second
+    if isinstance(value, str):
+        parts = [int(p) for p in value.split(".")[0].split(":")]
+        parts += [0] * (3 - len(parts))
+        return parts[0] * 3600 + parts[1] * 60 + parts[2]
+    return int(value)
+
+
+def to_date(value):
+    if isinstance(value, datetime.datetime):
+        return value.date()
+    if isinstance(value, str):
+        return datetime.date.fromisoformat(value)
+    return value
+
+
+# =========================================================
+# PER-RESOURCE SORTED INTERVALS
+# =========================================================
+class DaySlots:
+    """
+    Bookings of one resource on one date, sorted by start.
+    prefix_max_end[i] is the latest end among the first i+1 intervals, so the
+    overlap test is a single bisect even when stored rows overlap each other
+    or are degenerate (old lab rows were never validated).
+    """
+
+    __slots__ = ("starts", "entries", "prefix_max_end")
+
+    def __init__(self):
+        self.starts = []
+        self.entries = []        # (start, end, booking_id)
+        self.prefix_max_end = []
+
+    def _rebuild_prefix(self, frm):
+        running = self.prefix_max_end[frm - 1] if frm > 0 else None
+        del self.prefix_max_end[frm:]
+        for _, end, _ in self.entries[frm:]:
+            running = end if running is None else max(running, end)
+            self.prefix_max_end.append(running)
+
+    def add(self, start, end, booking_id):
+        entry = (start, end, booking_id)
+        pos = bisect.bisect_right(self.entries, entry)
+        self.entries.insert(pos, entry)
+        self.starts.insert(pos, start)
+        self._rebuild_prefix(pos)
+
+    def remove(self, start, end, booking_id):
+        entry = (start, end, booking_id)
+        pos = bisect.bisect_left(self.entries, entry)
+        if pos < len(self.entries) and self.entries[pos] == entry:
+            del self.entries[pos]
+            del self.starts[pos]
+            self._rebuild_prefix(pos)
+
+    def overlaps(self, start, end):
+        # SQL: NOT (end_time <= start OR start_time >= end)  <=>  start_time < end AND end_time > start
+        k = bisect.bisect_left(self.starts, end)
+        return k > 0 and self.prefix_max_end[k - 1] > start
+
+
+# =========================================================
+# AVAILABILITY INDEX
+# =========================================================
+def _load_day_from_db(date):
+    """
+    One round-trip for every classroom and lab booking on `date`.
+    """
+    conn = repository.connect()
+    try:
+        return repository.fetch_all(conn, "day_bookings", (date, date))
+    finally:
+        conn.close()
+
+
+def _day_version_from_db(date):
+    conn = repository.connect()
+    try:
+        return versions.current(conn, KINDS, date, date)
+    finally:
+        conn.close()
+
+
+class AvailabilityIndex:
+    """
+    In-memory, per-(resource, date) interval index over `bookings` and
+    `lab_bookings`. Days are loaded lazily on first use, kept fresh by
+    add()/remove() from the write paths, and re-validated after `ttl`
+    seconds: a day is re-read only if its data version changed meanwhile
+    (pass version=None to always re-read). Answers match the SQL overlap
+    predicate exactly (half-open intervals).
+    """
+
+    def __init__(self, loader=_load_day_from_db, ttl=DAY_TTL, max_days=MAX_DAYS, version=_day_version_from_db):
+        self._loader = loader
+        self._version = version
+        self._ttl = ttl
+        self._max_days = max_days
+        self._days = OrderedDict()   # date -> (loaded_at, {(kind, name): DaySlots}, version)
+        self._by_id = {}             # (kind, booking_id) -> (name, date, start, end)
+        self._lock = threading.RLock()
+
+    # ---------- loading ----------
+    def _day(self, date):
+        date = to_date(date)
+        with self._lock:
+            cached = self._days.get(date)
+            if cached is not None and time.monotonic() - cached[0] < self._ttl:
+                self._days.move_to_end(date)
+                return cached[1]
+
+            # Read the version before the bookings: a concurrent write then forces another reload
+            version = self._version(date) if self._version is not None else None
+            if cached is not None and version is not None and version == cached[2]:
+                self._days[date] = (time.monotonic(), cached[1], version)
+                self._days.move_to_end(date)
+                return cached[1]
+
+            self._drop_day(date)
+            slots = {}
+            self._days[date] = (time.monotonic(), slots, version)
+            for kind, name, start, end, booking_id in self._loader(date):
+                self._insert(slots, kind, name, date, start, end, booking_id)
+            while len(self._days) > self._max_days:
+                self._drop_day(next(iter(self._days)))
+            return slots
+
+    def _drop_day(self, date):
+        cached = self._days.pop(date, None)
+        if cached is None:
+            return
+        for (kind, _), day_slots in cached[1].items():
+            for _, _, booking_id in day_slots.entries:
+                self._by_id.pop((kind, booking_id), None)
+
+    def _insert(self, slots, kind, name, date, start, end, booking_id):
+        key = (kind, booking_id)
+        if booking_id is not None and key in self._by_id:
+            return  # already seen (e.g. written while the day was loading)
+        start, end = to_seconds(start), to_seconds(end)
+        slots.setdefault((kind, name), DaySlots()).add(start, end, booking_id)
+        if booking_id is not None:
+            self._by_id[key] = (name, date, start, end)
+
+    # ---------- queries ----------
+    def is_free(self, kind, name, date, start, end):
+        """
+        True if no booking of `name` on `date` overlaps [start, end).
+        """
+        with self._lock:
+            day_slots = self._day(date).get((kind, name))
+            return day_slots is None or not day_slots.overlaps(to_seconds(start), to_seconds(end))
+
+    def free_resources(self, kind, names, date, start, end):
+        """
+        Subset of `names` (order kept) that is free for [start, end) on `date`.
+        """
+        start, end = to_seconds(start), to_seconds(end)
+        with self._lock:
+            slots = self._day(date)
+            free = []
+            for name in names:
+                day_slots = slots.get((kind, name))
+                if day_slots is None or not day_slots.overlaps(start, end):
+                    free.append(name)
+            return free
+
+    # ---------- write-through ----------
+    def add(self, kind, name, date, start, end, booking_id):
+        """
+        Record a committed booking. Days not loaded yet are left alone.
+        """
+        date = to_date(date)
+        with self._lock:
+            cached = self._days.get(date)
+            if cached is not None:
+                self._insert(cached[1], kind, name, date, start, end, booking_id)
+
+    def remove(self, kind, booking_id):
+        """
+        Forget a deleted booking (no-op if its day is not loaded).
+        """
+        with self._lock:
+            known = self._by_id.pop((kind, booking_id), None)
+            if known is None:
+                return
+            name, date, start, end = known
+            cached = self._days.get(date)
+            if cached is not None and (kind, name) in cached[1]:
+                cached[1][(kind, name)].remove(start, end, booking_id)
+
+    def invalidate(self, date=None):
+        with self._lock:
+            if date is None:
+                self._days.clear()
+                self._by_id.clear()
+            else:
+                self._drop_day(to_date(date))
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_index():
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = AvailabilityIndex()
+    return _index
+
+
+# =========================================================
+# PARITY CHECK (index vs. SQL predicate)
+# =========================================================
+def check_parity(dates, samples_per_day=200, seed=0):
+    """
+    Compare the index against the SQL overlap query for random windows on
+    every resource that has bookings on `dates`. Returns a list of mismatches
+    (empty when the two agree). Run it against a real database:
+
+        python availability.py 2025-01-06 2025-01-10
+    """
+    rng = random.Random(seed)
+    index = AvailabilityIndex(ttl=float("inf"))
+    mismatches = []
+    conn = repository.connect()
+    try:
+        for date in dates:
+            resources = {(kind, name) for kind, name, *_ in _load_day_from_db(date)}
+            resources |= {("classroom", "__no_bookings__"), ("lab", "__no_bookings__")}
+            for _ in range(samples_per_day):
+                kind, name = rng.choice(sorted(resources))
+                # Minute-aligned windows, including empty and inverted ones
+                a, b = rng.randrange(0, 24 * 60) * 60, rng.randrange(0, 24 * 60) * 60
+                start = datetime.timedelta(seconds=a)
+                end = datetime.timedelta(seconds=b)
+                sql_free = not repository.has_overlap(conn, kind, name, date, start, end)
+                if index.is_free(kind, name, date, start, end) != sql_free:
+                    mismatches.append((kind, name, date, str(start), str(end), sql_free))
+    finally:
+        conn.close()
+    return mismatches
+
+
+if __name__ == "__main__":
+    first = datetime.date.fromisoformat(sys.argv[1]) if len(sys.argv) > 1 else datetime.date.today()
+    last = datetime.date.fromisoformat(sys.argv[2]) if len(sys.argv) > 2 else first
+    days = [first + datetime.timedelta(days=i) for i in range((last - first).days + 1)]
+    problems = check_parity(days)
+    for problem in problems:
+        print("MISMATCH", *problem)
+    print(f"{len(days)} day(s) checked, {len(problems)} mismatch(es)")
+    sys.exit(1 if problems else 0)
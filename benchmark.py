@@ -0,0 +1,531 @@
+"""
+Benchmark suite for the booking hot paths.
+
+Generates a seeded synthetic dataset (floors, rooms, labs, teachers, years of
+bookings and cancellation queues) in a local database, then times the data
+access behind every page and reports p50/p95/p99 latency and queries per
+render as JSON.
+
+    python benchmark.py                                  # small SQLite run
+    python benchmark.py --days 3650 --per-day 6 --out bench.json
+    python benchmark.py --compare bench.json             # flag regressions vs. a previous run
+
+--backend mysql benchmarks the MySQL database configured through BMC_DB_*;
+add --generate to (re)fill it with synthetic data first. Only point that at
+a scratch database: generation deletes every booking (live and archived),
+cancellation request, classroom, lab, faculty account, data version and
+rollup row. It refuses to run on a
+database that already holds any of those unless --force is given.
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+
+import DB
+import pool
+
+SLOTS = [datetime.time(h) for h in range(8, 18)]   # hourly slots used by the generator
+# Emptied by generate(), along with the rollup tables
+GENERATED_TABLES = ("cancel_requests", "cancel_lab_requests", "bookings", "lab_bookings", "bookings_archive",
+                    "lab_bookings_archive", "classrooms", "labs", "faculty", "data_versions")
+
+
+# =========================================================
+# QUERY COUNTING
+# =========================================================
+class _CountingCursor:
+    def __init__(self, raw, counter):
+        self._raw = raw
+        self._counter = counter
+
+    def execute(self, *args, **kwargs):
+        self._counter[0] += 1
+        return self._raw.execute(*args, **kwargs)
+
+    def executemany(self, *args, **kwargs):
+        self._counter[0] += 1
+        return self._raw.executemany(*args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+    def __iter__(self):
+        return iter(self._raw)
+
+
+class _CountingConnection:
+    def __init__(self, raw, counter):
+        self._raw = raw
+        self._counter = counter
+
+    def cursor(self, *args, **kwargs):
+        return _CountingCursor(self._raw.cursor(*args, **kwargs), self._counter)
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+
+class CountingBackend(DB.Backend):
+    """
+    Wraps another backend and counts every statement executed through it.
+    """
+
+    def __init__(self, inner):
+        self.inner = inner
+        self.name = inner.name
+        self.counter = [0]
+
+    def connect(self):
+        return _CountingConnection(self.inner.connect(), self.counter)
+
+    def ping(self, conn):
+        self.inner.ping(conn._raw)
+
+    def ddl(self, statement):
+        return self.inner.ddl(statement)
+
+    def upsert_add(self, table, keys, counters):
+        return self.inner.upsert_add(table, keys, counters)
+
+
+# =========================================================
+# DATA GENERATOR
+# =========================================================
+def generate(conn, floors=4, rooms_per_floor=25, labs=20, teachers=200, days=365,
+             per_day=4, pending=500, seed=0, batch=5000, log=print, force=False):
+    """
+    Fill the database with a deterministic synthetic dataset. Every row in
+    GENERATED_TABLES (live and archived bookings, cancellation requests,
+    classrooms, labs, faculty, data versions) and in the rollup tables is
+    deleted first; unless `force`, a database that already has rows in
+    GENERATED_TABLES is refused with ValueError. Bookings span `days` days ending 30 days from today,
+    `per_day` per resource per day, never overlapping.
+    """
+    import rollups
+
+    rng = random.Random(seed)
+    cursor = conn.cursor()
+    if not force:
+        in_use = []
+        for table in GENERATED_TABLES:
+            cursor.execute(f"SELECT 1 FROM {table} LIMIT 1")
+            if cursor.fetchall():
+                in_use.append(table)
+        if in_use:
+            conn.rollback()
+            raise ValueError(f"The database already has data ({', '.join(in_use)}); "
+                             "generating would delete it. Use --force to wipe it anyway.")
+    for table in (*GENERATED_TABLES, *rollups.TABLES):
+        cursor.execute(f"DELETE FROM {table}")
+    conn.commit()
+
+    floor_names = [f"{n}{'st' if n == 1 else 'nd' if n == 2 else 'rd' if n == 3 else 'th'}" for n in range(1, floors + 1)]
+    feature_sets = ["projector", "computers, projector", "smartboard, projector", "computers"]
+    rooms = [(f"Room {f + 1}{r:02d}", floor_names[f]) for f in range(floors) for r in range(rooms_per_floor)]
+    cursor.executemany(
+        "INSERT INTO classrooms (room_name, floor, capacity, features) VALUES (%s, %s, %s, %s)",
+        [(name, floor, rng.choice([30, 40, 60, 65, 75, 90, 120]), rng.choice(feature_sets)) for name, floor in rooms],
+    )
+    lab_rows = [(f"Lab {i + 1:03d}", rng.choice(floor_names)) for i in range(labs)]
+    cursor.executemany("INSERT INTO labs (lab_name, floor) VALUES (%s, %s)", lab_rows)
+    usernames = [f"teacher{i:04d}" for i in range(teachers)]
+    cursor.executemany(
+        "INSERT INTO faculty (name, username, password, role) VALUES (%s, %s, %s, %s)",
+        [(u.title(), u, "x", "teacher") for u in usernames],
+    )
+    conn.commit()
+
+    last_day = datetime.date.today() + datetime.timedelta(days=30)
+    first_day = last_day - datetime.timedelta(days=days - 1)
+    total = 0
+    for kind, table, column, resources in (
+        ("classroom", "bookings", "room_name", rooms),
+        ("lab", "lab_bookings", "lab_name", lab_rows),
+    ):
+        sql = f"""
+            INSERT INTO {table} (username, {column}, floor, date, start_time, end_time, duration, description)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+        """
+        rows = []
+        for offset in range(days):
+            day = first_day + datetime.timedelta(days=offset)
+            for name, floor in resources:
+                for slot in rng.sample(SLOTS, min(per_day, len(SLOTS))):
+                    end = datetime.time(slot.hour + 1)
+                    rows.append((rng.choice(usernames), name, floor, day, slot, end, "1:00:00", "synthetic"))
+            if len(rows) >= batch:
+                cursor.executemany(sql, rows)
+                conn.commit()
+                total += len(rows)
+                rows = []
+        if rows:
+            cursor.executemany(sql, rows)
+            conn.commit()
+            total += len(rows)
+        log(f"  {kind}: {total} bookings so far")
+
+    rollups.rebuild(conn, log=lambda _: None)
+
+    for table, booking_table in (("cancel_requests", "bookings"), ("cancel_lab_requests", "lab_bookings")):
+        cursor.execute(f"SELECT MAX(id) FROM {booking_table}")
+        (max_id,) = cursor.fetchone()
+        statuses = ["Pending"] * pending + ["Approved"] * (pending // 2) + ["Rejected"] * (pending // 2)
+        cursor.executemany(
+            f"INSERT INTO {table} (booking_id, teacher_username, reason, status) VALUES (%s, %s, %s, %s)",
+            [(rng.randint(1, max_id or 1), rng.choice(usernames), "synthetic", status) for status in statuses],
+        )
+    conn.commit()
+    cursor.close()
+    return {"floors": floor_names, "rooms": rooms, "labs": lab_rows, "teachers": usernames,
+            "first_day": first_day, "last_day": last_day, "bookings": total}
+
+
+# =========================================================
+# HOT PATHS (the data access behind each page in main.py)
+# =========================================================
+def _hot_paths(data, rng):
+    import availability
+    import catalog
+    import history
+    import repository
+    import room_search
+    import slot_finder
+    import versions
+
+    today = datetime.date.today()
+
+    def any_day():
+        return data["first_day"] + datetime.timedelta(days=rng.randrange((data["last_day"] - data["first_day"]).days + 1))
+
+    def upcoming_day():
+        return today + datetime.timedelta(days=rng.randrange(30))
+
+    def window():
+        start = rng.choice(SLOTS)
+        return start, datetime.time(start.hour + 1)
+
+    def is_booking_available():
+        room, _ = rng.choice(data["rooms"])
+        start, end = window()
+        return availability.get_index().is_free("classroom", room, upcoming_day(), start, end)
+
+    def is_booking_available_sql():
+        room, _ = rng.choice(data["rooms"])
+        start, end = window()
+        conn = pool.get_connection()
+        try:
+            repository.has_overlap(conn, "classroom", room, upcoming_day(), start, end)
+        finally:
+            conn.close()
+
+    def booking_page_free_rooms():
+        start, end = window()
+        floor = rng.choice(catalog.floors())
+        return room_search.search(upcoming_day(), start, end, floor=floor)
+
+    def search_constraints():
+        return rng.choice([0, 40, 60, 90]), rng.choice([(), ("projector",), ("computers",), ("computers", "projector")])
+
+    def room_search_indexed():
+        # Every floor, capacity + features, best fit first: room index + availability index
+        start, end = window()
+        min_capacity, features = search_constraints()
+        return room_search.search(upcoming_day(), start, end, min_capacity, features)
+
+    def room_search_sql():
+        # The same search as one query per call (features matched with LIKE)
+        start, end = window()
+        min_capacity, features = search_constraints()
+        conn = pool.get_connection()
+        try:
+            return repository.fetch_all(conn, f"room_search_{len(features)}", (
+                min_capacity, *[f"%{f}%" for f in features], upcoming_day(), end, start,
+            ), sql=f"""
+                SELECT c.room_name, c.floor, c.capacity FROM classrooms c
+                WHERE c.capacity >= %s {"".join(" AND c.features LIKE %s" for _ in features)}
+                  AND NOT EXISTS (
+                      SELECT 1 FROM bookings b
+                      WHERE b.room_name = c.room_name AND b.date = %s
+                        AND b.start_time < %s AND b.end_time > %s)
+                ORDER BY c.capacity, c.room_name
+            """)
+        finally:
+            conn.close()
+
+    def booking_history():
+        conn = pool.get_connection()
+        try:
+            history.history_page(conn, rng.choice(data["teachers"]), upcoming_only=True, descending=False)
+        finally:
+            conn.close()
+
+    def booking_history_past_deep():
+        # A page deep into the past (keyset cursor somewhere in the middle of history)
+        conn = pool.get_connection()
+        try:
+            after = (any_day(), datetime.time(12), "classroom", 0)
+            history.history_page(conn, rng.choice(data["teachers"]), after=after, descending=True)
+        finally:
+            conn.close()
+
+    def student_dashboard():
+        # As the page does it: one version check, queries only when the date's bookings changed.
+        # Students mostly rerun the dashboard for the next few days (widget clicks, refreshes).
+        day, floor = today + datetime.timedelta(days=rng.randrange(3)), rng.choice(catalog.floors())
+        versions.cached(("student_dashboard", floor, versions.minute_of(day)), repository.KINDS, day, day,
+                        lambda conn: (repository.student_bookings(conn, "classroom", day, floor),
+                                      repository.student_bookings(conn, "lab", day)))
+
+    def student_dashboard_sql():
+        day, floor = today + datetime.timedelta(days=rng.randrange(3)), rng.choice(catalog.floors())
+        conn = pool.get_connection()
+        try:
+            repository.student_bookings(conn, "classroom", day, floor)
+            repository.student_bookings(conn, "lab", day)
+        finally:
+            conn.close()
+
+    def manage_cancellations():
+        for kind in ("classroom", "lab"):
+            versions.cached(("pending_queue", "", None, None, ""), [kind, versions.requests_scope(kind)], None, None,
+                            lambda conn: repository.pending_queue(conn, kind))
+
+    def find_slot():
+        first = upcoming_day()
+        slot_finder.find_slots(datetime.timedelta(hours=rng.choice([1, 2, 3])), first,
+                               first + datetime.timedelta(days=6), limit=5)
+
+    def reports():
+        # A month of every rollup for both kinds, as the admin reports page loads it
+        last = upcoming_day()
+        conn = pool.get_connection()
+        try:
+            for kind in ("classroom", "lab"):
+                repository.usage_report(conn, kind, last - datetime.timedelta(days=29), last)
+        finally:
+            conn.close()
+
+    return {
+        "is_booking_available": is_booking_available,
+        "is_booking_available_sql": is_booking_available_sql,
+        "booking_page_free_rooms": booking_page_free_rooms,
+        "room_search": room_search_indexed,
+        "room_search_sql": room_search_sql,
+        "booking_history": booking_history,
+        "booking_history_past_deep": booking_history_past_deep,
+        "student_dashboard": student_dashboard,
+        "student_dashboard_sql": student_dashboard_sql,
+        "manage_cancellations": manage_cancellations,
+        "find_slot": find_slot,
+        "reports": reports,
+    }
+
+
+def _percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    rank = max(0, min(len(sorted_values) - 1, int(round(pct / 100 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[rank]
+
+
+def run(data, counter, iterations=200, warmup=5, seed=0, only=None):
+    rng = random.Random(seed)
+    results = {}
+    for name, fn in _hot_paths(data, rng).items():
+        if only and name not in only:
+            continue
+        for _ in range(warmup):
+            fn()
+        timings, queries = [], []
+        for _ in range(iterations):
+            before = counter[0]
+            started = time.perf_counter()
+            fn()
+            timings.append((time.perf_counter() - started) * 1000)
+            queries.append(counter[0] - before)
+        timings.sort()
+        results[name] = {
+            "iterations": iterations,
+            "p50_ms": round(_percentile(timings, 50), 3),
+            "p95_ms": round(_percentile(timings, 95), 3),
+            "p99_ms": round(_percentile(timings, 99), 3),
+            "max_ms": round(timings[-1], 3),
+            "queries_per_render": round(sum(queries) / len(queries), 2),
+        }
+    return results
+
+
+def allocation_requests(data, count, seed=0):
+    """
+    `count` synthetic semester sessions (15 weeks, one or two days a week)
+    starting next week, so the first weeks compete with existing bookings.
+    """
+    rng = random.Random(seed)
+    first = datetime.date.today() + datetime.timedelta(days=7)
+    feature_sets = [(), (), ("projector",), ("computers",), ("computers", "projector")]
+    requests = []
+    for i in range(count):
+        start = rng.choice(SLOTS)
+        lab = rng.random() < 0.15
+        requests.append({
+            "session": f"S{i:05d}", "username": rng.choice(data["teachers"]),
+            "kind": "lab" if lab else "classroom", "first_date": first, "weeks": 15,
+            "weekdays": rng.sample(range(5), rng.choice([1, 2])),
+            "start": start, "end": datetime.time(start.hour + rng.choice([1, 2])),
+            "size": 0 if lab else rng.choice([20, 30, 40, 60, 60, 75, 90]),
+            "features": () if lab else rng.choice(feature_sets),
+        })
+    return requests
+
+
+def run_allocation(data, counter, count, seed=0):
+    """
+    Time planning and committing `count` requests with the allocator.
+    """
+    import allocator
+
+    requests = allocation_requests(data, count, seed)
+    before = counter[0]
+    started = time.perf_counter()
+    rows, report = allocator.plan(requests)
+    plan_ms = (time.perf_counter() - started) * 1000
+    plan_queries = counter[0] - before
+
+    conn = pool.get_connection()
+    try:
+        before = counter[0]
+        started = time.perf_counter()
+        booked = allocator.commit(conn, requests, rows, report)
+        commit_ms = (time.perf_counter() - started) * 1000
+    finally:
+        conn.close()
+    return {"requests": count, "plan_ms": round(plan_ms, 1), "plan_queries": plan_queries,
+            "commit_ms": round(commit_ms, 1), "commit_queries": counter[0] - before, "booked": booked,
+            **allocator.summary(report)}
+
+
+def compare(current, previous, threshold=1.2):
+    """
+    [(path, metric, old, new)] where the current run is more than `threshold`
+    times slower (p95) or issues more queries per render than `previous`.
+    """
+    regressions = []
+    for name, now in current["results"].items():
+        before = previous.get("results", {}).get(name)
+        if not before:
+            continue
+        if now["p95_ms"] > before["p95_ms"] * threshold:
+            regressions.append((name, "p95_ms", before["p95_ms"], now["p95_ms"]))
+        if now["queries_per_render"] > before["queries_per_render"]:
+            regressions.append((name, "queries_per_render", before["queries_per_render"], now["queries_per_render"]))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backend", choices=sorted(DB.BACKENDS), default="sqlite")
+    parser.add_argument("--db", help="SQLite file (default: a fresh temporary file)")
+    parser.add_argument("--generate", action="store_true",
+                        help="regenerate data, deleting all bookings, requests, rooms, labs, faculty and rollups "
+                             "(always on for a fresh SQLite file)")
+    parser.add_argument("--force", action="store_true", help="let --generate wipe a database that already has data")
+    parser.add_argument("--floors", type=int, default=4)
+    parser.add_argument("--rooms-per-floor", type=int, default=25)
+    parser.add_argument("--labs", type=int, default=20)
+    parser.add_argument("--teachers", type=int, default=200)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--per-day", type=int, default=4, help="bookings per resource per day")
+    parser.add_argument("--pending", type=int, default=500, help="pending cancellation requests per queue")
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--only", nargs="*", help="run only these hot paths")
+    parser.add_argument("--allocate", type=int, metavar="N",
+                        help="also plan and book N timetable requests with the allocator (adds bookings)")
+    parser.add_argument("--out", help="write JSON results here (default: stdout)")
+    parser.add_argument("--compare", help="previous JSON results; exit 1 on regressions")
+    args = parser.parse_args(argv)
+
+    import migrations
+
+    if args.backend == "sqlite":
+        path = args.db or os.path.join(tempfile.mkdtemp(prefix="bmc-bench-"), "bench.db")
+        generate_data = args.generate or not os.path.exists(path)
+        inner = DB.SQLiteBackend(path)
+    else:
+        generate_data = args.generate
+        inner = DB.MySQLBackend()
+    backend = CountingBackend(inner)
+    DB.set_backend(backend)
+
+    log = lambda msg: print(msg, file=sys.stderr)
+    conn = pool.get_connection()
+    try:
+        migrations.migrate(conn, log=log, backend=backend)
+        config = {k: getattr(args, k) for k in ("floors", "rooms_per_floor", "labs", "teachers", "days", "per_day", "pending", "seed")}
+        if generate_data:
+            log("Generating synthetic data ...")
+            started = time.perf_counter()
+            try:
+                data = generate(conn, args.floors, args.rooms_per_floor, args.labs, args.teachers,
+                                args.days, args.per_day, args.pending, args.seed, log=log, force=args.force)
+            except ValueError as e:
+                sys.exit(str(e))
+            log(f"Generated {data['bookings']} bookings in {time.perf_counter() - started:.1f}s")
+        else:
+            data = _describe(conn)
+    finally:
+        conn.close()
+
+    report = {
+        "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+        "backend": backend.name,
+        "python": platform.python_version(),
+        "config": config,
+        "bookings": data["bookings"],
+        "results": run(data, backend.counter, args.iterations, seed=args.seed, only=args.only),
+    }
+    if args.allocate:
+        report["allocation"] = run_allocation(data, backend.counter, args.allocate, seed=args.seed)
+    output = json.dumps(report, indent=2, default=str)
+    if args.out:
+        with open(args.out, "w") as fh:
+            fh.write(output + "\n")
+    else:
+        print(output)
+
+    if args.compare:
+        with open(args.compare) as fh:
+            regressions = compare(report, json.load(fh))
+        for name, metric, old, new in regressions:
+            log(f"REGRESSION {name} {metric}: {old} -> {new}")
+        return 1 if regressions else 0
+    return 0
+
+
+def _describe(conn):
+    """
+    Rebuild the generator's summary from an existing database.
+    """
+    cursor = conn.cursor()
+    cursor.execute("SELECT room_name, floor FROM classrooms")
+    rooms = cursor.fetchall()
+    cursor.execute("SELECT lab_name, floor FROM labs")
+    labs = cursor.fetchall()
+    cursor.execute("SELECT username FROM faculty")
+    teachers = [row[0] for row in cursor.fetchall()]
+    cursor.execute("SELECT MIN(date), MAX(date), COUNT(*) FROM bookings")
+    first_day, last_day, count = cursor.fetchone()
+    cursor.close()
+    to_date = lambda d: d if isinstance(d, datetime.date) else datetime.date.fromisoformat(d)
+    return {"floors": sorted({f for _, f in rooms}), "rooms": rooms, "labs": labs, "teachers": teachers,
+            "first_day": to_date(first_day), "last_day": to_date(last_day), "bookings": count}
+
+
+if __name__ == "__main__":
+    sys.exit(main())
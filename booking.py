@@ -0,0 +1,299 @@
+import datetime
+import hashlib
+
+import catalog
+import repository
+import rollups
+import versions
+from availability import DaySlots, get_index, to_seconds
+from repository import RESOURCE_TABLES
+
+LOCK_TIMEOUT = 5   # seconds to wait for another booking of the same resource/date
+LOCKS_PER_STATEMENT = 100
+
+
+class BookingConflict(Exception):
+    """The requested slot overlaps an existing booking."""
+
+
+class BookingBusy(Exception):
+    """Could not get the resource lock in time (heavy contention on one room)."""
+
+
+def _lock_name(kind, name, date):
+    # MySQL user-level lock names are limited to 64 characters
+    lock = f"bmc:{kind}:{name}:{date}"
+    if len(lock) > 64:
+        lock = "bmc:" + hashlib.sha1(lock.encode()).hexdigest()
+    return lock
+
+
+def _acquire_locks(conn, locks, timeout):
+    """
+    Take several user-level locks in a fixed (sorted) order, batching the
+    GET_LOCK calls so a whole timetable needs only a few round-trips.
+    Returns False (holding nothing) if any lock timed out.
+    """
+    locks = sorted(set(locks))
+    for i in range(0, len(locks), LOCKS_PER_STATEMENT):
+        chunk = locks[i:i + LOCKS_PER_STATEMENT]
+        acquired = repository.fetch_one(
+            conn, "get_locks", [arg for lock in chunk for arg in (lock, timeout)],
+            sql="SELECT " + ", ".join(["GET_LOCK(%s, %s)"] * len(chunk)), prepare=False)
+        if any(result != 1 for result in acquired):
+            _release_all_locks(conn)
+            return False
+    return True
+
+
+def _release_all_locks(conn):
+    repository.fetch_one(conn, "release_all_locks")
+
+
+def validate(kind, name, date, start, end, today=None, allow_past=False):
+    """
+    Why a booking request is invalid, or None. The same rules for every kind
+    of resource and every entry point (pages, bulk booking, API); only
+    restoring history (export.py imports) may pass allow_past=True.
+    """
+    if kind not in RESOURCE_TABLES:
+        return f"Unknown resource type {kind!r}."
+    if name not in catalog.resource_floors(kind):
+        return f"Unknown {kind}."
+    if start >= end:
+        return "End time must be after start time."
+    if not allow_past and date < (today or datetime.date.today()):
+        return "Date cannot be in the past."
+    return None
+
+
+def reserve(conn, kind, username, name, floor, date, start, end, duration, description,
+            lock_timeout=LOCK_TIMEOUT):
+    """
+    Atomically check for overlaps and insert one booking; returns its id.
+    Raises BookingConflict if the slot is taken and BookingBusy on lock timeout.
+    """
+    (booking_id,) = reserve_together(conn, username, [(kind, name, floor)], date, start, end,
+                                     duration, description, lock_timeout)
+    return booking_id
+
+
+def reserve_together(conn, username, resources, date, start, end, duration, description,
+                     lock_timeout=LOCK_TIMEOUT):
+    """
+    Book several resources - (kind, name, floor), e.g. a lecture room and a
+    lab - for the same slot, all or nothing; returns their booking ids.
+    Raises BookingConflict (nothing booked) if any of them is taken.
+    """
+    return [booking_id for booking_id, _ in reserve_batch(conn, [
+        {"kind": kind, "username": username, "name": name, "floor": floor, "date": date, "start": start,
+         "end": end, "duration": duration, "description": description}
+        for kind, name, floor in resources
+    ], lock_timeout, atomic=True)]
+
+
+def reserve_many(conn, kind, username, slots, lock_timeout=LOCK_TIMEOUT):
+    """
+    Book a batch of slots (dicts with name, floor, date, start, end, duration,
+    description) of one kind for one user; see reserve_batch().
+    """
+    return reserve_batch(conn, [{**slot, "kind": kind, "username": username} for slot in slots], lock_timeout)
+
+
+def reserve_batch(conn, bookings, lock_timeout=LOCK_TIMEOUT, atomic=False):
+    """
+    The single commit path for bookings: book rows of any kind and user
+    (dicts with kind, username, name, floor, date, start, end, duration,
+    description) in one set-based pass and one transaction. Returns one
+    (booking_id, reason) per row, in input order: booking_id is None and
+    reason says why for rejected rows. With atomic=True any rejected row
+    rolls the whole batch back and raises BookingConflict instead.
+
+    A user-level lock (GET_LOCK) per (resource, date) serialises concurrent
+    attempts on the same room/lab and day only, so bookings for different
+    resources proceed in parallel. Every lock is taken up front (in a fixed
+    order), then the transaction starts, so the conflict check always sees
+    every booking committed by the previous lock holder. Existing bookings
+    come back in one query per kind, conflicts - with the database and
+    between rows of the batch itself - are resolved in memory, and accepted
+    rows are inserted with one executemany per kind.
+    """
+    results = [(None, None)] * len(bookings)
+    if not bookings:
+        return results
+    by_kind = {}
+    for i, row in enumerate(bookings):
+        by_kind.setdefault(row["kind"], []).append(i)
+
+    if not _acquire_locks(conn, [_lock_name(b["kind"], b["name"], b["date"]) for b in bookings], lock_timeout):
+        raise BookingBusy("Some of the requested rooms are busy, please try again." if len(bookings) > 1
+                          else f"{bookings[0]['name']} is busy, please try again.")
+
+    accepted, ids = {}, {}
+    try:
+        conn.start_transaction()
+        try:
+            for kind, rows in by_kind.items():
+                accepted[kind] = _free_rows(conn, kind, bookings, rows, results)
+            rejected = [bookings[i]["name"] for i, (_, reason) in enumerate(results) if reason]
+            if atomic and rejected:
+                raise BookingConflict(f"{', '.join(rejected)} {'is' if len(rejected) == 1 else 'are'} "
+                                      "already booked for the selected time slot.")
+            for kind, rows in accepted.items():
+                if rows:
+                    _insert_rows(conn, kind, bookings, rows, ids)
+            rollups.record(conn, [(b["kind"], b["username"], b["name"], b["date"], b["start"], b["end"])
+                                  for b in (bookings[i] for rows in accepted.values() for i in rows)])
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    finally:
+        _release_all_locks(conn)
+
+    versions.bump(conn, [(kind, bookings[i]["date"]) for kind, rows in accepted.items() for i in rows])
+    index = get_index()
+    for i in sorted(i for rows in accepted.values() for i in rows):
+        row = bookings[i]
+        booking_id = ids.get(i)
+        if booking_id is None:
+            index.invalidate(row["date"])
+        else:
+            index.add(row["kind"], row["name"], row["date"], row["start"], row["end"], booking_id)
+        results[i] = (booking_id, None)
+    return results
+
+
+def batch_existing_sql(kind, names):
+    """
+    Bookings of `kind` on `names` resources between two dates (reserve_batch's conflict check).
+    """
+    table, column = RESOURCE_TABLES[kind]
+    return f"""
+        SELECT {column}, date, start_time, end_time
+        FROM {table}
+        WHERE {column} IN ({", ".join(["%s"] * names)})
+          AND date BETWEEN %s AND %s
+    """
+
+
+def batch_ids_sql(kind, usernames, names):
+    """
+    Ids of the bookings of `usernames` users on `names` resources between two
+    dates (reserve_batch's id read-back after a multi-row insert).
+    """
+    table, column = RESOURCE_TABLES[kind]
+    return f"""
+        SELECT id, {column}, date, start_time
+        FROM {table}
+        WHERE username IN ({", ".join(["%s"] * usernames)})
+          AND {column} IN ({", ".join(["%s"] * names)})
+          AND date BETWEEN %s AND %s
+    """
+
+
+def _free_rows(conn, kind, bookings, rows, results):
+    """
+    The rows (indexes into `bookings`) of one kind that overlap neither an
+    existing booking nor an earlier row; rejected rows get their reason in
+    `results`. Runs inside reserve_batch()'s transaction, under its locks.
+    """
+    names = sorted({bookings[i]["name"] for i in rows})
+    dates = [bookings[i]["date"] for i in rows]
+    existing = repository.fetch_all(conn, f"batch_existing_{kind}", (*names, min(dates), max(dates)),
+                                    sql=batch_existing_sql(kind, len(names)), prepare=len(names) == 1)
+    taken = {}
+    for name, date, start, end in existing:
+        taken.setdefault((name, str(date)), DaySlots()).add(to_seconds(start), to_seconds(end), None)
+
+    free = []
+    for i in rows:
+        row = bookings[i]
+        start, end = to_seconds(row["start"]), to_seconds(row["end"])
+        day_slots = taken.setdefault((row["name"], str(row["date"])), DaySlots())
+        if day_slots.overlaps(start, end):
+            results[i] = (None, "Overlaps an existing booking or an earlier row in this batch.")
+            continue
+        day_slots.add(start, end, None)   # later rows in the batch must not clash with this one
+        free.append(i)
+    return free
+
+
+def _insert_rows(conn, kind, bookings, rows, ids):
+    """
+    Insert the rows of one kind and record their ids in `ids`.
+    """
+    values = [(bookings[i]["username"], bookings[i]["name"], bookings[i]["floor"], bookings[i]["date"],
+               bookings[i]["start"], bookings[i]["end"], bookings[i]["duration"], bookings[i]["description"])
+              for i in rows]
+    if len(rows) == 1:
+        # Single booking: the driver hands back the id, no read-back needed
+        _, ids[rows[0]] = repository.run(conn, f"insert_{kind}", values[0])
+        return
+    repository.run_many(conn, f"insert_{kind}", values)
+
+    # Ids are not guaranteed consecutive for multi-row inserts, so read them back;
+    # (resource, date, start) is unique among the rows we just inserted under lock.
+    names = sorted({bookings[i]["name"] for i in rows})
+    usernames = sorted({bookings[i]["username"] for i in rows})
+    dates = [bookings[i]["date"] for i in rows]
+    inserted = repository.fetch_all(conn, f"batch_ids_{kind}", (*usernames, *names, min(dates), max(dates)),
+                                    sql=batch_ids_sql(kind, len(usernames), len(names)), prepare=False)
+    by_key = {(name, str(date), to_seconds(start)): booking_id for booking_id, name, date, start in inserted}
+    for i in rows:
+        booking_id = by_key.get((bookings[i]["name"], str(bookings[i]["date"]), to_seconds(bookings[i]["start"])))
+        if booking_id is not None:
+            ids[i] = booking_id
+
+
+def approve_cancellations(conn, kind, request_ids):
+    """
+    Approve a batch of pending cancellation requests in one transaction: the
+    targeted bookings are deleted, their usage is subtracted from the rollups
+    and the requests are marked Approved with a few set-based statements; the
+    freed slots then leave the availability index.
+    Requests that were already processed (e.g. by another admin) are skipped.
+    Returns (requests approved, bookings deleted).
+    """
+    conn.start_transaction()
+    try:
+        approved, deleted = repository.approve_cancellations(conn, kind, request_ids)
+        rollups.record(conn, [(kind, *row[1:]) for row in deleted], sign=-1)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    versions.bump(conn, [(kind, row[3]) for row in deleted] + [(versions.requests_scope(kind), datetime.date.today())])
+    index = get_index()
+    for row in deleted:
+        index.remove(kind, row[0])
+    return approved, len(deleted)
+
+
+def reject_cancellations(conn, kind, request_ids):
+    """
+    Reject a batch of pending cancellation requests in one transaction; returns how many.
+    """
+    conn.start_transaction()
+    try:
+        rejected = repository.reject_cancellations(conn, kind, request_ids)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    versions.bump(conn, [(versions.requests_scope(kind), datetime.date.today())])
+    return rejected
+
+
+def request_cancellation(conn, kind, booking_id, username, reason):
+    """
+    Queue a cancellation request for an admin to approve or reject.
+    """
+    conn.start_transaction()
+    try:
+        repository.request_cancellation(conn, kind, booking_id, username, reason)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    versions.bump(conn, [(versions.requests_scope(kind), datetime.date.today())])
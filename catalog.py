@@ -0,0 +1,222 @@
+import bisect
+import re
+import threading
+import time
+
+import repository
+
+CATALOG_TTL = 300.0   # seconds; admin edits in this process invalidate immediately
+
+
+# =========================================================
+# TTL CACHE
+# =========================================================
+class TTLCache:
+    """
+    Small thread-safe cache: entries expire after `ttl` seconds and can be
+    dropped explicitly. Counts hits and misses for the admin sidebar.
+    """
+
+    def __init__(self, ttl=CATALOG_TTL):
+        self.ttl = ttl
+        self._entries = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get(self, key, load):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+        value = load()
+        with self._lock:
+            self._entries[key] = (now + self.ttl, value)
+        return value
+
+    def invalidate(self, key=None):
+        with self._lock:
+            self.invalidations += 1
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "invalidations": self.invalidations,
+            }
+
+
+_cache = TTLCache()
+
+
+# =========================================================
+# REFERENCE DATA
+# =========================================================
+def _query(name, params=()):
+    conn = repository.connect()
+    try:
+        return repository.fetch_all(conn, name, params)
+    finally:
+        conn.close()
+
+
+def _floor_sort_key(floor):
+    # "1st", "2nd", "10th" sort numerically; anything else after, alphabetically
+    match = re.match(r"\d+", floor or "")
+    return (0, int(match.group()), floor) if match else (1, 0, floor or "")
+
+
+def classrooms():
+    """
+    All classrooms as a tuple of (room_name, floor, capacity, features).
+    """
+    return _cache.get("classrooms", lambda: tuple(_query("catalog_classrooms")))
+
+
+def floors():
+    """
+    Floors that have classrooms or labs, in natural order ("1st" < "2nd" < "10th").
+    """
+    def load():
+        names = {floor for _, floor, _, _ in classrooms()} | {floor for _, floor in labs()}
+        return tuple(sorted((f for f in names if f), key=_floor_sort_key))
+    return _cache.get("floors", load)
+
+
+def room_floors():
+    """
+    {room_name: floor} for every classroom.
+    """
+    return _cache.get("room_floors", lambda: {name: floor for name, floor, _, _ in classrooms()})
+
+
+def labs():
+    """
+    All labs as a tuple of (lab_name, floor), ordered by name.
+    """
+    return _cache.get("labs", lambda: tuple(_query("catalog_labs")))
+
+
+def lab_floors():
+    """
+    {lab_name: floor} for every lab.
+    """
+    return _cache.get("lab_floors", lambda: dict(labs()))
+
+
+def lab_floor(lab_name):
+    return lab_floors().get(lab_name, "")
+
+
+def resource_floors(kind):
+    """
+    {name: floor} for every classroom or every lab.
+    """
+    return room_floors() if kind == "classroom" else lab_floors()
+
+
+def parse_features(text):
+    """
+    "Computers, Projector" -> {"computers", "projector"}.
+    """
+    return {f.strip().lower() for f in (text or "").split(",") if f.strip()}
+
+
+class RoomIndex:
+    """
+    Classrooms prepared for search: features parsed once into bitmasks and
+    rooms sorted by capacity, so a query is one bisect to the smallest
+    adequate room plus a mask test per larger room, already in best-fit order.
+    """
+
+    def __init__(self, rooms):
+        self.feature_bits = {}
+        entries = []
+        for name, floor, capacity, features in rooms:
+            mask = 0
+            for feature in parse_features(features):
+                mask |= self.feature_bits.setdefault(feature, 1 << len(self.feature_bits))
+            entries.append((capacity or 0, _floor_sort_key(floor), name, floor, mask))
+        entries.sort()
+        self.capacities = [e[0] for e in entries]
+        self.rooms = [(name, floor, capacity, mask) for capacity, _, name, floor, mask in entries]
+
+    def features(self):
+        return sorted(self.feature_bits)
+
+    def mask_of(self, features):
+        """
+        Bitmask of `features`, or None if any of them no room has.
+        """
+        mask = 0
+        for feature in {f.strip().lower() for f in features}:
+            if feature not in self.feature_bits:
+                return None
+            mask |= self.feature_bits[feature]
+        return mask
+
+    def matches(self, min_capacity=0, features=(), floor=None):
+        """
+        (name, floor, capacity) of every room with at least `min_capacity`
+        seats and all `features`, smallest adequate room first.
+        """
+        mask = self.mask_of(features)
+        if mask is None:
+            return []
+        first = bisect.bisect_left(self.capacities, min_capacity or 0)
+        return [(name, room_floor, capacity) for name, room_floor, capacity, room_mask in self.rooms[first:]
+                if room_mask & mask == mask and (floor is None or room_floor == floor)]
+
+
+def room_index():
+    return _cache.get("room_index", lambda: RoomIndex(classrooms()))
+
+
+def invalidate():
+    """
+    Drop every cached catalogue entry (call after editing classrooms or labs).
+    """
+    _cache.invalidate()
+
+
+def stats():
+    return _cache.stats()
+
+
+# =========================================================
+# ADMIN EDITS (write-through invalidation)
+# =========================================================
+def _write(name, params):
+    conn = repository.connect()
+    try:
+        repository.run(conn, name, params)
+        conn.commit()
+    finally:
+        conn.close()
+    invalidate()
+
+
+def add_classroom(room_name, floor, capacity, features):
+    _write("classroom_add", (room_name, floor, capacity, features))
+
+
+def remove_classroom(room_name):
+    _write("classroom_remove", (room_name,))
+
+
+def add_lab(lab_name, floor):
+    _write("lab_add", (lab_name, floor))
+
+
+def remove_lab(lab_name):
+    _write("lab_remove", (lab_name,))
@@ -0,0 +1,127 @@
+"""
+Query-plan regression check.
+
+Runs EXPLAIN on every query the app issues and fails (exit code 1) if any of
+them falls back to a full table scan. Run it after `python migrations.py up`
+against a database holding representative data; on empty tables the
+optimizer may legitimately prefer a scan.
+
+    python explain_check.py
+
+tests/test_explain_check.py runs the same check on a migrated SQLite
+database seeded by the benchmark generator.
+"""
+import datetime
+import re
+import sys
+
+import DB
+import archive
+import booking
+import history
+import pool
+import repository
+import versions
+
+_D = datetime.date.today()
+_T1 = datetime.time(10, 0)
+_T2 = datetime.time(11, 0)
+
+# Sample parameters for the indexed reads, updates and deletes in repository.STATEMENTS
+_PARAMS = {
+    "faculty_login": ("u", "p"),
+    "day_bookings": (_D, _D),
+    "range_bookings": (_D, _D, _D, _D),
+    "student_classrooms": (_D, "3rd"),
+    "student_labs": (_D,),
+    "report_daily": ("classroom", _D, _D),
+    "report_hourly": ("classroom", _D, _D),
+    "report_teacher": ("classroom", _D, _D),
+}
+for _kind, _resource in (("classroom", "Room 31"), ("lab", "Lab 1")):
+    _PARAMS.update({
+        f"overlap_{_kind}": (_resource, _D, _T1, _T2),
+        f"upcoming_{_kind}_all": (),
+        f"upcoming_{_kind}_by_user": ("u",),
+        f"pending_queue_{_kind}": (),
+        f"rollup_source_{_kind}": (_D, _D, _D, _D),
+        f"archive_candidates_{_kind}": (_D, 1000),
+    })
+
+# (name, sql, params, allow_full_scan): every parameterised read/update/delete
+# in the repository, plus the dynamically built ones on the hot paths.
+QUERIES = [
+    (name, repository.STATEMENTS[name], params, False)
+    for name, params in _PARAMS.items()
+] + [
+    # The cached catalogue reads every room / lab by design (once per TTL)
+    ("catalog_classrooms", repository.STATEMENTS["catalog_classrooms"], (), True),
+    ("catalog_labs", repository.STATEMENTS["catalog_labs"], (), True),
+    ("pending_queue_filtered", repository.pending_queue_sql(
+        "classroom", ["c.teacher_username = %s", "b.date >= %s"]), ("u", _D), False),
+    ("data_version", versions.current_sql(2), ("classroom", "lab", _D, _D), False),
+    ("history_feed_upcoming", *history.history_query("u", upcoming_only=True, descending=False), False),
+    ("history_feed_past_page", *history.history_query(
+        "u", after=(_D, _T1, "classroom", 1), date_from=_D, date_to=_D), False),
+]
+for _kind, _resource in (("classroom", "Room 31"), ("lab", "Lab 1")):
+    QUERIES += [(name, sql, (1, 2), False) for name, sql in repository.cancellation_sql(_kind, "%s, %s").items()]
+    _copy, _delete = archive.move_sql(_kind, 2)
+    QUERIES += [
+        (f"batch_existing_{_kind}", booking.batch_existing_sql(_kind, 2), (_resource, "x", _D, _D), False),
+        (f"batch_ids_{_kind}", booking.batch_ids_sql(_kind, 1, 2), ("u", _resource, "x", _D, _D), False),
+        (f"archive_copy_{_kind}", _copy, (1, 2), False),
+        (f"archive_delete_{_kind}", _delete, (1, 2), False),
+    ]
+
+
+def _mysql_scans(cursor, sql, params):
+    cursor.execute("EXPLAIN " + sql, params)
+    # type=ALL is MySQL's full table scan; derived/union temp tables have no base table
+    return [step["table"] for step in cursor.fetchall()
+            if step.get("type") == "ALL" and step.get("table") and not step["table"].startswith("<")]
+
+
+def _sqlite_scans(cursor, sql, params):
+    cursor.execute("EXPLAIN QUERY PLAN " + sql, params)
+    details = [step["detail"] for step in cursor.fetchall()]
+    # Subqueries and CTEs are named by their CO-ROUTINE / MATERIALIZE step; scanning
+    # their results is bounded by the subquery itself and ignored.
+    derived = {match.group(1) for match in (re.match(r"(?:CO-ROUTINE|MATERIALIZE) (\w+)", d) for d in details)
+               if match}
+    # Plans name aliased tables by their alias ("SCAN b"); report the table
+    aliases = {alias: table for table, alias in re.findall(r"\b(?:FROM|JOIN)\s+(\w+)\s+(?:AS\s+)?(\w+)", sql, re.I)}
+    # "SCAN bookings" is a full scan; "SEARCH ..." and "SCAN ... USING ... INDEX" are not
+    scans = []
+    for detail in details:
+        match = re.match(r"SCAN (\w+)$", detail)
+        if match and match.group(1) not in derived:
+            scans.append(aliases.get(match.group(1), match.group(1)))
+    return scans
+
+
+def full_scans(conn, queries=QUERIES, backend=None):
+    """
+    Return [(query name, table)] for every plan step that scans a whole table.
+    """
+    backend = backend or DB.get_backend()
+    explain = _sqlite_scans if backend.name == "sqlite" else _mysql_scans
+    problems = []
+    cursor = conn.cursor(dictionary=True)
+    for name, sql, params, allow_full_scan in queries:
+        if not allow_full_scan:
+            problems.extend((name, table) for table in explain(cursor, sql, params))
+    cursor.close()
+    return problems
+
+
+if __name__ == "__main__":
+    conn = pool.get_connection()
+    try:
+        problems = full_scans(conn)
+    finally:
+        conn.close()
+    for name, table in problems:
+        print(f"FULL SCAN  {name}: {table}")
+    print(f"{len(QUERIES)} queries checked, {len(problems)} full scan(s)")
+    sys.exit(1 if problems else 0)
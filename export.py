@@ -0,0 +1,368 @@
+"""
+Streaming export and bulk import of bookings and cancellation requests.
+
+    python export.py export bookings bookings.csv --from 2025-01-01 --to 2025-12-31
+    python export.py export lab_bookings labs.parquet --resource "Lab 1"
+    python export.py import bookings bookings.csv
+
+Rows are read through an unbuffered cursor in fetchmany() batches and
+written as they arrive (CSV, or one Parquet row group per batch), so memory
+stays flat however many rows are exported. Parquet needs pyarrow.
+
+Imported bookings are validated like any booking (past dates allowed) and
+go through reserve_batch(): they get new ids, invalid and overlapping rows
+are rejected, and the rollups and availability index stay in step.
+Cancellation requests get new ids too, and are pointed at the new ids of
+their bookings through the id map the bookings import wrote (--id-map);
+requests whose booking was not imported are rejected.
+
+    python export.py import bookings bookings.csv --id-map bookings-ids.csv
+    python export.py import cancel_requests requests.csv --id-map bookings-ids.csv
+"""
+import argparse
+import csv
+import datetime
+import sys
+
+import repository
+import versions
+from availability import to_date, to_seconds
+from booking import reserve_batch, validate
+
+BATCH_SIZE = 5000
+
+# Exportable tables: (kind, booking table) - cancellation tables are filtered through their bookings
+EXPORT_TABLES = {
+    "bookings": ("classroom", None),
+    "lab_bookings": ("lab", None),
+    "cancel_requests": ("classroom", "bookings"),
+    "cancel_lab_requests": ("lab", "lab_bookings"),
+}
+FORMATS = ("csv", "parquet")
+
+
+def _format_of(path):
+    return "parquet" if str(path).lower().endswith(".parquet") else "csv"
+
+
+# =========================================================
+# EXPORT
+# =========================================================
+def export_query(table, date_from=None, date_to=None, resource=None):
+    """
+    (sql, params) for every row of `table` matching the filters, in id order.
+    Bookings (live and archived) filter on their date and room/lab;
+    cancellation requests on the date and room/lab of the booking they target.
+    """
+    kind, booking_table = EXPORT_TABLES[table]
+    _, column = repository.RESOURCE_TABLES[kind]
+    archive_table = repository.ARCHIVE_TABLES[kind]
+    where, params = [], []
+    for condition, value in (("date >= %s", date_from), ("date <= %s", date_to), (f"{column} = %s", resource)):
+        if value:
+            where.append(condition)
+            params.append(value)
+    where_sql = f"WHERE {' AND '.join(where)}" if where else ""
+
+    if booking_table is None:
+        # Archived bookings are exported along with the live ones
+        columns = f"id, username, {column}, floor, date, start_time, end_time, duration, description"
+        return f"""
+            SELECT * FROM (
+                SELECT {columns} FROM {table} {where_sql}
+                UNION ALL
+                SELECT {columns} FROM {archive_table} {where_sql}
+            ) AS rows_out ORDER BY id
+        """, params * 2
+    if where:
+        where_sql = (f"WHERE booking_id IN (SELECT id FROM {booking_table} {where_sql}"
+                     f" UNION ALL SELECT id FROM {archive_table} {where_sql})")
+        params = params * 2
+    return f"SELECT * FROM {table} {where_sql} ORDER BY id", params
+
+
+def iter_rows(conn, table, date_from=None, date_to=None, resource=None, batch_size=BATCH_SIZE):
+    """
+    Yield (column_names, rows) batches of the filtered table.
+    """
+    sql, params = export_query(table, date_from, date_to, resource)
+    return repository.stream(conn, f"export_{table}", params, sql=sql, batch_size=batch_size)
+
+
+def _time_text(value):
+    seconds = to_seconds(value)
+    return f"{seconds // 3600:02d}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}"
+
+
+def _csv_cell(value):
+    if isinstance(value, (datetime.timedelta, datetime.time)):
+        return _time_text(value)
+    return "" if value is None else value
+
+
+def write_csv(conn, out, table, date_from=None, date_to=None, resource=None, batch_size=BATCH_SIZE):
+    """
+    Stream the filtered table to the text stream `out` as CSV; returns the row count.
+    """
+    writer = csv.writer(out)
+    count = 0
+    header = False
+    for columns, rows in iter_rows(conn, table, date_from, date_to, resource, batch_size):
+        if not header:
+            writer.writerow(columns)
+            header = True
+        writer.writerows([_csv_cell(v) for v in row] for row in rows)
+        count += len(rows)
+    if not header:
+        writer.writerow(_columns(conn, table))
+    return count
+
+
+def _columns(conn, table):
+    """
+    Column names of `table` (for the header of an empty export).
+    """
+    cursor = conn.cursor()
+    cursor.execute(f"SELECT * FROM {table} WHERE 1 = 0")
+    cursor.fetchall()
+    columns = list(cursor.column_names)
+    cursor.close()
+    return columns
+
+
+def _arrow_schema(pa, columns):
+    types = {"id": pa.int64(), "booking_id": pa.int64(), "date": pa.date32(),
+             "start_time": pa.time32("s"), "end_time": pa.time32("s"), "created_at": pa.timestamp("s")}
+    return pa.schema([(c, types.get(c, pa.string())) for c in columns])
+
+
+def _arrow_value(column, value):
+    if value is None:
+        return None
+    if column in ("start_time", "end_time"):
+        seconds = to_seconds(value)
+        return datetime.time(seconds // 3600, seconds % 3600 // 60, seconds % 60)
+    if column == "date":
+        return to_date(value)
+    if column == "created_at" and isinstance(value, str):
+        return datetime.datetime.fromisoformat(value)
+    if column in ("id", "booking_id") or isinstance(value, datetime.datetime):
+        return value
+    return str(value)
+
+
+def write_parquet(conn, path, table, date_from=None, date_to=None, resource=None, batch_size=BATCH_SIZE):
+    """
+    Stream the filtered table to a Parquet file (one row group per batch); returns the row count.
+    """
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:   # optional dependency, only needed for Parquet
+        raise RuntimeError("Parquet export needs pyarrow (pip install pyarrow).") from None
+
+    writer = None
+    count = 0
+    try:
+        for columns, rows in iter_rows(conn, table, date_from, date_to, resource, batch_size):
+            if writer is None:
+                schema = _arrow_schema(pa, columns)
+                writer = pq.ParquetWriter(path, schema)
+            arrays = [pa.array([_arrow_value(c, row[i]) for row in rows], type=schema.field(c).type)
+                      for i, c in enumerate(columns)]
+            writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+            count += len(rows)
+        if writer is None:
+            schema = _arrow_schema(pa, _columns(conn, table))
+            writer = pq.ParquetWriter(path, schema)
+    finally:
+        if writer is not None:
+            writer.close()
+    return count
+
+
+def export(conn, path, table, date_from=None, date_to=None, resource=None, fmt=None, batch_size=BATCH_SIZE):
+    """
+    Export the filtered table to `path` (format from the extension unless `fmt` is given).
+    """
+    if (fmt or _format_of(path)) == "parquet":
+        return write_parquet(conn, path, table, date_from, date_to, resource, batch_size)
+    with open(path, "w", newline="", encoding="utf-8") as out:
+        return write_csv(conn, out, table, date_from, date_to, resource, batch_size)
+
+
+# =========================================================
+# IMPORT
+# =========================================================
+def _read_csv(path, batch_size):
+    with open(path, newline="", encoding="utf-8") as f:
+        batch = []
+        for row in csv.DictReader(f):
+            batch.append({k: (v if v != "" else None) for k, v in row.items()})
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+
+def _read_parquet(path, batch_size):
+    try:
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError("Parquet import needs pyarrow (pip install pyarrow).") from None
+    for record_batch in pq.ParquetFile(path).iter_batches(batch_size=batch_size):
+        yield record_batch.to_pylist()
+
+
+def _parse_time(value):
+    if isinstance(value, datetime.time):
+        return value
+    seconds = to_seconds(value)
+    return datetime.time(seconds // 3600, seconds % 3600 // 60, seconds % 60)
+
+
+def _import_bookings(conn, table, batches, id_map=None):
+    """
+    Book every row through reserve_batch(). When `id_map` is a dict it
+    receives {exported id: new id} for every booked row.
+    """
+    kind, _ = EXPORT_TABLES[table]
+    _, column = repository.RESOURCE_TABLES[kind]
+    imported, rejected = 0, []
+    for batch in batches:
+        rows, slots = [], []
+        for row in batch:
+            try:
+                for required in ("username", column, "date", "start_time", "end_time"):
+                    if row.get(required) is None:
+                        raise ValueError(f"{required} is empty")
+                slot = {
+                    "kind": kind, "username": row["username"], "name": row[column], "floor": row.get("floor"),
+                    "date": to_date(row["date"]), "start": _parse_time(row["start_time"]),
+                    "end": _parse_time(row["end_time"]), "duration": row.get("duration"),
+                    "description": row.get("description"),
+                }
+                # Same rules as every other entry point, except that history may be in the past
+                reason = validate(kind, slot["name"], slot["date"], slot["start"], slot["end"], allow_past=True)
+            except (KeyError, TypeError, ValueError) as e:
+                rejected.append((row.get("username"), row.get(column), row.get("date"), row.get("start_time"),
+                                 f"Unreadable row: {e}"))
+                continue
+            if reason:
+                rejected.append((slot["username"], slot["name"], slot["date"], slot["start"], reason))
+                continue
+            rows.append(row)
+            slots.append(slot)
+        # One reserve_batch per batch, whatever mix of users it holds
+        for row, slot, (booking_id, reason) in zip(rows, slots, reserve_batch(conn, slots)):
+            if booking_id is None:
+                rejected.append((slot["username"], slot["name"], slot["date"], slot["start"], reason))
+            else:
+                imported += 1
+                if id_map is not None and row.get("id") is not None:
+                    id_map[int(row["id"])] = booking_id
+    return imported, rejected
+
+
+def _new_booking_id(id_map, old_id):
+    try:
+        return id_map.get(int(old_id))
+    except (TypeError, ValueError):
+        return None
+
+
+def _import_requests(conn, table, batches, id_map):
+    """
+    Insert requests pointed at their bookings' new ids (`id_map`, from the
+    bookings import). Requests whose booking is not in the map are rejected:
+    their exported booking_id may now belong to an unrelated booking.
+    """
+    if id_map is None:
+        raise ValueError("Cancellation requests need the id map written by importing their bookings (--id-map).")
+    kind, _ = EXPORT_TABLES[table]
+    columns = ("booking_id", "teacher_username", "reason", "status", "created_at")
+    imported, rejected = 0, []
+    for batch in batches:
+        by_columns = {}
+        for row in batch:
+            booking_id = _new_booking_id(id_map, row.get("booking_id"))
+            if booking_id is None:
+                rejected.append((row.get("teacher_username"), f"booking {row.get('booking_id')}", None, None,
+                                 "Its booking was not imported (rejected or missing)."))
+                continue
+            row = {**row, "booking_id": booking_id}
+            # Empty cells are left out, so NOT NULL DEFAULT columns (status, created_at) get their default
+            present = tuple(c for c in columns if row.get(c) is not None)
+            by_columns.setdefault(present, []).append([row[c] for c in present])
+        for present, rows in by_columns.items():
+            repository.run_many(conn, f"import_{table}", rows, sql=f"""
+                INSERT INTO {table} ({', '.join(present)}) VALUES ({', '.join(['%s'] * len(present))})
+            """)
+            imported += len(rows)
+        if by_columns:
+            conn.commit()
+            versions.bump(conn, [(versions.requests_scope(kind), datetime.date.today())])
+    return imported, rejected
+
+
+def write_id_map(path, id_map):
+    with open(path, "w", newline="", encoding="utf-8") as out:
+        writer = csv.writer(out)
+        writer.writerow(["old_id", "new_id"])
+        writer.writerows(sorted(id_map.items()))
+
+
+def read_id_map(path):
+    with open(path, newline="", encoding="utf-8") as f:
+        return {int(row["old_id"]): int(row["new_id"]) for row in csv.DictReader(f)}
+
+
+def import_file(conn, path, table, fmt=None, batch_size=BATCH_SIZE, id_map=None):
+    """
+    Bulk-import an exported file into `table`, one batch at a time.
+    Returns (rows imported, rejected rows as (username, resource, date, start, reason)).
+
+    Importing bookings fills `id_map` (if given) with {exported id: new id};
+    importing cancellation requests requires that map for their bookings.
+    """
+    reader = _read_parquet if (fmt or _format_of(path)) == "parquet" else _read_csv
+    batches = reader(path, batch_size)
+    if EXPORT_TABLES[table][1] is None:
+        return _import_bookings(conn, table, batches, id_map)
+    return _import_requests(conn, table, batches, id_map)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Streaming export / bulk import of bookings.")
+    parser.add_argument("action", choices=["export", "import"])
+    parser.add_argument("table", choices=list(EXPORT_TABLES))
+    parser.add_argument("path")
+    parser.add_argument("--from", dest="date_from", type=datetime.date.fromisoformat)
+    parser.add_argument("--to", dest="date_to", type=datetime.date.fromisoformat)
+    parser.add_argument("--resource")
+    parser.add_argument("--format", choices=FORMATS)
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--id-map", help="CSV of exported -> new booking ids: written when importing bookings, "
+                                         "read when importing cancellation requests")
+    args = parser.parse_args()
+
+    conn = repository.connect()
+    try:
+        if args.action == "export":
+            count = export(conn, args.path, args.table, args.date_from, args.date_to, args.resource,
+                           args.format, args.batch_size)
+            print(f"Exported {count} rows to {args.path}")
+        else:
+            requests = EXPORT_TABLES[args.table][1] is not None
+            id_map = read_id_map(args.id_map) if requests and args.id_map else ({} if args.id_map else None)
+            count, rejected = import_file(conn, args.path, args.table, args.format, args.batch_size, id_map)
+            if args.id_map and not requests:
+                write_id_map(args.id_map, id_map)
+            for *where, reason in rejected:
+                print(f"REJECTED {' '.join(str(v) for v in where if v is not None)}: {reason}")
+            print(f"Imported {count} rows, rejected {len(rejected)}")
+    except (RuntimeError, ValueError) as e:
+        sys.exit(str(e))
+    finally:
+        conn.close()
@@ -0,0 +1,102 @@
+import repository
+from repository import ARCHIVE_TABLES, RESOURCE_TABLES, UPCOMING
+
+PAGE_SIZES = (10, 25, 50, 100)
+MAX_PAGE_SIZE = max(PAGE_SIZES)
+
+
+def _keyset(kind, after, descending):
+    """
+    Predicate for rows of `kind` strictly after the cursor (date, start_time, kind, id)
+    in feed order. kind is constant within a branch, so it only decides whether
+    ties on (date, start_time) are kept, dropped, or broken by id.
+    """
+    date, start, after_kind, after_id = after
+    lt = "<" if descending else ">"
+    if kind == after_kind:
+        return (f"(date {lt} %s OR (date = %s AND (start_time {lt} %s OR (start_time = %s AND id {lt} %s))))",
+                [date, date, start, start, after_id])
+    # On equal (date, start_time), rows of a "smaller" kind come after the cursor in DESC order
+    ties_follow = (kind < after_kind) == descending
+    op = f"{lt}=" if ties_follow else lt
+    return f"(date {lt} %s OR (date = %s AND start_time {op} %s))", [date, date, start]
+
+
+def history_query(username, kinds=("classroom", "lab"), date_from=None, date_to=None,
+                  upcoming_only=False, after=None, page_size=25, descending=True, include_archive=None):
+    """
+    (sql, params) for one page of the history feed; see history_page().
+    Fetches page_size + 1 rows so the caller can tell whether more exist.
+    Archived bookings are past, so the archive tables are only read when
+    past rows are wanted (include_archive defaults to not upcoming_only).
+    """
+    if include_archive is None:
+        include_archive = not upcoming_only
+    direction = "DESC" if descending else "ASC"
+    order = f"ORDER BY date {direction}, start_time {direction}, kind {direction}, id {direction}"
+
+    branches, params = [], []
+    sources = []
+    for kind in sorted(kinds):
+        table, column = RESOURCE_TABLES[kind]
+        sources.append((kind, table, column, f"{kind}_page"))
+        if include_archive:
+            sources.append((kind, ARCHIVE_TABLES[kind], column, f"{kind}_archive_page"))
+
+    # Live and archived rows share one id sequence, so (date, start_time, kind, id) stays a total order
+    for kind, table, column, alias in sources:
+        where, branch_params = ["username = %s"], [username]
+        if date_from is not None:
+            where.append("date >= %s")
+            branch_params.append(date_from)
+        if date_to is not None:
+            where.append("date <= %s")
+            branch_params.append(date_to)
+        if upcoming_only:
+            where.append(UPCOMING)
+        if after is not None:
+            predicate, predicate_params = _keyset(kind, after, descending)
+            where.append(predicate)
+            branch_params += predicate_params
+        branches.append(f"""
+            SELECT * FROM (
+                SELECT '{kind}' AS kind, id, {column} AS resource, floor, date,
+                       start_time, end_time, duration, description
+                FROM {table}
+                WHERE {' AND '.join(where)}
+                ORDER BY date {direction}, start_time {direction}, id {direction}
+                LIMIT {page_size + 1}
+            ) AS {alias}""")
+        params += branch_params
+
+    if not branches:
+        return None, []
+    return " UNION ALL ".join(branches) + f" {order} LIMIT {page_size + 1}", params
+
+
+def history_page(conn, username, kinds=("classroom", "lab"), date_from=None, date_to=None,
+                 upcoming_only=False, after=None, page_size=25, descending=True):
+    """
+    One page of a user's classroom + lab bookings (live and, for past rows,
+    archived) from a single UNION query.
+
+    Rows are ordered by (date, start_time, kind, id) and paginated by keyset:
+    pass the returned `next_after` as `after` to get the following page. Each
+    UNION branch is limited on its own (username/date index) so the cost
+    depends on the page size only, never on how much history exists.
+
+    Returns (rows, next_after); next_after is None on the last page.
+    """
+    page_size = max(1, min(int(page_size), MAX_PAGE_SIZE))
+    sql, params = history_query(username, kinds, date_from, date_to, upcoming_only, after, page_size, descending)
+    if sql is None:
+        return [], None
+
+    # A handful of shapes (kinds x filters x cursor) per page size, so they are worth preparing
+    rows = repository.fetch_all(conn, "history_page", params, sql=sql, dictionary=True)
+
+    if len(rows) <= page_size:
+        return rows, None
+    rows = rows[:page_size]
+    last = rows[-1]
+    return rows, (last["date"], last["start_time"], last["kind"], last["id"])
@@ -1,18 +1,37 @@
 import streamlit as st
-import mysql.connector
 import datetime
+import os
+import shutil
+import tempfile
+import numpy as np
 import pandas as pd
 
+import allocator
+import archive
+import catalog
+import export
+import history
+import occupancy
+import perf
+import pool
+import recurring
+import repository
+import room_search
+import slot_finder
+import versions
+from availability import get_index
+from booking import (BookingBusy, BookingConflict, approve_cancellations, reject_cancellations,
+                     request_cancellation, reserve_many, reserve_together, validate)
+
 # =========================================================
 # DB CONNECTION
 # =========================================================
 def get_connection():
-    return mysql.connector.connect(
-        host="localhost",
-        user="root",
-        password="nidhi06yash",   # <-- adjust if needed
-        database="bookmyclassroom"
-    )
+    """
+    Borrow a connection from the process-wide pool (see pool.py).
+    conn.close() hands it back instead of closing the socket.
+    """
+    return pool.get_connection()
 
 # Small helper so we can accept either a dict {"username": "..."} or a string "..."
 def _username_of(user):
@@ -21,77 +40,103 @@ def _username_of(user):
     return user
 
 # =========================================================
-# BOOKING HELPERS (time overlap, validation)
+# BOOKING HELPERS (validation, commit)
 # =========================================================
-def _times_overlap(existing_start, existing_end, new_start, new_end):
+def book_resources(user, resources, date, start, end, duration, description):
     """
-    Overlap rule (half-open intervals): [start, end)
-    Two slots overlap if NOT (existing_end <= new_start OR existing_start >= new_end)
+    Books one or more resources - (kind, name, floor) - for the same slot, all
+    or nothing, with the same validation and commit path for classrooms and labs.
+    Accepts user as dict({"username": ...}) or plain string username.
     """
-    return not (existing_end <= new_start or existing_start >= new_end)
+    username = _username_of(user)
+    if not username:
+        st.error("No user in session—please log in again.")
+        return False
+    for kind, name, _ in resources:
+        reason = validate(kind, name, date, start, end)
+        if reason:
+            st.error(reason)
+            return False
 
-def is_booking_available(room, date, start, end):
-    """
-    Correct overlap check for the given room/date/time window.
-    """
-    if start >= end:
-        return False  # invalid time range
+    # Cheap pre-check in the availability index before taking any lock
+    taken = [name for kind, name, _ in resources if not get_index().is_free(kind, name, date, start, end)]
+    if taken:
+        st.error(f"{', '.join(taken)} {'is' if len(taken) == 1 else 'are'} already booked for the selected time slot.")
+        return False
 
     conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute("""
-        SELECT 1
-        FROM bookings
-        WHERE room_name = %s
-          AND date = %s
-          AND NOT (end_time <= %s OR start_time >= %s)
-        LIMIT 1
-    """, (room, date, start, end))
-    conflict = cursor.fetchone()
-    conn.close()
-    return conflict is None
+    try:
+        # Atomic check-and-insert under per-resource/per-date locks (see booking.py)
+        reserve_together(conn, username, resources, date, start, end, duration, description)
+        return True
+    except (BookingConflict, BookingBusy) as e:
+        st.error(str(e))
+        return False
+    except Exception as e:
+        st.error(f"Booking failed: {e}")
+        return False
+    finally:
+        conn.close()
 
 def book_room(user, room, floor, date, start, end, duration, description):
     """
     Inserts a classroom booking after checking overlap and validating inputs.
-    Accepts user as dict({"username": ...}) or plain string username.
     """
-    username = _username_of(user)
+    return book_resources(user, [("classroom", room, floor)], date, start, end, duration, description)
 
-    # Basic validations
+def _duration_of(start, end):
+    return str(
+        datetime.datetime.combine(datetime.date.today(), end)
+        - datetime.datetime.combine(datetime.date.today(), start)
+    )
+
+def book_room_series(user, slots):
+    """
+    Books many classroom slots in one go (recurring rule or CSV import).
+    Each slot is a dict with room, date, start, end, description (floor optional).
+    Returns a per-row report: [{"room", "date", "start", "end", "status", "reason", "booking_id"}].
+    """
+    username = _username_of(user)
     if not username:
         st.error("No user in session—please log in again.")
-        return False
-    if start >= end:
-        st.error("End time must be after start time.")
-        return False
-    if date < datetime.date.today():
-        st.error("Date cannot be in the past.")
-        return False
+        return []
+
+    report = [
+        {"room": s["room"], "date": s["date"], "start": s["start"], "end": s["end"],
+         "status": "Rejected", "reason": "", "booking_id": None}
+        for s in slots
+    ]
+    room_floors = catalog.room_floors()
+    # Same validations as book_room, applied per row before borrowing a connection
+    valid = []
+    for i, slot in enumerate(slots):
+        report[i]["reason"] = validate("classroom", slot["room"], slot["date"], slot["start"], slot["end"]) or ""
+        if not report[i]["reason"]:
+            valid.append(i)
 
     conn = get_connection()
-    cursor = conn.cursor()
     try:
-        conn.start_transaction()
-
-        if not is_booking_available(room, date, start, end):
-            conn.rollback()
-            st.error("This classroom is already booked for the selected time slot.")
-            return False
-
-        cursor.execute("""
-            INSERT INTO bookings (username, room_name, floor, date, start_time, end_time, duration, description)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-        """, (username, room, floor, date, start, end, duration, description))
-
-        conn.commit()
-        return True
+        results = reserve_many(conn, "classroom", username, [
+            {"name": slots[i]["room"], "floor": slots[i].get("floor") or room_floors[slots[i]["room"]],
+             "date": slots[i]["date"], "start": slots[i]["start"], "end": slots[i]["end"],
+             "duration": _duration_of(slots[i]["start"], slots[i]["end"]),
+             "description": slots[i].get("description", "")}
+            for i in valid
+        ])
+        for i, (booking_id, reason) in zip(valid, results):
+            if booking_id is not None or reason is None:
+                report[i].update(status="Booked", booking_id=booking_id)
+            else:
+                report[i]["reason"] = reason
+    except BookingBusy as e:
+        st.error(str(e))
+        return []
     except Exception as e:
-        conn.rollback()
-        st.error(f"Booking failed: {e}")
-        return False
+        st.error(f"Bulk booking failed: {e}")
+        return []
     finally:
         conn.close()
+    return report
 
 # =========================================================
 # AUTH
@@ -102,10 +147,10 @@ def login():
     password = st.text_input("Password", type="password")
     if st.button("Login"):
         conn = get_connection()
-        cursor = conn.cursor(dictionary=True)
-        cursor.execute("SELECT * FROM faculty WHERE username = %s AND password = %s", (username, password))
-        user = cursor.fetchone()
-        conn.close()
+        try:
+            user = repository.login(conn, username, password)
+        finally:
+            conn.close()
 
         if user:
             st.session_state["user"] = user["username"]
@@ -123,12 +168,8 @@ def register():
     role = st.selectbox("Role", ["teacher", "admin"])
     if st.button("Register"):
         conn = get_connection()
-        cursor = conn.cursor()
         try:
-            cursor.execute("""
-                INSERT INTO faculty (name, username, password, role)
-                VALUES (%s, %s, %s, %s)
-            """, (name, username, password, role))
+            repository.register_faculty(conn, name, username, password, role)
             conn.commit()
             st.success("Registration successful. Please login.")
         except Exception as e:
@@ -142,45 +183,125 @@ def register():
 # =========================================================
 def booking_page(user):
     st.subheader("Book a Classroom")
-    floor = st.selectbox("Select Floor", ["1st","2nd","3rd", "4th"])
+    slot_finder_section(user)
+    floor = st.selectbox("Select Floor", ["Any"] + list(catalog.floors()))
+    col1, col2 = st.columns(2)
+    min_capacity = col1.number_input("Minimum capacity", min_value=0, value=0, step=5)
+    features = col2.multiselect("Required features", catalog.room_index().features())
     date = st.date_input("Date", min_value=datetime.date.today())
     start = st.time_input("Start Time")
     default_end = (datetime.datetime.combine(datetime.date.today(), start) + datetime.timedelta(hours=1)).time()
     end = st.time_input("End Time", value=default_end)
     description = st.text_area("Description (optional):", "")
 
-    # Fetch available rooms on that floor by excluding rooms with overlapping bookings
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute("""
-        SELECT DISTINCT room_name
-        FROM classrooms
-        WHERE floor = %s
-          AND room_name NOT IN (
-                SELECT room_name
-                FROM bookings
-                WHERE date = %s
-                  AND NOT (end_time <= %s OR start_time >= %s)
-          )
-        ORDER BY room_name
-    """, (floor, date, start, end))
-    rooms = [row[0] for row in cursor.fetchall()]
-    conn.close()
+    # Suitable rooms (room index), minus those with overlapping bookings (availability index), best fit first
+    rooms = room_search.search(date, start, end, int(min_capacity), features,
+                               floor=None if floor == "Any" else floor)
 
     if not rooms:
         st.warning("No classrooms available for the selected slot.")
         return
 
-    room = st.selectbox("Available Rooms", rooms)
+    labels = {f"{r['resource']} · {r['floor']} floor · {r['capacity']} seats": r for r in rooms}
+    choice = labels[st.selectbox("Available Rooms (best fit first)", list(labels))]
+    room = choice["resource"]
+    # Optional labs for the same slot, booked together with the room (all or nothing)
+    free_labs = get_index().free_resources("lab", list(catalog.lab_floors()), date, start, end)
+    labs = st.multiselect("Also book lab(s) for the same slot", free_labs)
 
     if st.button("Book Now"):
-        duration = str(
-            datetime.datetime.combine(datetime.date.today(), end)
-            - datetime.datetime.combine(datetime.date.today(), start)
-        )
-        success = book_room(user, room, floor, date, start, end, duration, description)
+        duration = _duration_of(start, end)
+        resources = [("classroom", room, choice["floor"])] + [("lab", lab, catalog.lab_floor(lab)) for lab in labs]
+        success = book_resources(user, resources, date, start, end, duration, description)
         if success:
-            st.success(f"Classroom {room} booked successfully!")
+            st.success(f"Classroom {room} booked successfully!" if not labs
+                       else f"Classroom {room} and {', '.join(labs)} booked successfully!")
+
+# =========================================================
+# SLOT FINDER – for teacher/admin
+# =========================================================
+def slot_finder_section(user):
+    with st.expander("🔎 Find me a slot"):
+        col1, col2 = st.columns(2)
+        minutes = col1.number_input("Duration (minutes)", min_value=15, max_value=600, value=60, step=15)
+        limit = col2.number_input("Suggestions", min_value=1, max_value=20, value=5)
+        today = datetime.date.today()
+        dates = st.date_input("Between", value=(today, today + datetime.timedelta(days=7)),
+                              min_value=today, key="finder_dates")
+        day_start = col1.time_input("Working hours from", value=datetime.time(8), key="finder_from")
+        day_end = col2.time_input("Working hours to", value=datetime.time(18), key="finder_to")
+        floor = col1.selectbox("Floor", ["Any"] + list(catalog.floors()), key="finder_floor")
+        min_capacity = col2.number_input("Minimum capacity (classrooms only, 0 = any)", min_value=0, value=0, step=5)
+        kinds = st.multiselect("Resources", ["classroom", "lab"], default=["classroom", "lab"], key="finder_kinds")
+        features = st.multiselect("Required features (classrooms only)", catalog.room_index().features(),
+                                  key="finder_features")
+        skip_sunday = st.checkbox("Skip Sundays", value=True)
+
+        if len(dates) != 2:
+            return
+        slots = slot_finder.find_slots(
+            datetime.timedelta(minutes=int(minutes)), dates[0], dates[1], kinds=kinds,
+            floor=None if floor == "Any" else floor,
+            min_capacity=int(min_capacity) or None,
+            features=features,
+            day_start=day_start, day_end=day_end, limit=int(limit),
+            weekdays=range(6) if skip_sunday else None,
+        )
+        if not slots:
+            st.warning("No free slot matches these constraints — try a wider date range or shorter duration.")
+            return
+        st.dataframe(pd.DataFrame(slots))
+
+        labels = [f"{s['date']} {s['start']:%H:%M}–{s['end']:%H:%M} · {s['resource']} ({s['kind']})" for s in slots]
+        choice = st.selectbox("Pick a slot", range(len(slots)), format_func=labels.__getitem__)
+        description = st.text_input("Description", key="finder_description")
+        if st.button("Book this slot"):
+            slot = slots[choice]
+            duration = _duration_of(slot["start"], slot["end"])
+            if book_resources(user, [(slot["kind"], slot["resource"], slot["floor"])], slot["date"],
+                              slot["start"], slot["end"], duration, description):
+                st.success(f"{slot['kind'].title()} {slot['resource']} booked successfully!")
+
+# =========================================================
+# RECURRING / BULK BOOKING – for teacher/admin
+# =========================================================
+def bulk_booking_section(user):
+    st.write("---")
+    st.subheader("Recurring / Bulk Booking")
+
+    mode = st.radio("Source", ["Weekly rule", "CSV import"], horizontal=True)
+    slots = []
+    if mode == "Weekly rule":
+        room = st.text_input("Room name", key="bulk_room")
+        first = st.date_input("First date", min_value=datetime.date.today(), key="bulk_first")
+        weeks = st.number_input("Number of weeks", min_value=1, max_value=52, value=16, key="bulk_weeks")
+        interval = st.selectbox("Repeat", [1, 2], format_func=lambda n: "Every week" if n == 1 else "Every other week")
+        start = st.time_input("Start Time", key="bulk_start")
+        end = st.time_input("End Time", key="bulk_end")
+        description = st.text_input("Description", key="bulk_description")
+        if room:
+            dates = recurring.weekly(first, weeks=int(weeks), interval=interval)
+            slots = recurring.expand(room, dates, start, end, description)
+            st.caption(f"{len(slots)} occurrence(s): {dates[0]} … {dates[-1]}")
+    else:
+        st.caption("Columns: room,date,start,end[,description] — e.g. Room 31,2025-01-06,10:00,11:00,DBMS")
+        upload = st.file_uploader("Timetable CSV", type="csv")
+        if upload is not None:
+            try:
+                slots, errors = recurring.parse_csv(upload.getvalue())
+            except ValueError as e:
+                st.error(str(e))
+                return
+            for line, message in errors:
+                st.warning(f"Line {line}: {message}")
+            st.caption(f"{len(slots)} row(s) parsed.")
+
+    if slots and st.button("Book All"):
+        report = book_room_series(user, slots)
+        if report:
+            booked = sum(1 for row in report if row["status"] == "Booked")
+            st.success(f"{booked} of {len(report)} slot(s) booked.")
+            st.dataframe(pd.DataFrame(report))
 
 # =========================================================
 # LAB BOOKING DASHBOARD – for teacher/admin
@@ -188,13 +309,8 @@ def booking_page(user):
 def lab_booking_dashboard(user):
     st.header("Lab Booking Dashboard")
 
-    conn = get_connection()
-    cursor = conn.cursor(dictionary=True)
-
-    # Get all labs (no floor filter)
-    cursor.execute("SELECT * FROM labs ORDER BY lab_name")
-    labs = cursor.fetchall()
-    lab_names = [lab['lab_name'] for lab in labs]
+    # Get all labs (no floor filter) from the cached catalogue
+    lab_names = [lab_name for lab_name, _ in catalog.labs()]
     selected_lab = st.selectbox("Select Lab", lab_names)
 
     date = st.date_input("Select Date", min_value=datetime.date.today(), key="lab_date_input")
@@ -212,49 +328,20 @@ def lab_booking_dashboard(user):
     description = st.text_area("Purpose / Description")
 
     # Get floor for selected lab (if any)
-    selected_lab_info = next((lab for lab in labs if lab["lab_name"] == selected_lab), None)
-    floor = selected_lab_info["floor"] if selected_lab_info else ""
+    floor = catalog.lab_floor(selected_lab)
 
     if st.button("Book Lab"):
-        # Clash check using proper overlap logic
-        cursor.execute("""
-            SELECT 1
-            FROM lab_bookings
-            WHERE lab_name = %s
-              AND date = %s
-              AND NOT (end_time <= %s OR start_time >= %s)
-            LIMIT 1
-        """, (selected_lab, date, start_time, end_time))
-        clashes = cursor.fetchone()
-
-        if clashes:
-            st.error("This lab is already booked for the selected time slot.")
-        else:
-            cursor.execute("""
-                INSERT INTO lab_bookings (username, lab_name, floor, date, start_time, end_time, duration, description)
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-            """, (_username_of(user), selected_lab, floor, date, start_time, end_time, duration, description))
-            conn.commit()
+        if book_resources(user, [("lab", selected_lab, floor)], date, start_time, end_time, duration, description):
             st.success("Lab booked successfully.")
 
     # Show existing bookings
     st.subheader("My Lab Bookings")
 
-    if user["role"] == "admin":
-        cursor.execute("""
-            SELECT * FROM lab_bookings
-            WHERE (date > CURDATE() OR (date = CURDATE() AND end_time > CURTIME()))
-            ORDER BY date DESC, start_time DESC
-        """)
-    else:
-        cursor.execute("""
-            SELECT * FROM lab_bookings
-            WHERE username = %s
-                AND (date > CURDATE() OR (date = CURDATE() AND end_time > CURTIME()))
-            ORDER BY date DESC, start_time DESC
-        """, (_username_of(user),))
-
-    bookings = cursor.fetchall()
+    username = None if user["role"] == "admin" else _username_of(user)
+    bookings = versions.cached(("upcoming_labs", username, versions.minute_of()), ["lab"],
+                               datetime.date.today(), None,
+                               lambda conn: repository.upcoming_bookings(conn, "lab", username))
+
     df = pd.DataFrame(bookings)
     if not df.empty:
         st.dataframe(df)
@@ -264,32 +351,19 @@ def lab_booking_dashboard(user):
             selected = st.selectbox("Select Booking to Cancel", [""] + booking_ids)
             if selected and st.button("Send Cancel Request"):
                 selected_id = int(selected.split(" - ")[0])
-                cursor.execute("""
-                    INSERT INTO cancel_lab_requests (lab_booking_id, teacher_username, reason)
-                    VALUES (%s, %s, %s)
-                """, (selected_id, _username_of(user), "Requested by user"))
-                conn.commit()
-                st.success("Cancellation request sent.")
+                # Borrow a connection only for the write; the rest of the page uses cached reads
+                conn = get_connection()
+                try:
+                    request_cancellation(conn, "lab", selected_id, _username_of(user), "Requested by user")
+                    st.success("Cancellation request sent.")
+                except Exception as e:
+                    st.error(f"Failed to send request: {e}")
+                finally:
+                    conn.close()
 
     if user["role"] == "admin":
         st.subheader("Lab Cancellation Requests")
-        cursor.execute("SELECT * FROM cancel_lab_requests WHERE status = 'Pending'")
-        requests = cursor.fetchall()
-        for req in requests:
-            st.write(f"Request ID: {req['id']} | Booking ID: {req['lab_booking_id']} | Teacher: {req['teacher_username']}")
-            col1, col2 = st.columns(2)
-            if col1.button(f"Approve {req['id']}"):
-                cursor.execute("DELETE FROM lab_bookings WHERE id = %s", (req["lab_booking_id"],))
-                cursor.execute("UPDATE cancel_lab_requests SET status = 'Approved' WHERE id = %s", (req["id"],))
-                conn.commit()
-                st.success(f"Booking {req['lab_booking_id']} cancelled.")
-            if col2.button(f"Reject {req['id']}"):
-                cursor.execute("UPDATE cancel_lab_requests SET status = 'Rejected' WHERE id = %s", (req["id"],))
-                conn.commit()
-                st.info(f"Request {req['id']} rejected.")
-
-    cursor.close()
-    conn.close()
+        cancellation_queue("lab", key="lab_dashboard")
 
 # =========================================================
 # BOOKING HISTORY (Teachers can request cancellations)
@@ -300,62 +374,47 @@ def booking_history(user, role=None):
     # Checkbox to toggle past bookings
     show_past = st.checkbox("Show past bookings", value=False)
 
-    # --- Classroom bookings ---
-    conn = get_connection()
-    cursor = conn.cursor(dictionary=True)
-
-    if show_past:
-        cursor.execute("""
-            SELECT * FROM bookings
-            WHERE username = %s
-            ORDER BY date DESC, start_time DESC
-        """, (_username_of(user),))
-    else:
-        cursor.execute("""
-            SELECT * FROM bookings
-            WHERE username = %s
-              AND (date > CURDATE() OR (date = CURDATE() AND end_time > CURTIME()))
-            ORDER BY date ASC, start_time ASC
-        """, (_username_of(user),))
-
-    classroom_bookings = cursor.fetchall()
-    cursor.close()
-    conn.close()
-
-    # --- Lab bookings ---
-    conn = get_connection()
-    cursor = conn.cursor(dictionary=True)
-
-    if show_past:
-        cursor.execute("""
-            SELECT * FROM lab_bookings
-            WHERE username = %s
-            ORDER BY date DESC, start_time DESC
-        """, (_username_of(user),))
-    else:
-        cursor.execute("""
-            SELECT * FROM lab_bookings
-            WHERE username = %s
-              AND (date > CURDATE() OR (date = CURDATE() AND end_time > CURTIME()))
-            ORDER BY date ASC, start_time ASC
-        """, (_username_of(user),))
+    col1, col2, col3 = st.columns(3)
+    types = col1.multiselect("Type", ["Classroom", "Lab"], default=["Classroom", "Lab"])
+    page_size = col2.selectbox("Rows per page", history.PAGE_SIZES, index=1)
+    date_range = col3.date_input("Date range (optional)", value=())
+    date_from, date_to = (tuple(date_range) + (None, None))[:2]
 
-    lab_bookings = cursor.fetchall()
-    cursor.close()
-    conn.close()
+    # Keyset pagination: remember the cursor of every page we've seen for these filters
+    filters = (show_past, tuple(types), page_size, date_from, date_to)
+    if st.session_state.get("history_filters") != filters:
+        st.session_state["history_filters"] = filters
+        st.session_state["history_cursors"] = [None]
+    cursors = st.session_state["history_cursors"]
+
+    conn = get_connection()
+    try:
+        rows, next_after = history.history_page(
+            conn, _username_of(user),
+            kinds=[t.lower() for t in types],
+            date_from=date_from, date_to=date_to,
+            upcoming_only=not show_past,
+            after=cursors[-1],
+            page_size=page_size,
+            descending=show_past,
+        )
+    finally:
+        conn.close()
 
     # --- Display results ---
-    if classroom_bookings:
-        st.write("🏫 Classroom Bookings")
-        st.table(classroom_bookings)
+    if rows:
+        st.dataframe(pd.DataFrame(rows))
     else:
-        st.info("No classroom bookings found.")
+        st.info("No bookings found.")
 
-    if lab_bookings:
-        st.write("🧪 Lab Bookings")
-        st.table(lab_bookings)
-    else:
-        st.info("No lab bookings found.")
+    prev_col, page_col, next_col = st.columns([1, 2, 1])
+    page_col.caption(f"Page {len(cursors)}")
+    if len(cursors) > 1 and prev_col.button("◀ Previous"):
+        cursors.pop()
+        st.rerun()
+    if next_after is not None and next_col.button("Next ▶"):
+        cursors.append(next_after)
+        st.rerun()
 
     # Teachers can request cancellations
     if role == "teacher":
@@ -368,23 +427,10 @@ def booking_history(user, role=None):
 
         if st.button("Send Request"):
             conn = get_connection()
-            cursor = conn.cursor()
             try:
-                if booking_type == "Classroom":
-                    cursor.execute("""
-                        INSERT INTO cancel_requests (booking_id, teacher_username, reason)
-                        VALUES (%s, %s, %s)
-                    """, (booking_id, _username_of(user), reason))
-                else:
-                    cursor.execute("""
-                        INSERT INTO cancel_lab_requests (booking_id, teacher_username, reason)
-                        VALUES (%s, %s, %s)
-                    """, (booking_id, _username_of(user), reason))
-
-                conn.commit()
+                request_cancellation(conn, booking_type.lower(), booking_id, _username_of(user), reason)
                 st.success("Cancellation request sent successfully ✅")
             except Exception as e:
-                conn.rollback()
                 st.error(f"Failed to send request: {e}")
             finally:
                 conn.close()
@@ -392,104 +438,309 @@ def booking_history(user, role=None):
 # =========================================================
 # CANCELLATION MANAGEMENT (Admin Only)
 # =========================================================
+def cancellation_queue(kind, key):
+    """
+    Filterable queue of pending requests of `kind` (one JOIN with the booking
+    details) with bulk approve / reject of the selected requests.
+    """
+    # Result of the last bulk action survives the rerun that refreshes the queue
+    flash = st.session_state.pop(f"{key}_flash", None)
+    if flash:
+        getattr(st, flash[0])(flash[1])
+
+    resources = [r[0] for r in catalog.classrooms()] if kind == "classroom" else [lab[0] for lab in catalog.labs()]
+    col1, col2, col3 = st.columns(3)
+    teacher = col1.text_input("Teacher", key=f"{key}_teacher").strip()
+    resource = col2.selectbox("Room / lab", [""] + resources, key=f"{key}_resource")
+    date_range = col3.date_input("Booking dates", value=(), key=f"{key}_dates")
+    date_from, date_to = (tuple(date_range) + (None, None))[:2]
+
+    # Reloaded only after a request, approval, rejection or booking change of this kind
+    queue = versions.cached(("pending_queue", teacher, date_from, date_to, resource),
+                            [kind, versions.requests_scope(kind)], None, None,
+                            lambda conn: repository.pending_queue(conn, kind, teacher=teacher, date_from=date_from,
+                                                                  date_to=date_to, resource=resource))
+
+    if not queue:
+        st.info("No pending requests.")
+        return
+
+    st.dataframe(pd.DataFrame(queue))
+
+    labels = {
+        f"{r['request_id']} - {r['resource'] or 'deleted booking'} {r['date'] or ''} "
+        f"{r['start_time'] or ''} ({r['teacher_username']})": r["request_id"]
+        for r in queue
+    }
+    select_all = st.checkbox(f"Select all {len(queue)} shown", key=f"{key}_all")
+    selected = list(labels.values()) if select_all else [
+        labels[label] for label in st.multiselect("Requests to process", list(labels), key=f"{key}_selected")
+    ]
+
+    col1, col2 = st.columns(2)
+    approve = col1.button(f"Approve {len(selected)} selected", key=f"{key}_approve", disabled=not selected)
+    reject = col2.button(f"Reject {len(selected)} selected", key=f"{key}_reject", disabled=not selected)
+    if not (approve or reject):
+        return
+
+    conn = get_connection()
+    try:
+        if approve:
+            approved, deleted = approve_cancellations(conn, kind, selected)
+            flash = ("success", f"{approved} request(s) approved, {deleted} booking(s) cancelled.")
+        else:
+            rejected = reject_cancellations(conn, kind, selected)
+            flash = ("info", f"{rejected} request(s) rejected.")
+    except Exception as e:
+        st.error(f"Action failed: {e}")
+        return
+    finally:
+        conn.close()
+    st.session_state[f"{key}_flash"] = flash
+    st.session_state.pop(f"{key}_selected", None)
+    st.rerun()
+
+
 def manage_cancellations():
     st.subheader("Manage Cancellation Requests (Admin Only)")
 
     request_type = st.radio("Select Request Type:", ["Classroom", "Lab"])
+    cancellation_queue(request_type.lower(), key="manage_cancellations")
+
+# =========================================================
+# ROOMS & LABS (Admin Only)
+# =========================================================
+def manage_resources():
+    st.subheader("Manage Rooms & Labs (Admin Only)")
+
+    st.write("### 🏫 Classrooms")
+    st.dataframe(pd.DataFrame(catalog.classrooms(), columns=["Room", "Floor", "Capacity", "Features"]))
+    with st.form("add_classroom"):
+        room_name = st.text_input("Room name")
+        floor = st.text_input("Floor (e.g. 3rd)")
+        capacity = st.number_input("Capacity", min_value=1, step=1, value=60)
+        features = st.text_input("Features", "computers, projector")
+        if st.form_submit_button("Add Classroom") and room_name:
+            catalog.add_classroom(room_name, floor, capacity, features)
+            st.success(f"Classroom {room_name} added.")
+    remove_room = st.selectbox("Remove classroom", [""] + [r[0] for r in catalog.classrooms()])
+    if remove_room and st.button("Remove Classroom"):
+        catalog.remove_classroom(remove_room)
+        st.success(f"Classroom {remove_room} removed.")
+
+    st.write("### 🧪 Labs")
+    st.dataframe(pd.DataFrame(catalog.labs(), columns=["Lab", "Floor"]))
+    with st.form("add_lab"):
+        lab_name = st.text_input("Lab name")
+        lab_floor = st.text_input("Floor", key="lab_floor")
+        if st.form_submit_button("Add Lab") and lab_name:
+            catalog.add_lab(lab_name, lab_floor)
+            st.success(f"Lab {lab_name} added.")
+    remove_lab = st.selectbox("Remove lab", [""] + [lab[0] for lab in catalog.labs()])
+    if remove_lab and st.button("Remove Lab"):
+        catalog.remove_lab(remove_lab)
+        st.success(f"Lab {remove_lab} removed.")
+
+# =========================================================
+# UTILISATION REPORTS (Admin Only) – read from the rollup tables only
+# =========================================================
+def reports_page():
+    st.subheader("📊 Utilisation Reports (Admin Only)")
+
+    today = datetime.date.today()
+    col1, col2 = st.columns(2)
+    kind = col1.radio("Resource type", ["Classroom", "Lab"], horizontal=True).lower()
+    date_range = col2.date_input("Period", value=(today - datetime.timedelta(days=27), today))
+    if len(date_range) != 2:
+        st.info("Select a start and end date.")
+        return
+    first, last = date_range
 
     conn = get_connection()
     try:
-        if request_type == "Classroom":
-            requests_df = pd.read_sql("SELECT * FROM cancel_requests WHERE status = 'Pending'", conn)
-        else:
-            requests_df = pd.read_sql("SELECT * FROM cancel_lab_requests WHERE status = 'Pending'", conn)
+        daily, hourly, teachers = repository.usage_report(conn, kind, first, last)
     finally:
         conn.close()
 
-    if requests_df.empty:
-        st.info("No pending requests.")
+    if not daily:
+        st.info("No bookings in this period.")
         return
 
-    st.dataframe(requests_df)
+    daily_df = pd.DataFrame(daily)
+    daily_df["hours"] = daily_df["minutes"] / 60
+    daily_df["week"] = pd.to_datetime(daily_df["date"]).dt.to_period("W").dt.start_time.dt.date
+
+    st.write("### Hours booked per week")
+    st.dataframe(daily_df.pivot_table(index="resource", columns="week", values="hours",
+                                      aggfunc="sum", fill_value=0).round(1))
 
-    req_id = st.number_input("Request ID to process", min_value=1, step=1)
-    action = st.selectbox("Action", ["Approve", "Reject"])
+    with st.expander("Hours booked per day"):
+        st.dataframe(daily_df.pivot_table(index="resource", columns="date", values="hours",
+                                          aggfunc="sum", fill_value=0).round(1))
 
-    if st.button("Process Request"):
+    st.write("### Peak hours")
+    hourly_df = pd.DataFrame(hourly)
+    hourly_df["hours booked"] = hourly_df["minutes"] / 60
+    st.bar_chart(hourly_df.set_index(hourly_df["hour"].map(lambda h: f"{int(h):02d}:00"))["hours booked"])
+
+    st.write("### Usage per teacher")
+    teacher_df = pd.DataFrame(teachers)
+    teacher_df["hours"] = (teacher_df["minutes"] / 60).round(1)
+    st.dataframe(teacher_df[["username", "bookings", "hours"]])
+
+# =========================================================
+# EXPORT / IMPORT (Admin Only) – streamed, see export.py
+# =========================================================
+def export_import_page():
+    st.subheader("📤 Export / Import (Admin Only)")
+
+    st.write("### Export")
+    col1, col2 = st.columns(2)
+    table = col1.selectbox("Table", list(export.EXPORT_TABLES))
+    fmt = col2.radio("Format", export.FORMATS, horizontal=True)
+    kind, _ = export.EXPORT_TABLES[table]
+    resources = [r[0] for r in catalog.classrooms()] if kind == "classroom" else [lab[0] for lab in catalog.labs()]
+    col1, col2 = st.columns(2)
+    resource = col1.selectbox("Room / lab (optional)", [""] + resources)
+    date_range = col2.date_input("Booking dates (optional)", value=())
+    date_from, date_to = (tuple(date_range) + (None, None))[:2]
+
+    if st.button("Prepare export"):
+        # Streamed to a temporary file first so the database read never holds the whole result
+        path = os.path.join(tempfile.mkdtemp(prefix="bmc-export-"), f"{table}.{fmt}")
         conn = get_connection()
-        cursor = conn.cursor()
         try:
-            if request_type == "Classroom":
-                if action == "Approve":
-                    cursor.execute("SELECT booking_id FROM cancel_requests WHERE id=%s", (req_id,))
-                    row = cursor.fetchone()
-                    if row:
-                        booking_id = row[0]
-                        cursor.execute("DELETE FROM bookings WHERE id=%s", (booking_id,))
-                        cursor.execute("UPDATE cancel_requests SET status='Approved' WHERE id=%s", (req_id,))
-                        conn.commit()
-                        st.success(f"Classroom booking {booking_id} cancelled successfully.")
-                    else:
-                        st.error("Request not found.")
-                else:
-                    cursor.execute("UPDATE cancel_requests SET status='Rejected' WHERE id=%s", (req_id,))
-                    conn.commit()
-                    st.info("Request rejected.")
-
-            else:  # Lab cancellations
-                if action == "Approve":
-                    cursor.execute("SELECT booking_id FROM cancel_lab_requests WHERE id=%s", (req_id,))
-                    row = cursor.fetchone()
-                    if row:
-                        booking_id = row[0]
-                        cursor.execute("DELETE FROM lab_bookings WHERE id=%s", (booking_id,))
-                        cursor.execute("UPDATE cancel_lab_requests SET status='Approved' WHERE id=%s", (req_id,))
-                        conn.commit()
-                        st.success(f"Lab booking {booking_id} cancelled successfully.")
-                    else:
-                        st.error("Request not found.")
-                else:
-                    cursor.execute("UPDATE cancel_lab_requests SET status='Rejected' WHERE id=%s", (req_id,))
-                    conn.commit()
-                    st.info("Request rejected.")
+            count = export.export(conn, path, table, date_from, date_to, resource, fmt)
+        except RuntimeError as e:
+            st.error(str(e))
+            return
+        finally:
+            conn.close()
+        st.session_state["export_file"] = (path, count)
+    if "export_file" in st.session_state:
+        path, count = st.session_state["export_file"]
+        with open(path, "rb") as f:
+            st.download_button(f"Download {os.path.basename(path)} ({count} rows)", f, file_name=os.path.basename(path))
+
+    st.write("### Import")
+    import_table = st.selectbox("Into table", list(export.EXPORT_TABLES), key="import_table")
+    upload = st.file_uploader("CSV or Parquet file", type=list(export.FORMATS))
+    if upload is not None and st.button("Import"):
+        path = os.path.join(tempfile.mkdtemp(prefix="bmc-import-"), upload.name)
+        with open(path, "wb") as f:
+            shutil.copyfileobj(upload, f)
+        kind, booking_table = export.EXPORT_TABLES[import_table]
+        # Requests are pointed at the new ids their bookings got when imported in this session
+        id_maps = st.session_state.setdefault("import_id_maps", {})
+        id_map = {} if booking_table is None else id_maps.get(kind)
+        if id_map is None:
+            st.error(f"Import {booking_table} first: cancellation requests are matched to their bookings' new ids.")
+            return
+        conn = get_connection()
+        try:
+            count, rejected = export.import_file(conn, path, import_table, id_map=id_map)
+            if booking_table is None:
+                id_maps[kind] = id_map
+            st.success(f"Imported {count} rows.")
+            if rejected:
+                st.warning(f"{len(rejected)} row(s) rejected.")
+                st.dataframe(pd.DataFrame(rejected, columns=["Username", "Resource", "Date", "Start", "Reason"]))
+        except Exception as e:
+            st.error(f"Import failed: {e}")
+        finally:
+            conn.close()
+
+# =========================================================
+# TIMETABLE ALLOCATION (Admin Only) – see allocator.py
+# =========================================================
+def allocation_page():
+    st.subheader("🗓️ Timetable Allocation (Admin Only)")
+    st.caption("Columns: session,username,first_date,start,end[,weeks,interval,weekdays,size,features,kind,"
+               "description] — e.g. DBMS-A,teacher01,2025-09-01,10:00,11:00,15,1,Mon Wed,60,projector;computers")
+    upload = st.file_uploader("Session requests CSV", type="csv", key="allocation_upload")
+    allow_split = st.checkbox("Split a session across rooms if no single room is free on every date", value=True)
+    if upload is None:
+        return
+    try:
+        requests, errors = allocator.parse_csv(upload.getvalue())
+    except ValueError as e:
+        st.error(str(e))
+        return
+    for line, message in errors:
+        st.warning(f"Line {line}: {message}")
+
+    if st.button(f"Plan {len(requests)} session(s)"):
+        rows, report = allocator.plan(requests, allow_split)
+        st.session_state["allocation"] = (upload.name, requests, rows, report)
+    planned = st.session_state.get("allocation")
+    if not planned or planned[0] != upload.name:
+        return
+    _, requests, rows, report = planned
+    st.json(allocator.summary(report))
+    st.dataframe(pd.DataFrame(report))
 
+    if rows and st.button(f"Book {len(rows)} occurrence(s)"):
+        conn = get_connection()
+        try:
+            booked = allocator.commit(conn, requests, rows, report)
+        except BookingBusy as e:
+            st.error(str(e))
+            return
         except Exception as e:
-            conn.rollback()
-            st.error(f"Action failed: {e}")
+            st.error(f"Allocation failed: {e}")
+            return
         finally:
             conn.close()
+        del st.session_state["allocation"]
+        st.success(f"{booked} booking(s) made in one transaction.")
+        st.dataframe(pd.DataFrame(report))
+
+# =========================================================
+# PERFORMANCE (Admin Only) – samples from perf.py
+# =========================================================
+def performance_page():
+    st.subheader("⏱️ Performance (Admin Only)")
+    st.caption("Sampled in this process since it started; the oldest samples are dropped first.")
+    if st.button("Reset samples"):
+        perf.reset()
+
+    st.write("### Pages (per rerun)")
+    st.dataframe(pd.DataFrame(perf.page_summary()))
+
+    st.write("### Slowest queries")
+    st.dataframe(pd.DataFrame(perf.slowest_queries()))
+
+    st.write("### Queries by total time")
+    st.dataframe(pd.DataFrame(perf.query_summary()))
+
+    st.write("### Connections")
+    st.json(pool.pool_stats())
+
+    with st.expander("Recent renders"):
+        st.dataframe(pd.DataFrame(perf.recent_renders()))
+
+    if perf.PROMETHEUS_FILE:
+        st.caption(f"Prometheus metrics are written to {perf.PROMETHEUS_FILE}.")
 
 # =========================================================
 # STUDENT DASHBOARD – view all labs (no floor filter)
 # =========================================================
 def student_dashboard():
     st.subheader("🎓 Student Dashboard – View Bookings")
-    date = st.date_input("Select Date", min_value=datetime.date.today())
-    floor = st.selectbox("Select Floor (for classrooms only)", ["1st","2nd","3rd", "4th"])
-    conn = get_connection()
-
-    # Classrooms filtered by floor
-    query_class = """
-        SELECT room_name AS Room, start_time AS Start, end_time AS End, description AS Description
-        FROM bookings
-        WHERE date = %s AND floor = %s
-            AND (date > CURDATE() OR (date = CURDATE() AND end_time > CURTIME()))
-        ORDER BY start_time
-    """
-    df_class = pd.read_sql(query_class, conn, params=(date, floor))
-
-    # Labs – show all labs by date (no floor filter)
-    query_lab = """
-        SELECT lab_name AS Lab, start_time AS Start, end_time AS End, description AS Description
-        FROM lab_bookings
-        WHERE date = %s
-            AND (date > CURDATE() OR (date = CURDATE() AND end_time > CURTIME()))
-        ORDER BY start_time
-    """
-
-    df_lab = pd.read_sql(query_lab, conn, params=(date,))
+    view = st.radio("View", ["Day", "Week grid", "Month grid"], horizontal=True)
+    if view != "Day":
+        occupancy_view(view)
+        return
 
-    conn.close()
+    date = st.date_input("Select Date", min_value=datetime.date.today())
+    floor = st.selectbox("Select Floor (for classrooms only)", catalog.floors())
+    # Classrooms filtered by floor; labs – show all labs by date (no floor filter).
+    # Reused across reruns and sessions until a booking on that date changes.
+    df_class, df_lab = versions.cached(
+        ("student_dashboard", floor, versions.minute_of(date)), repository.KINDS, date, date,
+        lambda conn: (pd.DataFrame(repository.student_bookings(conn, "classroom", date, floor)),
+                      pd.DataFrame(repository.student_bookings(conn, "lab", date))),
+    )
 
     st.write("### 🏫 Classroom Bookings")
     if df_class.empty:
@@ -503,22 +754,47 @@ def student_dashboard():
     else:
         st.dataframe(df_lab)
 
+def occupancy_view(view):
+    """
+    Rooms × time slots × days for every floor and lab at once (see occupancy.py).
+    """
+    day = st.date_input("Show period containing", min_value=datetime.date.today(), key="grid_day")
+    first, last = occupancy.week_of(day) if view == "Week grid" else occupancy.month_of(day)
+    grid = occupancy.occupancy_grid(first, last)
+
+    kinds = st.multiselect("Show", ["classroom", "lab"], default=["classroom", "lab"])
+    grid = grid[grid.index.get_level_values("kind").isin(kinds)]
+    st.caption(f"{first} – {last} · ● = booked · {len(grid)} rooms/labs")
+
+    dates = list(grid.columns.get_level_values("date").unique())
+    for tab, grid_date in zip(st.tabs([d.strftime("%a %d %b") for d in dates]), dates):
+        with tab:
+            day_grid = grid[grid_date]
+            tab.dataframe(pd.DataFrame(
+                np.where(day_grid.to_numpy() > 0, "●", ""),
+                index=day_grid.index.droplevel("kind"), columns=day_grid.columns,
+            ))
+
 # =========================================================
 # MAIN
 # =========================================================
 def main():
     st.title("📚 BookMyClassroom")
+    archive.start_background()   # once per process; moves past bookings out of the live tables
 
     menu = st.sidebar.selectbox("Menu", ["Login", "Register", "Student Dashboard"])
     if menu == "Student Dashboard":
-        student_dashboard()
+        with perf.page("student_dashboard"):
+            student_dashboard()
         return
 
     if "user" not in st.session_state:
         if menu == "Login":
-            login()
+            with perf.page("login"):
+                login()
         elif menu == "Register":
-            register()
+            with perf.page("register"):
+                register()
     else:
         role = st.session_state["role"]
         user = {"username": st.session_state["user"], "role": st.session_state["role"]}
@@ -526,17 +802,51 @@ def main():
         pages = ["Book Classroom", "Book Lab", "My Bookings", "Logout"]
         if role == "admin":
             pages.insert(3, "Manage Cancellations")  # Admin-only
+            pages.insert(4, "Manage Rooms & Labs")   # Admin-only
+            pages.insert(5, "Reports")               # Admin-only
+            pages.insert(6, "Export / Import")       # Admin-only
+            pages.insert(7, "Timetable Allocation")  # Admin-only
+            pages.insert(8, "Performance")           # Admin-only
 
         choice = st.sidebar.selectbox("Menu", pages)
 
+        if role == "admin":
+            with st.sidebar.expander("DB connection pool"):
+                st.json(pool.pool_stats())
+            with st.sidebar.expander("Catalogue cache"):
+                st.json(catalog.stats())
+            with st.sidebar.expander("Result cache (data versions)"):
+                st.json(versions.stats())
+            with st.sidebar.expander("Statement executions"):
+                st.dataframe(pd.DataFrame(repository.statement_stats()))
+
         if choice == "Book Classroom":
-            booking_page(user)
+            with perf.page("booking_page"):
+                booking_page(user)
+                bulk_booking_section(user)
         elif choice == "Book Lab":
-            lab_booking_dashboard(user)
+            with perf.page("lab_booking_dashboard"):
+                lab_booking_dashboard(user)
         elif choice == "My Bookings":
-            booking_history(user, role)
+            with perf.page("booking_history"):
+                booking_history(user, role)
         elif choice == "Manage Cancellations" and role == "admin":
-            manage_cancellations()
+            with perf.page("manage_cancellations"):
+                manage_cancellations()
+        elif choice == "Manage Rooms & Labs" and role == "admin":
+            with perf.page("manage_resources"):
+                manage_resources()
+        elif choice == "Reports" and role == "admin":
+            with perf.page("reports_page"):
+                reports_page()
+        elif choice == "Export / Import" and role == "admin":
+            with perf.page("export_import_page"):
+                export_import_page()
+        elif choice == "Timetable Allocation" and role == "admin":
+            with perf.page("allocation_page"):
+                allocation_page()
+        elif choice == "Performance" and role == "admin":
+            performance_page()
         elif choice == "Logout":
             del st.session_state["user"]
             del st.session_state["role"]
@@ -0,0 +1,276 @@
+"""
+Versioned schema migrations for the BookMyClassroom database.
+
+    python migrations.py           # show current version and pending migrations
+    python migrations.py up        # apply everything pending
+    python migrations.py up 2      # apply up to (and including) version 2
+
+Each migration is applied once and recorded in `schema_migrations`.
+Add new migrations at the end of MIGRATIONS; never edit an applied one.
+Every step is idempotent - tables use IF NOT EXISTS, and indexes and
+column renames that already took effect are skipped - so a migration that
+failed half-way can be fixed and re-run.
+"""
+import re
+import sys
+
+import DB
+import pool
+
+# =========================================================
+# MIGRATIONS: (version, description, statements)
+# =========================================================
+MIGRATIONS = [
+    (1, "base schema", [
+        """
+        CREATE TABLE IF NOT EXISTS faculty (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            name VARCHAR(100),
+            username VARCHAR(100) NOT NULL UNIQUE,
+            password VARCHAR(255) NOT NULL,
+            role VARCHAR(20) NOT NULL DEFAULT 'teacher'
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS classrooms (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            room_name VARCHAR(50) NOT NULL,
+            capacity INT NOT NULL DEFAULT 0,
+            features VARCHAR(255),
+            floor VARCHAR(10)
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS labs (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            lab_name VARCHAR(50) NOT NULL,
+            floor VARCHAR(10),
+            capacity INT NOT NULL DEFAULT 0,
+            features VARCHAR(255)
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS bookings (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            username VARCHAR(100) NOT NULL,
+            room_name VARCHAR(50) NOT NULL,
+            floor VARCHAR(10),
+            date DATE NOT NULL,
+            start_time TIME NOT NULL,
+            end_time TIME NOT NULL,
+            duration VARCHAR(20),
+            description TEXT
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS lab_bookings (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            username VARCHAR(100) NOT NULL,
+            lab_name VARCHAR(50) NOT NULL,
+            floor VARCHAR(10),
+            date DATE NOT NULL,
+            start_time TIME NOT NULL,
+            end_time TIME NOT NULL,
+            duration VARCHAR(20),
+            description TEXT
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS cancel_requests (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            booking_id INT NOT NULL,
+            teacher_username VARCHAR(100) NOT NULL,
+            reason TEXT,
+            status VARCHAR(20) NOT NULL DEFAULT 'Pending',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS cancel_lab_requests (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            booking_id INT NOT NULL,
+            teacher_username VARCHAR(100) NOT NULL,
+            reason TEXT,
+            status VARCHAR(20) NOT NULL DEFAULT 'Pending',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+        # Databases from before migrations named the lab request's booking column lab_booking_id
+        "ALTER TABLE cancel_lab_requests RENAME COLUMN lab_booking_id TO booking_id",
+    ]),
+    (2, "composite covering indexes for booking access paths", [
+        # Overlap check / reserve(): resource + date + time range
+        "CREATE INDEX ix_bookings_room_date_time ON bookings (room_name, date, start_time, end_time)",
+        "CREATE INDEX ix_lab_bookings_lab_date_time ON lab_bookings (lab_name, date, start_time, end_time)",
+        # Day loads for the availability index, student dashboard and upcoming lists
+        "CREATE INDEX ix_bookings_date_floor_time ON bookings (date, floor, start_time, end_time, room_name)",
+        "CREATE INDEX ix_lab_bookings_date_time ON lab_bookings (date, start_time, end_time, lab_name)",
+        # Booking history and "my bookings": username + date
+        "CREATE INDEX ix_bookings_user_date_time ON bookings (username, date, start_time)",
+        "CREATE INDEX ix_lab_bookings_user_date_time ON lab_bookings (username, date, start_time)",
+        # Free-room list per floor
+        "CREATE INDEX ix_classrooms_floor_room ON classrooms (floor, room_name)",
+        "CREATE INDEX ix_labs_name ON labs (lab_name, floor)",
+    ]),
+    (3, "status indexes for the pending-cancellation queues", [
+        "CREATE INDEX ix_cancel_requests_status ON cancel_requests (status, id)",
+        "CREATE INDEX ix_cancel_lab_requests_status ON cancel_lab_requests (status, id)",
+        "CREATE INDEX ix_cancel_requests_booking ON cancel_requests (booking_id)",
+        "CREATE INDEX ix_cancel_lab_requests_booking ON cancel_lab_requests (booking_id)",
+    ]),
+    (4, "utilisation rollups (see rollups.py)", [
+        """
+        CREATE TABLE IF NOT EXISTS usage_daily (
+            kind VARCHAR(10) NOT NULL,
+            date DATE NOT NULL,
+            resource VARCHAR(50) NOT NULL,
+            bookings INT NOT NULL DEFAULT 0,
+            minutes INT NOT NULL DEFAULT 0,
+            PRIMARY KEY (kind, date, resource)
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS usage_hourly (
+            kind VARCHAR(10) NOT NULL,
+            date DATE NOT NULL,
+            hour INT NOT NULL,
+            minutes INT NOT NULL DEFAULT 0,
+            PRIMARY KEY (kind, date, hour)
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS usage_teacher (
+            kind VARCHAR(10) NOT NULL,
+            date DATE NOT NULL,
+            username VARCHAR(100) NOT NULL,
+            bookings INT NOT NULL DEFAULT 0,
+            minutes INT NOT NULL DEFAULT 0,
+            PRIMARY KEY (kind, date, username)
+        )
+        """,
+    ]),
+    (5, "archive tables for bookings past the archival horizon (see archive.py)", [
+        """
+        CREATE TABLE IF NOT EXISTS bookings_archive (
+            id INT PRIMARY KEY,
+            username VARCHAR(100) NOT NULL,
+            room_name VARCHAR(50) NOT NULL,
+            floor VARCHAR(10),
+            date DATE NOT NULL,
+            start_time TIME NOT NULL,
+            end_time TIME NOT NULL,
+            duration VARCHAR(20),
+            description TEXT
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS lab_bookings_archive (
+            id INT PRIMARY KEY,
+            username VARCHAR(100) NOT NULL,
+            lab_name VARCHAR(50) NOT NULL,
+            floor VARCHAR(10),
+            date DATE NOT NULL,
+            start_time TIME NOT NULL,
+            end_time TIME NOT NULL,
+            duration VARCHAR(20),
+            description TEXT
+        )
+        """,
+        # Past-bookings history and rollup rebuilds
+        "CREATE INDEX ix_bookings_archive_user_date_time ON bookings_archive (username, date, start_time)",
+        "CREATE INDEX ix_lab_bookings_archive_user_date_time ON lab_bookings_archive (username, date, start_time)",
+        "CREATE INDEX ix_bookings_archive_date ON bookings_archive (date)",
+        "CREATE INDEX ix_lab_bookings_archive_date ON lab_bookings_archive (date)",
+        # Archival job picks the oldest live rows first
+        "CREATE INDEX ix_bookings_date_id ON bookings (date, id)",
+        "CREATE INDEX ix_lab_bookings_date_id ON lab_bookings (date, id)",
+    ]),
+    (6, "data version counters for result caching (see versions.py)", [
+        """
+        CREATE TABLE IF NOT EXISTS data_versions (
+            scope VARCHAR(20) NOT NULL,
+            date DATE NOT NULL,
+            version BIGINT NOT NULL DEFAULT 0,
+            PRIMARY KEY (scope, date)
+        )
+        """,
+    ]),
+]
+
+
+# =========================================================
+# RUNNER
+# =========================================================
+def _ensure_version_table(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INT PRIMARY KEY,
+            description VARCHAR(255) NOT NULL,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+
+def current_version(conn):
+    cursor = conn.cursor()
+    _ensure_version_table(cursor)
+    cursor.execute("SELECT COALESCE(MAX(version), 0) FROM schema_migrations")
+    (version,) = cursor.fetchone()
+    cursor.close()
+    return int(version)
+
+
+def pending(conn, target=None):
+    version = current_version(conn)
+    return [m for m in MIGRATIONS if m[0] > version and (target is None or m[0] <= target)]
+
+
+def _applied(cursor, backend, statement):
+    """
+    Whether a step already took effect (e.g. in a half-applied migration).
+    """
+    match = re.match(r"\s*CREATE\s+(?:UNIQUE\s+)?INDEX\s+(\w+)\s+ON\s+(\w+)", statement, re.IGNORECASE)
+    if match:
+        return backend.has_index(cursor, match.group(2), match.group(1))
+    match = re.match(r"\s*ALTER\s+TABLE\s+(\w+)\s+RENAME\s+COLUMN\s+(\w+)\s+TO", statement, re.IGNORECASE)
+    if match:
+        return not backend.has_column(cursor, match.group(1), match.group(2))
+    return False   # CREATE TABLE IF NOT EXISTS needs no check
+
+
+def migrate(conn, target=None, log=print, backend=None):
+    """
+    Apply pending migrations in order; returns the new schema version.
+    MySQL DDL auto-commits, so each migration is recorded right after its
+    statements run; steps that already took effect are skipped, so a failed
+    migration can be fixed and re-run.
+    Statements are MySQL-flavoured; the backend rewrites them for its dialect.
+    """
+    backend = backend or DB.get_backend()
+    cursor = conn.cursor()
+    for version, description, statements in pending(conn, target):
+        log(f"Applying {version}: {description}")
+        for statement in statements:
+            if not _applied(cursor, backend, statement):
+                cursor.execute(backend.ddl(statement))
+        cursor.execute(
+            "INSERT INTO schema_migrations (version, description) VALUES (%s, %s)",
+            (version, description),
+        )
+        conn.commit()
+    cursor.close()
+    return current_version(conn)
+
+
+if __name__ == "__main__":
+    conn = pool.get_connection()
+    try:
+        if len(sys.argv) > 1 and sys.argv[1] == "up":
+            target = int(sys.argv[2]) if len(sys.argv) > 2 else None
+            print(f"Schema version: {migrate(conn, target)}")
+        else:
+            print(f"Schema version: {current_version(conn)}")
+            for version, description, _ in pending(conn):
+                print(f"  pending {version}: {description}")
+    finally:
+        conn.close()
@@ -0,0 +1,156 @@
+import datetime
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+import catalog
+import repository
+import versions
+
+SLOT_MINUTES = 30
+DAY_START = 8 * 60     # minutes since midnight
+DAY_END = 20 * 60
+MAX_CACHED_GRIDS = 32
+
+
+# =========================================================
+# PERIODS
+# =========================================================
+def week_of(day):
+    first = day - datetime.timedelta(days=day.weekday())
+    return first, first + datetime.timedelta(days=6)
+
+
+def month_of(day):
+    first = day.replace(day=1)
+    next_month = (first + datetime.timedelta(days=32)).replace(day=1)
+    return first, next_month - datetime.timedelta(days=1)
+
+
+def slot_labels(slot_minutes=SLOT_MINUTES, day_start=DAY_START, day_end=DAY_END):
+    return [f"{m // 60:02d}:{m % 60:02d}" for m in range(day_start, day_end, slot_minutes)]
+
+
+# =========================================================
+# DATA
+# =========================================================
+def data_version(first, last):
+    """
+    Data version of all bookings in [first, last] (see versions.py); changes
+    whenever a booking in the range is inserted or deleted.
+    """
+    conn = repository.connect()
+    try:
+        return versions.current(conn, repository.KINDS, first, last)
+    finally:
+        conn.close()
+
+
+def fetch_range(first, last):
+    """
+    Every classroom and lab booking in [first, last] with a single range query.
+    """
+    conn = repository.connect()
+    try:
+        rows = repository.fetch_all(conn, "range_bookings", (first, last, first, last))
+    finally:
+        conn.close()
+    return pd.DataFrame(rows, columns=["kind", "floor", "resource", "date", "start_time", "end_time"])
+
+
+def _minutes(series):
+    if not pd.api.types.is_timedelta64_dtype(series):
+        series = pd.to_timedelta(series.astype(str))
+    return (series.dt.total_seconds() // 60).to_numpy(dtype=np.int64)
+
+
+def resources():
+    """
+    Grid rows: every classroom and lab, even ones with no bookings. Rooms
+    with the same name on different floors are separate rows.
+    """
+    rows = {("classroom", floor or "", name) for name, floor, _, _ in catalog.classrooms()}
+    rows |= {("lab", floor or "", name) for name, floor in catalog.labs()}
+    return pd.MultiIndex.from_tuples(sorted(rows), names=["kind", "floor", "resource"])
+
+
+# =========================================================
+# GRID
+# =========================================================
+def build_grid(bookings, rows, first, last,
+               slot_minutes=SLOT_MINUTES, day_start=DAY_START, day_end=DAY_END):
+    """
+    Occupancy matrix (resources x days x slots) as a DataFrame: one row per
+    resource in `rows`, columns (date, slot label), cell = number of bookings
+    touching the slot. A slot [t, t+slot) is occupied by a booking [s, e) when
+    s < t+slot and e > t, i.e. the usual half-open overlap rule.
+
+    Fully vectorised: each booking becomes a +1/-1 pair in a difference array
+    (np.add.at), and one cumulative sum per row fills in the covered slots.
+    """
+    n_days = (last - first).days + 1
+    n_slots = (day_end - day_start) // slot_minutes
+    labels = slot_labels(slot_minutes, day_start, day_end)
+    dates = [first + datetime.timedelta(days=i) for i in range(n_days)]
+    columns = pd.MultiIndex.from_product([dates, labels], names=["date", "slot"])
+    diff = np.zeros((len(rows), n_days * n_slots + 1), dtype=np.int32)
+
+    if len(bookings):
+        positions = pd.Series(np.arange(len(rows), dtype=np.float64), index=rows)
+        keys = pd.MultiIndex.from_arrays([bookings["kind"], bookings["floor"].fillna(""), bookings["resource"]])
+        r = positions.reindex(keys).to_numpy(copy=True)
+        # A booking whose floor is missing or outdated still lands on its room
+        # when only one floor has a room of that name
+        by_name = positions.droplevel("floor")
+        by_name = by_name[~by_name.index.duplicated(keep=False)]
+        unmatched = np.isnan(r)
+        if unmatched.any():
+            names = pd.MultiIndex.from_arrays([bookings["kind"].to_numpy()[unmatched],
+                                               bookings["resource"].to_numpy()[unmatched]])
+            r[unmatched] = by_name.reindex(names).to_numpy()
+        day = (pd.to_datetime(bookings["date"]) - pd.Timestamp(first)).dt.days.to_numpy()
+        start = _minutes(bookings["start_time"]) - day_start
+        end = _minutes(bookings["end_time"]) - day_start
+        s0 = np.clip(np.floor_divide(start, slot_minutes), 0, n_slots)
+        s1 = np.clip(-np.floor_divide(-end, slot_minutes), 0, n_slots)   # ceil division
+
+        keep = ~np.isnan(r) & (day >= 0) & (day < n_days) & (s1 > s0)
+        r = r[keep].astype(np.int64)
+        base = day[keep] * n_slots
+        np.add.at(diff, (r, base + s0[keep]), 1)
+        np.add.at(diff, (r, base + s1[keep]), -1)
+
+    grid = np.cumsum(diff, axis=1)[:, :-1]
+    return pd.DataFrame(grid, index=rows, columns=columns)
+
+
+_grids = OrderedDict()
+_grids_lock = threading.Lock()
+
+
+def occupancy_grid(first, last, slot_minutes=SLOT_MINUTES):
+    """
+    Cached grid for [first, last]. The cache key includes the data version
+    and the catalogue rows, so a grid is rebuilt (one range query) only after
+    bookings in the range change or a classroom or lab is added or removed
+    (catalogue writes invalidate the catalogue cache, see catalog.py).
+    Shared by every session in the process.
+    """
+    rows = resources()
+    key = (first, last, slot_minutes, data_version(first, last), tuple(rows))
+    with _grids_lock:
+        if key in _grids:
+            _grids.move_to_end(key)
+            return _grids[key]
+
+    grid = build_grid(fetch_range(first, last), rows, first, last, slot_minutes)
+    with _grids_lock:
+        # Drop stale versions of the same period first, then the least recently used
+        for old in [k for k in _grids if k[:3] == key[:3]]:
+            del _grids[old]
+        _grids[key] = grid
+        while len(_grids) > MAX_CACHED_GRIDS:
+            _grids.popitem(last=False)
+    return grid
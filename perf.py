@@ -0,0 +1,300 @@
+"""
+In-process query and page-render instrumentation.
+
+Every statement executed through a pooled connection and every connection
+checkout is timed and attributed to the page currently rendering (see
+page()). The last QUERY_SAMPLES statements and RENDER_SAMPLES renders are
+kept in ring buffers for the admin Performance page; cumulative totals per
+page are exported in Prometheus text format when BMC_PROMETHEUS_FILE is set
+(point node_exporter's textfile collector at it).
+"""
+import contextvars
+import os
+import re
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+QUERY_SAMPLES = int(os.environ.get("BMC_PERF_QUERY_SAMPLES", "5000"))
+RENDER_SAMPLES = int(os.environ.get("BMC_PERF_RENDER_SAMPLES", "1000"))
+PROMETHEUS_FILE = os.environ.get("BMC_PROMETHEUS_FILE")
+PROMETHEUS_EVERY = 15.0   # seconds between textfile rewrites
+
+NO_PAGE = "background"
+
+_queries = deque(maxlen=QUERY_SAMPLES)    # [started, page, sql, ms, rows]
+_renders = deque(maxlen=RENDER_SAMPLES)   # (started, page, ms, queries, query_ms, connections, error)
+_totals = {}                              # page -> {renders, render_seconds, queries, query_seconds, connections, errors}
+_lock = threading.Lock()
+_current = contextvars.ContextVar("bmc_perf_render", default=None)
+_last_export = [0.0]
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def _label(sql):
+    sql = _WHITESPACE.sub(" ", str(sql)).strip()
+    return sql if len(sql) <= 200 else sql[:197] + "..."
+
+
+def _page_totals(page):
+    return _totals.setdefault(page, {"renders": 0, "render_seconds": 0.0, "queries": 0,
+                                     "query_seconds": 0.0, "connections": 0, "errors": 0})
+
+
+# =========================================================
+# RECORDING
+# =========================================================
+@contextmanager
+def page(name):
+    """
+    Time one render of page `name`; queries and connection checkouts made
+    while it runs (on this thread) are attributed to it.
+    """
+    render = {"page": name, "queries": 0, "query_ms": 0.0, "connections": 0}
+    token = _current.set(render)
+    started = time.time()
+    t0 = time.perf_counter()
+    error = None
+    try:
+        yield render
+    except BaseException as e:
+        # Streamlit's st.rerun()/st.stop() unwind through here too; only count real failures
+        if not type(e).__name__.endswith(("RerunException", "StopException")):
+            error = type(e).__name__
+        raise
+    finally:
+        elapsed = time.perf_counter() - t0
+        _current.reset(token)
+        _renders.append((started, name, elapsed * 1000, render["queries"], render["query_ms"],
+                         render["connections"], error))
+        with _lock:
+            totals = _page_totals(name)
+            totals["renders"] += 1
+            totals["render_seconds"] += elapsed
+            totals["errors"] += error is not None
+        maybe_export()
+
+
+def _current_page():
+    render = _current.get()
+    return (render["page"] if render else NO_PAGE), render
+
+
+def record_query(sql, seconds, rows):
+    """
+    Record one executed statement; returns the sample so fetches can add their rows.
+    """
+    name, render = _current_page()
+    sample = [time.time() - seconds, name, _label(sql), seconds * 1000, rows]
+    _queries.append(sample)
+    if render is not None:
+        render["queries"] += 1
+        render["query_ms"] += seconds * 1000
+    with _lock:
+        totals = _page_totals(name)
+        totals["queries"] += 1
+        totals["query_seconds"] += seconds
+    return sample
+
+
+def record_connection():
+    name, render = _current_page()
+    if render is not None:
+        render["connections"] += 1
+    with _lock:
+        _page_totals(name)["connections"] += 1
+
+
+class TimedCursor:
+    """
+    Cursor proxy that times execute()/executemany() and counts the rows
+    fetched (or affected) for the instrumentation buffers.
+    """
+
+    def __init__(self, raw):
+        self._raw = raw
+        self._sample = None
+        self._fetched = 0
+
+    def _timed(self, method, operation, *args, **kwargs):
+        t0 = time.perf_counter()
+        try:
+            return method(operation, *args, **kwargs)
+        finally:
+            rowcount = getattr(self._raw, "rowcount", -1) or 0
+            self._sample = record_query(operation, time.perf_counter() - t0, max(rowcount, 0))
+            self._fetched = 0
+
+    def execute(self, operation, *args, **kwargs):
+        return self._timed(self._raw.execute, operation, *args, **kwargs)
+
+    def executemany(self, operation, *args, **kwargs):
+        return self._timed(self._raw.executemany, operation, *args, **kwargs)
+
+    def _fetch(self, method, *args, **kwargs):
+        t0 = time.perf_counter()
+        rows = method(*args, **kwargs)
+        if self._sample is not None:
+            # SELECT rowcount is -1 until fetched on unbuffered cursors; count what comes back
+            self._fetched += len(rows) if isinstance(rows, list) else rows is not None
+            self._sample[4] = max(self._sample[4], self._fetched)
+            self._sample[3] += (time.perf_counter() - t0) * 1000
+        return rows
+
+    def fetchone(self):
+        return self._fetch(self._raw.fetchone)
+
+    def fetchmany(self, *args, **kwargs):
+        return self._fetch(self._raw.fetchmany, *args, **kwargs)
+
+    def fetchall(self):
+        return self._fetch(self._raw.fetchall)
+
+    def __iter__(self):
+        return iter(self._raw)
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+
+# =========================================================
+# REPORTING
+# =========================================================
+def _percentile(values, pct):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(pct / 100 * len(values)))]
+
+
+def slowest_queries(limit=20):
+    """
+    The slowest sampled statements: {"page", "sql", "ms", "rows", "at"}.
+    """
+    samples = sorted(list(_queries), key=lambda s: -s[3])[:limit]
+    return [{"page": p, "sql": sql, "ms": round(ms, 2), "rows": rows,
+             "at": time.strftime("%H:%M:%S", time.localtime(at))} for at, p, sql, ms, rows in samples]
+
+
+def query_summary(limit=20):
+    """
+    Sampled statements grouped by SQL text, by total time spent.
+    """
+    groups = {}
+    for _, p, sql, ms, rows in list(_queries):
+        g = groups.setdefault(sql, {"sql": sql, "pages": set(), "executions": 0, "total_ms": 0.0, "rows": 0})
+        g["pages"].add(p)
+        g["executions"] += 1
+        g["total_ms"] += ms
+        g["rows"] += rows
+    out = sorted(groups.values(), key=lambda g: -g["total_ms"])[:limit]
+    for g in out:
+        g["pages"] = ", ".join(sorted(g["pages"]))
+        g["avg_ms"] = round(g["total_ms"] / g["executions"], 3)
+        g["total_ms"] = round(g["total_ms"], 2)
+    return out
+
+
+def page_summary():
+    """
+    Per page over the sampled renders: render time percentiles and the average
+    number of queries and connection checkouts per render (i.e. per rerun).
+    """
+    by_page = {}
+    for _, p, ms, queries, query_ms, connections, error in list(_renders):
+        by_page.setdefault(p, []).append((ms, queries, query_ms, connections, error))
+    out = []
+    for p, rows in sorted(by_page.items()):
+        times = [r[0] for r in rows]
+        out.append({
+            "page": p, "renders": len(rows),
+            "p50_ms": round(_percentile(times, 50), 2), "p95_ms": round(_percentile(times, 95), 2),
+            "max_ms": round(max(times), 2),
+            "queries_per_render": round(sum(r[1] for r in rows) / len(rows), 2),
+            "query_ms_per_render": round(sum(r[2] for r in rows) / len(rows), 2),
+            "connections_per_render": round(sum(r[3] for r in rows) / len(rows), 2),
+            "errors": sum(r[4] is not None for r in rows),
+        })
+    return out
+
+
+def recent_renders(limit=50):
+    return [{"at": time.strftime("%H:%M:%S", time.localtime(at)), "page": p, "ms": round(ms, 2),
+             "queries": queries, "query_ms": round(query_ms, 2), "connections": connections, "error": error}
+            for at, p, ms, queries, query_ms, connections, error in list(_renders)[-limit:][::-1]]
+
+
+def totals():
+    with _lock:
+        return {p: dict(t) for p, t in _totals.items()}
+
+
+def reset():
+    _queries.clear()
+    _renders.clear()
+    with _lock:
+        _totals.clear()
+
+
+# =========================================================
+# PROMETHEUS TEXTFILE
+# =========================================================
+def prometheus_text(pool_stats=None):
+    """
+    Cumulative counters per page (and pool gauges) in Prometheus text format.
+    """
+    lines = []
+
+    def metric(name, kind, help_text, samples):
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for labels, value in samples:
+            label_text = ",".join(f'{k}="{v}"' for k, v in labels.items())
+            lines.append(f"{name}{{{label_text}}} {value}" if label_text else f"{name} {value}")
+
+    current = totals()
+    per_page = lambda key: [({"page": p}, t[key]) for p, t in sorted(current.items())]
+    metric("bmc_page_renders_total", "counter", "Page renders.", per_page("renders"))
+    metric("bmc_page_render_seconds_total", "counter", "Time spent rendering pages.", per_page("render_seconds"))
+    metric("bmc_page_errors_total", "counter", "Page renders that raised.", per_page("errors"))
+    metric("bmc_queries_total", "counter", "Statements executed.", per_page("queries"))
+    metric("bmc_query_seconds_total", "counter", "Time spent executing statements.", per_page("query_seconds"))
+    metric("bmc_connections_total", "counter", "Pooled connection checkouts.", per_page("connections"))
+    if pool_stats:
+        for key in ("size", "open", "idle", "in_use"):
+            metric(f"bmc_pool_{key}", "gauge", f"Connection pool {key.replace('_', ' ')}.", [({}, pool_stats[key])])
+        for key in ("checkouts", "created", "discarded", "waits", "exhausted"):
+            metric(f"bmc_pool_{key}_total", "counter", f"Connection pool {key}.", [({}, pool_stats[key])])
+    return "\n".join(lines) + "\n"
+
+
+def write_prometheus(path=None, pool_stats=None):
+    """
+    Atomically (re)write the textfile at `path` (default BMC_PROMETHEUS_FILE).
+    """
+    path = path or PROMETHEUS_FILE
+    if not path:
+        return None
+    if pool_stats is None:
+        import pool   # late import: pool imports this module
+        pool_stats = pool.pool_stats()
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(prometheus_text(pool_stats))
+    os.replace(tmp, path)
+    return path
+
+
+def maybe_export():
+    """
+    Rewrite the textfile at most every PROMETHEUS_EVERY seconds.
+    """
+    if not PROMETHEUS_FILE or time.monotonic() - _last_export[0] < PROMETHEUS_EVERY:
+        return
+    _last_export[0] = time.monotonic()
+    try:
+        write_prometheus()
+    except OSError:
+        pass   # a missing directory must never break a page render
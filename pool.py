@@ -0,0 +1,271 @@
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+
+import DB
+import perf
+
+# =========================================================
+# CONFIG (override with environment variables)
+# =========================================================
+# Connection settings live with the storage backend (DB.py).
+POOL_SIZE = int(os.environ.get("BMC_POOL_SIZE", "8"))
+POOL_TIMEOUT = float(os.environ.get("BMC_POOL_TIMEOUT", "10"))
+# Idle connections older than this are pinged before being handed out again
+HEALTH_CHECK_AFTER = float(os.environ.get("BMC_POOL_HEALTH_CHECK_AFTER", "30"))
+
+
+class PoolExhausted(Exception):
+    """Raised when no connection could be borrowed within the pool timeout."""
+
+
+# =========================================================
+# POOLED CONNECTION
+# =========================================================
+class PooledConnection:
+    """
+    Thin proxy around a driver connection borrowed from a ConnectionPool.
+    Everything is forwarded to the real connection except close(), which
+    hands the connection back to the pool instead of tearing it down, so
+    existing `conn = get_connection() ... conn.close()` code keeps working.
+    """
+
+    def __init__(self, pool, raw):
+        self._pool = pool
+        self._raw = raw
+
+    def close(self):
+        raw, self._raw = self._raw, None
+        if raw is not None:
+            self._pool._release(raw)
+
+    def cursor(self, *args, **kwargs):
+        if self._raw is None:
+            raise RuntimeError("Connection was already returned to the pool.")
+        return perf.TimedCursor(self._raw.cursor(*args, **kwargs))
+
+    @property
+    def statement_cache(self):
+        """
+        Per-connection cache of prepared statements (see repository.py); it
+        lives as long as the underlying connection, across borrowers.
+        """
+        if self._raw is None:
+            raise RuntimeError("Connection was already returned to the pool.")
+        return self._pool._statement_cache(self._raw)
+
+    def __getattr__(self, name):
+        if self._raw is None:
+            raise RuntimeError("Connection was already returned to the pool.")
+        return getattr(self._raw, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+    def __del__(self):
+        # A page that forgot conn.close() must not leak a pool slot
+        try:
+            self.close()
+        except Exception:
+            pass
+
+
+# =========================================================
+# POOL
+# =========================================================
+class ConnectionPool:
+    """
+    Process-wide, thread-safe pool of reusable database connections.
+
+    Connections are created lazily up to `size`. Borrowers block for up to
+    `timeout` seconds when every connection is in use and get PoolExhausted
+    after that. Connections that sat idle longer than `health_check_after`
+    are pinged on checkout and transparently replaced if they went stale.
+    """
+
+    def __init__(self, connect, size=POOL_SIZE, timeout=POOL_TIMEOUT,
+                 health_check_after=HEALTH_CHECK_AFTER, ping=None):
+        if size < 1:
+            raise ValueError("Pool size must be at least 1.")
+        self.size = size
+        self.timeout = timeout
+        self.health_check_after = health_check_after
+        self._connect = connect
+        self._ping = ping
+        self._idle = deque()          # (raw connection, returned_at)
+        self._statements = {}         # id(raw connection) -> prepared statement cache
+        self._open = 0                # connections created and not discarded
+        self._cond = threading.Condition()
+        self._metrics = {
+            "checkouts": 0,
+            "created": 0,
+            "discarded": 0,
+            "stale": 0,
+            "waits": 0,
+            "wait_time_total": 0.0,
+            "wait_time_max": 0.0,
+            "exhausted": 0,
+        }
+
+    # ---------- borrowing ----------
+    def connection(self):
+        """
+        Borrow a connection. Call .close() (or use `with`) to give it back.
+        """
+        deadline = time.monotonic() + self.timeout
+        waited_from = None
+        while True:
+            with self._cond:
+                if self._idle:
+                    raw, returned_at = self._idle.pop()
+                elif self._open < self.size:
+                    self._open += 1
+                    raw, returned_at = None, None
+                else:
+                    if waited_from is None:
+                        waited_from = time.monotonic()
+                        self._metrics["waits"] += 1
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._metrics["exhausted"] += 1
+                        self._record_wait(waited_from)
+                        raise PoolExhausted(
+                            f"No database connection available within {self.timeout:.1f}s "
+                            f"(pool size {self.size})."
+                        )
+                    self._cond.wait(remaining)
+                    continue
+
+            # Driver calls happen outside the lock
+            if raw is None:
+                raw = self._create()
+            elif not self._is_healthy(raw, returned_at):
+                self._discard(raw, stale=True)
+                raw = self._create_replacement()
+
+            with self._cond:
+                self._metrics["checkouts"] += 1
+                if waited_from is not None:
+                    self._record_wait(waited_from)
+            return PooledConnection(self, raw)
+
+    def _create(self):
+        try:
+            raw = self._connect()
+        except Exception:
+            with self._cond:
+                self._open -= 1
+                self._cond.notify()
+            raise
+        with self._cond:
+            self._metrics["created"] += 1
+        return raw
+
+    def _create_replacement(self):
+        with self._cond:
+            self._open += 1
+        return self._create()
+
+    def _is_healthy(self, raw, returned_at):
+        if self._ping is None or time.monotonic() - returned_at < self.health_check_after:
+            return True
+        try:
+            self._ping(raw)
+            return True
+        except Exception:
+            return False
+
+    def _record_wait(self, waited_from):
+        waited = time.monotonic() - waited_from
+        self._metrics["wait_time_total"] += waited
+        self._metrics["wait_time_max"] = max(self._metrics["wait_time_max"], waited)
+
+    # ---------- returning ----------
+    def _release(self, raw):
+        try:
+            # Never hand the next borrower a half-finished transaction or unread rows
+            if getattr(raw, "unread_result", False):
+                raw.consume_results()
+            if getattr(raw, "in_transaction", False):
+                raw.rollback()
+        except Exception:
+            self._discard(raw, stale=True)
+            return
+        with self._cond:
+            self._idle.append((raw, time.monotonic()))
+            self._cond.notify()
+
+    def _statement_cache(self, raw):
+        with self._cond:
+            return self._statements.setdefault(id(raw), OrderedDict())
+
+    def _discard(self, raw, stale=False):
+        try:
+            raw.close()
+        except Exception:
+            pass
+        with self._cond:
+            self._statements.pop(id(raw), None)
+            self._open -= 1
+            self._metrics["discarded"] += 1
+            if stale:
+                self._metrics["stale"] += 1
+            self._cond.notify()
+
+    def close_all(self):
+        """
+        Close every idle connection (borrowed ones are closed when returned).
+        """
+        with self._cond:
+            idle, self._idle = list(self._idle), deque()
+        for raw, _ in idle:
+            self._discard(raw)
+
+    # ---------- metrics ----------
+    def stats(self):
+        with self._cond:
+            stats = dict(self._metrics)
+            stats["size"] = self.size
+            stats["open"] = self._open
+            stats["idle"] = len(self._idle)
+            stats["in_use"] = self._open - len(self._idle)
+        stats["wait_time_avg"] = stats["wait_time_total"] / stats["waits"] if stats["waits"] else 0.0
+        return stats
+
+
+# =========================================================
+# PROCESS-WIDE POOL
+# =========================================================
+# Streamlit re-executes main.py on every rerun but imports this module once per
+# process, so the pool below is shared by every session and every rerun.
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                backend = DB.get_backend()
+                _pool = ConnectionPool(backend.connect, ping=backend.ping)
+    return _pool
+
+
+def get_connection():
+    """
+    Borrow a pooled connection; conn.close() returns it to the pool.
+    Checkouts are counted against the page rendering (see perf.py).
+    """
+    conn = get_pool().connection()
+    perf.record_connection()
+    return conn
+
+
+def pool_stats():
+    return get_pool().stats()
@@ -0,0 +1,96 @@
+import csv
+import datetime
+import io
+
+CSV_COLUMNS = ["room", "date", "start", "end", "description"]
+MAX_OCCURRENCES = 400   # safety cap for a single rule (more than a full academic year of weekdays)
+
+
+# =========================================================
+# RECURRENCE RULES
+# =========================================================
+def weekly(first_date, weeks=None, until=None, interval=1, weekdays=None):
+    """
+    Dates for a weekly rule starting on `first_date`.
+    Stops after `weeks` weeks or on `until` (inclusive), whichever comes first.
+    `weekdays` (0=Mon..6=Sun) repeats on several days of each week; defaults to
+    first_date's weekday. `interval=2` means every other week.
+    """
+    if weeks is None and until is None:
+        raise ValueError("Give either a number of weeks or an end date.")
+    if interval < 1:
+        raise ValueError("Interval must be at least 1 week.")
+    weekdays = sorted(set(weekdays)) if weekdays else [first_date.weekday()]
+    week_start = first_date - datetime.timedelta(days=first_date.weekday())
+
+    dates = []
+    week = 0
+    while weeks is None or week < weeks:
+        base = week_start + datetime.timedelta(weeks=week * interval)
+        if until is not None and base > until:
+            break
+        for weekday in weekdays:
+            day = base + datetime.timedelta(days=weekday)
+            if day >= first_date and (until is None or day <= until):
+                dates.append(day)
+        week += 1
+        if len(dates) > MAX_OCCURRENCES:
+            raise ValueError(f"Rule expands to more than {MAX_OCCURRENCES} dates.")
+    return dates
+
+
+def custom(dates):
+    """
+    Explicit list of dates (ISO strings or date objects), de-duplicated and sorted.
+    """
+    parsed = {d if isinstance(d, datetime.date) else datetime.date.fromisoformat(str(d).strip()) for d in dates}
+    return sorted(parsed)
+
+
+def expand(room, dates, start, end, description="", floor=None):
+    """
+    One slot dict per date for the same room and time window.
+    """
+    return [
+        {"room": room, "floor": floor, "date": d, "start": start, "end": end, "description": description}
+        for d in dates
+    ]
+
+
+# =========================================================
+# CSV IMPORT
+# =========================================================
+def _parse_time(value):
+    return datetime.time.fromisoformat(value.strip())
+
+
+def parse_csv(data):
+    """
+    Parse a timetable CSV with the header room,date,start,end[,description].
+    `data` may be text, bytes or a file object. Returns (slots, errors) where
+    errors are (line number, message) for rows that could not be parsed.
+    """
+    if isinstance(data, bytes):
+        data = data.decode("utf-8-sig")
+    if isinstance(data, str):
+        data = io.StringIO(data)
+    reader = csv.DictReader(data)
+    missing = [c for c in CSV_COLUMNS[:4] if c not in (reader.fieldnames or [])]
+    if missing:
+        raise ValueError(f"CSV is missing column(s): {', '.join(missing)}")
+
+    slots, errors = [], []
+    for line, row in enumerate(reader, start=2):
+        try:
+            slots.append({
+                "room": row["room"].strip(),
+                "floor": (row.get("floor") or "").strip() or None,
+                "date": datetime.date.fromisoformat(row["date"].strip()),
+                "start": _parse_time(row["start"]),
+                "end": _parse_time(row["end"]),
+                "description": (row.get("description") or "").strip(),
+                "line": line,
+            })
+        except (ValueError, AttributeError) as e:
+            errors.append((line, f"Could not parse row: {e}"))
+    return slots, errors
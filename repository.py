@@ -0,0 +1,455 @@
+"""
+Shared data-access layer.
+
+Every query used by the booking, history, cancellation and student pages is
+a named statement in STATEMENTS. Statements run as server-side prepared
+statements cached per pooled connection, so MySQL parses each one once per
+connection instead of once per rerun, and every execution is counted per
+statement name (statement_stats()) to show which pages drive load.
+"""
+import threading
+import time
+
+import pool
+
+# Resource kinds -> (table, name column)
+RESOURCE_TABLES = {
+    "classroom": ("bookings", "room_name"),
+    "lab": ("lab_bookings", "lab_name"),
+}
+KINDS = tuple(RESOURCE_TABLES)
+CANCEL_TABLES = {"classroom": "cancel_requests", "lab": "cancel_lab_requests"}
+# Bookings older than the archival horizon are moved here (see archive.py)
+ARCHIVE_TABLES = {"classroom": "bookings_archive", "lab": "lab_bookings_archive"}
+
+# Shared SQL fragments
+UPCOMING = "(date > CURDATE() OR (date = CURDATE() AND end_time > CURTIME()))"
+OVERLAPS = "NOT (end_time <= %s OR start_time >= %s)"
+
+MAX_CACHED_STATEMENTS = 64   # prepared statements kept per connection (LRU)
+MAX_IDS_PER_STATEMENT = 500  # ids bound per set-based UPDATE / DELETE
+
+
+def connect():
+    """
+    Borrow a pooled connection (conn.close() returns it).
+    """
+    return pool.get_connection()
+
+
+# =========================================================
+# STATEMENTS
+# =========================================================
+STATEMENTS = {
+    # --- auth ---
+    "faculty_login": "SELECT * FROM faculty WHERE username = %s AND password = %s",
+    "faculty_register": "INSERT INTO faculty (name, username, password, role) VALUES (%s, %s, %s, %s)",
+
+    # --- user-level locks (booking.py) ---
+    "get_lock": "SELECT GET_LOCK(%s, %s)",
+    "release_lock": "SELECT RELEASE_LOCK(%s)",
+    "release_all_locks": "SELECT RELEASE_ALL_LOCKS()",
+
+    # --- reference data (catalog.py) ---
+    "catalog_classrooms": "SELECT room_name, floor, capacity, features FROM classrooms ORDER BY room_name",
+    "catalog_labs": "SELECT lab_name, floor FROM labs ORDER BY lab_name",
+    "classroom_add": "INSERT INTO classrooms (room_name, floor, capacity, features) VALUES (%s, %s, %s, %s)",
+    "classroom_remove": "DELETE FROM classrooms WHERE room_name = %s",
+    "lab_add": "INSERT INTO labs (lab_name, floor) VALUES (%s, %s)",
+    "lab_remove": "DELETE FROM labs WHERE lab_name = %s",
+
+    # --- availability index / occupancy ---
+    "day_bookings": """
+        SELECT 'classroom', room_name, start_time, end_time, id FROM bookings WHERE date = %s
+        UNION ALL
+        SELECT 'lab', lab_name, start_time, end_time, id FROM lab_bookings WHERE date = %s
+    """,
+    "range_bookings": """
+        SELECT 'classroom' AS kind, floor, room_name AS resource, date, start_time, end_time
+        FROM bookings WHERE date BETWEEN %s AND %s
+        UNION ALL
+        SELECT 'lab' AS kind, floor, lab_name AS resource, date, start_time, end_time
+        FROM lab_bookings WHERE date BETWEEN %s AND %s
+    """,
+
+    # --- utilisation rollups (rollups.py) and reports ---
+    "booking_date_bounds": """
+        SELECT MIN(date), MAX(date) FROM bookings
+        UNION ALL
+        SELECT MIN(date), MAX(date) FROM lab_bookings
+        UNION ALL
+        SELECT MIN(date), MAX(date) FROM bookings_archive
+        UNION ALL
+        SELECT MIN(date), MAX(date) FROM lab_bookings_archive
+    """,
+    "report_daily": """
+        SELECT resource, date, bookings, minutes FROM usage_daily
+        WHERE kind = %s AND date BETWEEN %s AND %s
+    """,
+    "report_hourly": """
+        SELECT hour, SUM(minutes) AS minutes FROM usage_hourly
+        WHERE kind = %s AND date BETWEEN %s AND %s
+        GROUP BY hour
+        ORDER BY hour
+    """,
+    "report_teacher": """
+        SELECT username, SUM(bookings) AS bookings, SUM(minutes) AS minutes FROM usage_teacher
+        WHERE kind = %s AND date BETWEEN %s AND %s
+        GROUP BY username
+        ORDER BY minutes DESC
+    """,
+
+    # --- student dashboard ---
+    "student_classrooms": f"""
+        SELECT room_name AS Room, start_time AS Start, end_time AS End, description AS Description
+        FROM bookings
+        WHERE date = %s AND floor = %s
+            AND {UPCOMING}
+        ORDER BY start_time
+    """,
+    "student_labs": f"""
+        SELECT lab_name AS Lab, start_time AS Start, end_time AS End, description AS Description
+        FROM lab_bookings
+        WHERE date = %s
+            AND {UPCOMING}
+        ORDER BY start_time
+    """,
+}
+
+for _kind, (_table, _column) in RESOURCE_TABLES.items():
+    _cancel = CANCEL_TABLES[_kind]
+    STATEMENTS.update({
+        f"overlap_{_kind}": f"""
+            SELECT 1
+            FROM {_table}
+            WHERE {_column} = %s
+              AND date = %s
+              AND {OVERLAPS}
+            LIMIT 1
+        """,
+        f"insert_{_kind}": f"""
+            INSERT INTO {_table} (username, {_column}, floor, date, start_time, end_time, duration, description)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+        """,
+        f"rollup_source_{_kind}": f"""
+            SELECT username, {_column}, date, start_time, end_time
+            FROM {_table} WHERE date BETWEEN %s AND %s
+            UNION ALL
+            SELECT username, {_column}, date, start_time, end_time
+            FROM {ARCHIVE_TABLES[_kind]} WHERE date BETWEEN %s AND %s
+        """,
+        f"archive_candidates_{_kind}": f"""
+            SELECT id, date FROM {_table}
+            WHERE date < %s
+            ORDER BY date, id
+            LIMIT %s
+        """,
+        f"upcoming_{_kind}_all": f"""
+            SELECT * FROM {_table}
+            WHERE {UPCOMING}
+            ORDER BY date DESC, start_time DESC
+        """,
+        f"upcoming_{_kind}_by_user": f"""
+            SELECT * FROM {_table}
+            WHERE username = %s
+                AND {UPCOMING}
+            ORDER BY date DESC, start_time DESC
+        """,
+        f"cancel_request_{_kind}": f"""
+            INSERT INTO {_cancel} (booking_id, teacher_username, reason)
+            VALUES (%s, %s, %s)
+        """,
+    })
+
+
+def pending_queue_sql(kind, filters=()):
+    """
+    Pending requests of `kind` joined with their bookings, narrowed by extra
+    WHERE `filters` (conditions on c = the request, b = the booking).
+    """
+    table, column = RESOURCE_TABLES[kind]
+    where = " ".join(f"AND {condition}" for condition in filters)
+    return f"""
+        SELECT c.id AS request_id, c.booking_id, c.teacher_username, c.reason, c.created_at,
+               b.{column} AS resource, b.floor, b.date, b.start_time, b.end_time
+        FROM {CANCEL_TABLES[kind]} c
+        LEFT JOIN {table} b ON b.id = c.booking_id
+        WHERE c.status = 'Pending' {where}
+        ORDER BY b.date, b.start_time, c.id
+    """
+
+
+for _kind in KINDS:
+    STATEMENTS[f"pending_queue_{_kind}"] = pending_queue_sql(_kind)
+
+for _rollup in ("usage_daily", "usage_hourly", "usage_teacher"):
+    STATEMENTS[f"rollup_clear_{_rollup}"] = f"DELETE FROM {_rollup} WHERE date BETWEEN %s AND %s"
+    STATEMENTS[f"rollup_clear_all_{_rollup}"] = f"DELETE FROM {_rollup}"
+
+
+# =========================================================
+# EXECUTION (prepared, cached per connection, counted)
+# =========================================================
+_stats = {}     # statement name -> [executions, prepares, total seconds]
+_stats_lock = threading.Lock()
+
+
+def _count(name, prepared, elapsed):
+    with _stats_lock:
+        entry = _stats.setdefault(name, [0, 0, 0.0])
+        entry[0] += 1
+        entry[1] += prepared
+        entry[2] += elapsed
+
+
+def _cursor(conn, sql, prepare):
+    """
+    Cached prepared cursor for `sql` on this connection, or a fresh one.
+    Returns (cursor, owned, newly_prepared); owned cursors must be closed by the caller.
+    """
+    cache = getattr(conn, "statement_cache", None) if prepare else None
+    if cache is None:
+        return conn.cursor(prepared=prepare), True, prepare
+    cursor = cache.get(sql)
+    if cursor is not None:
+        cache.move_to_end(sql)
+        return cursor, False, False
+    cursor = conn.cursor(prepared=True)
+    cache[sql] = cursor
+    while len(cache) > MAX_CACHED_STATEMENTS:
+        _, evicted = cache.popitem(last=False)
+        try:
+            evicted.close()
+        except Exception:
+            pass
+    return cursor, False, True
+
+
+def _execute(conn, name, params, sql, prepare, fetch, dictionary=False):
+    sql = sql or STATEMENTS[name]
+    cursor, owned, prepared = _cursor(conn, sql, prepare)
+    started = time.perf_counter()
+    try:
+        cursor.execute(sql, tuple(params))
+        if fetch == "all":
+            rows = cursor.fetchall()
+        elif fetch == "one":
+            rows = cursor.fetchone()
+            if rows is not None:
+                cursor.fetchall()   # drain so the connection is ready for the next statement
+        else:
+            return cursor.rowcount, cursor.lastrowid
+        if dictionary:
+            columns = cursor.column_names
+            rows = dict(zip(columns, rows)) if fetch == "one" and rows is not None else (
+                [dict(zip(columns, row)) for row in rows] if fetch == "all" else rows)
+        return rows
+    finally:
+        _count(name, prepared, time.perf_counter() - started)
+        if owned:
+            cursor.close()
+
+
+def fetch_all(conn, name, params=(), sql=None, dictionary=False, prepare=True):
+    """
+    Run a named statement and return every row (tuples, or dicts with dictionary=True).
+    Pass `sql` for dynamically shaped queries; `name` then labels it in the stats.
+    prepare=False skips the statement cache for one-off shapes (e.g. long IN lists).
+    """
+    return _execute(conn, name, params, sql, prepare, "all", dictionary)
+
+
+def fetch_one(conn, name, params=(), sql=None, dictionary=False, prepare=True):
+    return _execute(conn, name, params, sql, prepare, "one", dictionary)
+
+
+def run(conn, name, params=(), sql=None, prepare=True):
+    """
+    Run a named write statement; returns (rowcount, lastrowid). Does not commit.
+    """
+    return _execute(conn, name, params, sql, prepare, None)
+
+
+def run_many(conn, name, seq_params, sql=None):
+    """
+    executemany() on a plain cursor, so MySQL can batch INSERTs into one multi-row statement.
+    """
+    sql = sql or STATEMENTS[name]
+    cursor = conn.cursor()
+    started = time.perf_counter()
+    try:
+        cursor.executemany(sql, [tuple(p) for p in seq_params])
+        return cursor.rowcount
+    finally:
+        _count(name, False, time.perf_counter() - started)
+        cursor.close()
+
+
+def stream(conn, name, params=(), sql=None, batch_size=5000):
+    """
+    Yield (column_names, rows) batches of at most `batch_size` rows from an
+    unbuffered cursor, so the full result never sits in client memory.
+    The connection stays busy until the generator is exhausted or closed.
+    """
+    sql = sql or STATEMENTS[name]
+    cursor = conn.cursor(buffered=False)
+    started = time.perf_counter()
+    try:
+        cursor.execute(sql, tuple(params))
+        columns = cursor.column_names
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            yield columns, rows
+    finally:
+        _count(name, False, time.perf_counter() - started)
+        try:
+            cursor.close()
+        except Exception:
+            pass   # unread rows of an abandoned stream are drained when the pool takes the connection back
+
+
+def statement_stats():
+    """
+    [{"statement", "executions", "prepares", "total_ms", "avg_ms"}], busiest first.
+    """
+    with _stats_lock:
+        items = [(name, *values) for name, values in _stats.items()]
+    return sorted((
+        {"statement": name, "executions": executions, "prepares": prepares,
+         "total_ms": round(total * 1000, 2), "avg_ms": round(total * 1000 / executions, 3)}
+        for name, executions, prepares, total in items
+    ), key=lambda row: -row["executions"])
+
+
+# =========================================================
+# PAGE QUERIES
+# =========================================================
+def login(conn, username, password):
+    return fetch_one(conn, "faculty_login", (username, password), dictionary=True)
+
+
+def register_faculty(conn, name, username, password, role):
+    return run(conn, "faculty_register", (name, username, password, role))
+
+
+def has_overlap(conn, kind, name, date, start, end):
+    return fetch_one(conn, f"overlap_{kind}", (name, date, start, end)) is not None
+
+
+def insert_booking(conn, kind, username, name, floor, date, start, end, duration, description):
+    """
+    Insert one booking; returns its id. Does not commit.
+    """
+    _, booking_id = run(conn, f"insert_{kind}", (username, name, floor, date, start, end, duration, description))
+    return booking_id
+
+
+def upcoming_bookings(conn, kind, username=None):
+    """
+    Bookings of `kind` that have not finished yet, newest first; all users if username is None.
+    """
+    if username is None:
+        return fetch_all(conn, f"upcoming_{kind}_all", dictionary=True)
+    return fetch_all(conn, f"upcoming_{kind}_by_user", (username,), dictionary=True)
+
+
+def request_cancellation(conn, kind, booking_id, username, reason):
+    return run(conn, f"cancel_request_{kind}", (booking_id, username, reason))
+
+
+def pending_queue(conn, kind, teacher=None, date_from=None, date_to=None, resource=None):
+    """
+    Pending cancellation requests of `kind` joined with the booking they target
+    (resource, floor, date, times), oldest booking first, in one query.
+    Requests whose booking is already gone have NULL booking columns.
+    """
+    _, column = RESOURCE_TABLES[kind]
+    filters, params = [], []
+    for condition, value in (("c.teacher_username = %s", teacher), ("b.date >= %s", date_from),
+                             ("b.date <= %s", date_to), (f"b.{column} = %s", resource)):
+        if value:
+            filters.append(condition)
+            params.append(value)
+    if not filters:
+        return fetch_all(conn, f"pending_queue_{kind}", dictionary=True)
+    return fetch_all(conn, f"pending_queue_{kind}", params, sql=pending_queue_sql(kind, filters), dictionary=True)
+
+
+def _id_chunks(ids):
+    ids = sorted(set(int(i) for i in ids))
+    for i in range(0, len(ids), MAX_IDS_PER_STATEMENT):
+        chunk = ids[i:i + MAX_IDS_PER_STATEMENT]
+        yield chunk, ", ".join(["%s"] * len(chunk))
+
+
+def cancellation_sql(kind, placeholders):
+    """
+    The statements approve_cancellations() and reject_cancellations() run for
+    one chunk of request ids, by name (explain_check.py checks their plans).
+    """
+    table, column = RESOURCE_TABLES[kind]
+    cancel = CANCEL_TABLES[kind]
+    pending = f"SELECT booking_id FROM {cancel} WHERE id IN ({placeholders}) AND status = 'Pending'"
+    return {
+        f"approve_targets_{kind}": f"""
+            SELECT id, username, {column}, date, start_time, end_time FROM {table}
+            WHERE id IN ({pending})
+        """,
+        f"approve_delete_{kind}": f"DELETE FROM {table} WHERE id IN ({pending})",
+        f"approve_requests_{kind}": f"""
+            UPDATE {cancel} SET status = 'Approved' WHERE id IN ({placeholders}) AND status = 'Pending'
+        """,
+        f"reject_requests_{kind}": f"""
+            UPDATE {cancel} SET status = 'Rejected' WHERE id IN ({placeholders}) AND status = 'Pending'
+        """,
+    }
+
+
+def approve_cancellations(conn, kind, request_ids):
+    """
+    Approve pending requests set-wise: delete every booking they target and
+    mark them Approved, a few statements per MAX_IDS_PER_STATEMENT requests.
+    Returns (requests approved, deleted bookings as (id, username, resource,
+    date, start_time, end_time) tuples). Does not commit.
+    """
+    approved, deleted = 0, []
+    for chunk, placeholders in _id_chunks(request_ids):
+        sql = cancellation_sql(kind, placeholders)
+        targets, delete, mark = f"approve_targets_{kind}", f"approve_delete_{kind}", f"approve_requests_{kind}"
+        deleted += fetch_all(conn, targets, chunk, sql=sql[targets], prepare=False)
+        run(conn, delete, chunk, sql=sql[delete], prepare=False)
+        approved += run(conn, mark, chunk, sql=sql[mark], prepare=False)[0]
+    return approved, deleted
+
+
+def reject_cancellations(conn, kind, request_ids):
+    """
+    Mark pending requests Rejected; returns how many changed. Does not commit.
+    """
+    rejected = 0
+    for chunk, placeholders in _id_chunks(request_ids):
+        name = f"reject_requests_{kind}"
+        rejected += run(conn, name, chunk, sql=cancellation_sql(kind, placeholders)[name], prepare=False)[0]
+    return rejected
+
+
+def usage_report(conn, kind, first, last):
+    """
+    Rollup rows for the reports page: (daily per resource, minutes per hour
+    of day, per-teacher totals) for `kind` in [first, last].
+    """
+    params = (kind, first, last)
+    return (fetch_all(conn, "report_daily", params, dictionary=True),
+            fetch_all(conn, "report_hourly", params, dictionary=True),
+            fetch_all(conn, "report_teacher", params, dictionary=True))
+
+
+def student_bookings(conn, kind, date, floor=None):
+    """
+    Upcoming bookings on `date` for the student dashboard (classrooms filtered by floor).
+    """
+    if kind == "classroom":
+        return fetch_all(conn, "student_classrooms", (date, floor), dictionary=True)
+    return fetch_all(conn, "student_labs", (date,), dictionary=True)
@@ -0,0 +1,140 @@
+"""
+Incrementally maintained utilisation rollups.
+
+    python rollups.py rebuild                        # recompute every rollup from the bookings
+    python rollups.py rebuild 2025-01-01 2025-06-30  # only that date range
+
+Three tables, all keyed by (kind, date, ...):
+
+    usage_daily     bookings and minutes booked per resource per day
+    usage_hourly    minutes booked per hour of the day (peak hours)
+    usage_teacher   bookings and minutes per teacher per day
+
+Every write path adds (or, for cancellations, subtracts) its bookings'
+deltas with upserts inside its own transaction, so reports read small
+pre-aggregated rows instead of scanning the booking history.
+"""
+import datetime
+import sys
+
+import DB
+import repository
+from availability import to_date, to_seconds
+
+REBUILD_DAYS = 31   # bookings re-aggregated per transaction during a rebuild
+
+TABLES = {
+    # table: (key columns, counter columns)
+    "usage_daily": (("kind", "date", "resource"), ("bookings", "minutes")),
+    "usage_hourly": (("kind", "date", "hour"), ("minutes",)),
+    "usage_teacher": (("kind", "date", "username"), ("bookings", "minutes")),
+}
+
+_upserts = {}
+
+
+def _upsert_sql(table):
+    backend = DB.get_backend()
+    key = (id(backend), table)
+    if key not in _upserts:
+        _upserts[key] = backend.upsert_add(table, *TABLES[table])
+    return _upserts[key]
+
+
+# =========================================================
+# DELTAS
+# =========================================================
+def deltas(bookings, sign=1):
+    """
+    Aggregate (kind, username, resource, date, start, end) bookings into
+    {table: {key: [counters]}}, each counter multiplied by `sign`.
+    """
+    out = {table: {} for table in TABLES}
+
+    def bump(table, key, *values):
+        counters = out[table].setdefault(key, [0] * len(values))
+        for i, value in enumerate(values):
+            counters[i] += sign * value
+
+    for kind, username, resource, date, start, end in bookings:
+        date = to_date(date)
+        start_s, end_s = to_seconds(start), to_seconds(end)
+        minutes = max(0, end_s - start_s) // 60
+        bump("usage_daily", (kind, date, resource), 1, minutes)
+        bump("usage_teacher", (kind, date, username), 1, minutes)
+        for hour in range(start_s // 3600, -(-end_s // 3600)):
+            overlap = min(end_s, (hour + 1) * 3600) - max(start_s, hour * 3600)
+            if overlap > 0:
+                bump("usage_hourly", (kind, date, hour), overlap // 60)
+    return out
+
+
+def record(conn, bookings, sign=1):
+    """
+    Apply the deltas of `bookings` (see deltas()) to the rollup tables on the
+    caller's connection and transaction. Use sign=-1 for deleted bookings.
+    Does not commit.
+    """
+    # Tables and keys in a fixed order, so concurrent writers lock rollup rows
+    # in the same order and cannot deadlock each other
+    for table, rows in deltas(bookings, sign).items():
+        if rows:
+            repository.run_many(conn, f"rollup_{table}", [(*key, *rows[key]) for key in sorted(rows, key=str)],
+                                sql=_upsert_sql(table))
+
+
+# =========================================================
+# REBUILD (repair)
+# =========================================================
+def rebuild(conn, first=None, last=None, log=print):
+    """
+    Recompute the rollups for [first, last] (everything by default) from the
+    live and archived booking tables, one REBUILD_DAYS window per transaction.
+    Run it after migrating an existing database or to repair drift; bookings
+    written while a window is being rebuilt may need another pass.
+    """
+    if first is None or last is None:
+        bounds = [d for row in repository.fetch_all(conn, "booking_date_bounds") for d in row if d is not None]
+        if not bounds:
+            for table in TABLES:
+                repository.run(conn, f"rollup_clear_all_{table}")
+            conn.commit()
+            return 0
+        first = first or min(to_date(d) for d in bounds)
+        last = last or max(to_date(d) for d in bounds)
+        conn.rollback()   # end the read transaction; each window starts its own
+
+    total = 0
+    window = first
+    while window <= last:
+        window_end = min(last, window + datetime.timedelta(days=REBUILD_DAYS - 1))
+        conn.start_transaction()
+        try:
+            for table in TABLES:
+                repository.run(conn, f"rollup_clear_{table}", (window, window_end))
+            bookings = []
+            for kind in repository.KINDS:
+                bookings += [(kind, *row) for row in
+                             repository.fetch_all(conn, f"rollup_source_{kind}", (window, window_end) * 2)]
+            record(conn, bookings)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        total += len(bookings)
+        log(f"  {window} .. {window_end}: {len(bookings)} bookings")
+        window = window_end + datetime.timedelta(days=1)
+    return total
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] != "rebuild":
+        print(__doc__)
+        sys.exit(2)
+    dates = [datetime.date.fromisoformat(arg) for arg in sys.argv[2:4]]
+    conn = repository.connect()
+    try:
+        count = rebuild(conn, *dates)
+    finally:
+        conn.close()
+    print(f"Rebuilt rollups from {count} bookings")
@@ -0,0 +1,27 @@
+"""
+Room search: free classrooms that fit a class, best fit first.
+
+The catalogue's RoomIndex narrows the rooms to those with enough seats and
+every required feature (smallest adequate room first), then the availability
+index drops the ones already booked for the slot. Both are in memory, so a
+search costs no queries once the catalogue and the day are loaded.
+"""
+import catalog
+from availability import get_index
+
+
+def search(date, start, end, min_capacity=0, features=(), floor=None, limit=None):
+    """
+    Classrooms free for [start, end) on `date` with at least `min_capacity`
+    seats and all `features`, on `floor` (any floor if None), as dicts with
+    resource, floor, capacity and spare seats, ranked by best fit.
+    """
+    rooms = catalog.room_index().matches(min_capacity, features, floor)
+    if not rooms:
+        return []
+    free = set(get_index().free_resources("classroom", [name for name, _, _ in rooms], date, start, end))
+    found = [
+        {"resource": name, "floor": room_floor, "capacity": capacity, "spare": capacity - (min_capacity or 0)}
+        for name, room_floor, capacity in rooms if name in free
+    ]
+    return found[:limit] if limit else found
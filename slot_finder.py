@@ -0,0 +1,113 @@
+import datetime
+import heapq
+
+import catalog
+import repository
+from availability import to_date, to_seconds
+
+ALIGN_MINUTES = 15   # suggested start times are rounded up to this grid
+
+
+def fetch_busy(first_date, last_date, kinds):
+    """
+    Every booking of the requested kinds in [first_date, last_date] in one round-trip,
+    grouped as {(kind, name, date): [(start_s, end_s), ...]}.
+    """
+    branches, params = [], []
+    if "classroom" in kinds:
+        branches.append("SELECT 'classroom', room_name, date, start_time, end_time FROM bookings WHERE date BETWEEN %s AND %s")
+        params += [first_date, last_date]
+    if "lab" in kinds:
+        branches.append("SELECT 'lab', lab_name, date, start_time, end_time FROM lab_bookings WHERE date BETWEEN %s AND %s")
+        params += [first_date, last_date]
+    busy = {}
+    if not branches:
+        return busy
+    conn = repository.connect()
+    try:
+        rows = repository.fetch_all(conn, "slot_finder_busy", params, sql=" UNION ALL ".join(branches))
+    finally:
+        conn.close()
+    for kind, name, date, start, end in rows:
+        busy.setdefault((kind, name, to_date(date)), []).append((to_seconds(start), to_seconds(end)))
+    return busy
+
+
+def _candidates(kinds, floor, min_capacity, features=()):
+    """
+    (kind, name, floor, capacity) for every resource matching the constraints.
+    Labs carry no capacity or features in the catalogue, so either filter limits
+    the search to classrooms (taken from the room index, best fit first).
+    """
+    resources = []
+    if "classroom" in kinds:
+        for name, room_floor, capacity in catalog.room_index().matches(min_capacity, features, floor):
+            resources.append(("classroom", name, room_floor, capacity))
+    if "lab" in kinds and min_capacity is None and not features:
+        for name, lab_floor in catalog.labs():
+            if floor is None or lab_floor == floor:
+                resources.append(("lab", name, lab_floor, None))
+    return resources
+
+
+def _first_gap(intervals, open_s, close_s, need_s, align_s):
+    """
+    Sweep sorted busy intervals and return the earliest aligned start s with
+    [s, s + need) inside [open, close) and overlapping none of them.
+    """
+    cursor = -(-open_s // align_s) * align_s
+    for start, end in intervals:          # sorted by start
+        if end <= cursor:
+            continue
+        if start >= cursor + need_s:
+            break                         # gap before this booking is wide enough
+        cursor = -(-max(cursor, end) // align_s) * align_s
+    return cursor if cursor + need_s <= close_s else None
+
+
+def find_slots(duration, first_date, last_date, kinds=("classroom", "lab"), floor=None,
+               min_capacity=None, features=(), day_start=datetime.time(8), day_end=datetime.time(18),
+               limit=5, weekdays=None, now=None, align_minutes=ALIGN_MINUTES):
+    """
+    Earliest free slots of length `duration` (timedelta) across every classroom
+    and lab matching the constraints, between `first_date` and `last_date`
+    within working hours [day_start, day_end).
+
+    One range query fetches all bookings in the window; a sweep over each
+    resource-day's sorted intervals finds its first fitting gap, and the
+    `limit` earliest (date, start, resource) results are returned as dicts.
+    `features` are required classroom features; `weekdays` (0=Mon..6=Sun)
+    restricts the days searched; slots today start no earlier than `now`.
+    """
+    need_s = int(duration.total_seconds())
+    if need_s <= 0 or first_date > last_date:
+        return []
+    now = now or datetime.datetime.now()
+    open_s, close_s = to_seconds(day_start), to_seconds(day_end)
+    align_s = max(60, align_minutes * 60)
+
+    resources = _candidates(kinds, floor, min_capacity, features)
+    busy = fetch_busy(first_date, last_date, kinds)
+
+    def as_time(seconds):
+        return (datetime.datetime.min + datetime.timedelta(seconds=seconds)).time()
+
+    found = []
+    day = first_date
+    while day <= last_date and len(found) < limit:
+        # Days are scanned in order, so once `limit` slots are found no later day can beat them
+        if weekdays is None or day.weekday() in weekdays:
+            day_open = open_s
+            if day == now.date():
+                day_open = max(open_s, now.hour * 3600 + now.minute * 60 + now.second)
+            for kind, name, res_floor, capacity in resources:
+                start = _first_gap(sorted(busy.get((kind, name, day), ())), day_open, close_s, need_s, align_s)
+                if start is not None:
+                    found.append((day, start, kind, name, res_floor, capacity))
+        day += datetime.timedelta(days=1)
+
+    return [
+        {"date": day, "start": as_time(start), "end": as_time(start + need_s),
+         "kind": kind, "resource": name, "floor": res_floor, "capacity": capacity}
+        for day, start, kind, name, res_floor, capacity in heapq.nsmallest(limit, found, key=lambda g: g[:4])
+    ]
@@ -0,0 +1,169 @@
+"""
+Contention stress test for the booking commit path.
+
+Fires thousands of concurrent booking attempts from many threads against a
+small set of rooms/dates, then checks the database for overlapping bookings
+and reports throughput.
+
+    python stress_booking.py --attempts 5000 --threads 32 --rooms 10 --days 3
+
+Bookings are written far in the future under a dedicated username and are
+deleted again afterwards (use --keep to leave them in place).
+"""
+import argparse
+import datetime
+import random
+import sys
+import threading
+import time
+
+import pool
+import rollups
+import versions
+from booking import BookingBusy, BookingConflict, reserve
+
+STRESS_USER = "__stress__"
+
+
+def _attempt(rng, rooms, dates):
+    room = rng.choice(rooms)
+    date = rng.choice(dates)
+    # 15-minute grid between 08:00 and 18:00, 15-120 minute bookings
+    start_min = 8 * 60 + 15 * rng.randrange(0, 40)
+    length = 15 * rng.randrange(1, 9)
+    start = datetime.time(start_min // 60, start_min % 60)
+    end_min = min(start_min + length, 18 * 60)
+    end = datetime.time(end_min // 60, end_min % 60)
+    return room, date, start, end, str(datetime.timedelta(minutes=end_min - start_min))
+
+
+def _worker(seed, attempts, rooms, dates, counters, lock):
+    rng = random.Random(seed)
+    booked = conflicts = busy = errors = checkout_failures = 0
+    last_error = None
+    for _ in range(attempts):
+        room, date, start, end, duration = _attempt(rng, rooms, dates)
+        conn = None
+        try:
+            conn = pool.get_connection()
+            reserve(conn, "classroom", STRESS_USER, room, "stress", date, start, end, duration, "stress test")
+            booked += 1
+        except BookingConflict:
+            conflicts += 1
+        except BookingBusy:
+            busy += 1
+        except Exception as e:
+            if conn is None:
+                checkout_failures += 1   # pool exhausted or the database refused the connection
+            else:
+                errors += 1
+            last_error = f"{type(e).__name__}: {e}"
+        finally:
+            if conn is not None:
+                conn.close()
+    with lock:
+        counters["booked"] += booked
+        counters["conflicts"] += conflicts
+        counters["busy"] += busy
+        counters["errors"] += errors
+        counters["checkout_failures"] += checkout_failures
+        counters["last_error"] = last_error or counters["last_error"]
+
+
+def count_overlaps(first_date, last_date):
+    conn = pool.get_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT COUNT(*)
+            FROM bookings a
+            JOIN bookings b
+              ON a.room_name = b.room_name
+             AND a.date = b.date
+             AND a.id < b.id
+             AND NOT (a.end_time <= b.start_time OR a.start_time >= b.end_time)
+            WHERE a.date BETWEEN %s AND %s
+              AND a.username = %s
+        """, (first_date, last_date, STRESS_USER))
+        (overlaps,) = cursor.fetchone()
+        cursor.close()
+    finally:
+        conn.close()
+    return overlaps
+
+
+def cleanup(first_date, last_date):
+    conn = pool.get_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT username, room_name, date, start_time, end_time FROM bookings
+            WHERE username = %s AND date BETWEEN %s AND %s
+        """, (STRESS_USER, first_date, last_date))
+        rows = cursor.fetchall()
+        rollups.record(conn, [("classroom", *row) for row in rows], sign=-1)
+        cursor.execute("DELETE FROM bookings WHERE username = %s AND date BETWEEN %s AND %s",
+                       (STRESS_USER, first_date, last_date))
+        conn.commit()
+        cursor.close()
+        versions.bump(conn, [("classroom", row[2]) for row in rows])
+    finally:
+        conn.close()
+
+
+def run(attempts, threads, rooms, days, seed=0, keep=False):
+    room_names = [f"STRESS {i:03d}" for i in range(rooms)]
+    first_date = datetime.date.today() + datetime.timedelta(days=3650)
+    dates = [first_date + datetime.timedelta(days=i) for i in range(days)]
+    last_date = dates[-1]
+
+    cleanup(first_date, last_date)
+    counters = {"booked": 0, "conflicts": 0, "busy": 0, "errors": 0, "checkout_failures": 0, "last_error": None}
+    lock = threading.Lock()
+    per_thread = [attempts // threads + (1 if i < attempts % threads else 0) for i in range(threads)]
+    workers = [
+        threading.Thread(target=_worker, args=(seed + i, n, room_names, dates, counters, lock))
+        for i, n in enumerate(per_thread)
+    ]
+
+    started = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - started
+
+    overlaps = count_overlaps(first_date, last_date)
+    if not keep:
+        cleanup(first_date, last_date)
+
+    return {
+        "attempts": attempts,
+        "threads": threads,
+        "elapsed_s": round(elapsed, 3),
+        "attempts_per_s": round(attempts / elapsed, 1),
+        "bookings_per_s": round(counters["booked"] / elapsed, 1),
+        "overlaps": overlaps,
+        "failed": counters["errors"] + counters["checkout_failures"],
+        **counters,
+        "pool": pool.pool_stats(),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--attempts", type=int, default=5000)
+    parser.add_argument("--threads", type=int, default=32)
+    parser.add_argument("--rooms", type=int, default=10)
+    parser.add_argument("--days", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--keep", action="store_true", help="leave the stress bookings in the database")
+    args = parser.parse_args()
+
+    result = run(args.attempts, args.threads, args.rooms, args.days, args.seed, args.keep)
+    for key, value in result.items():
+        print(f"{key:>17}: {value}")
+    if result["overlaps"] or result["failed"]:
+        print("FAILED: overlapping bookings or failed attempts detected")
+        sys.exit(1)
+    print("OK: zero overlapping bookings")
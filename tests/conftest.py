@@ -0,0 +1,131 @@
+"""
+Shared test setup: a throwaway SQLite database (migrated to the latest
+schema) behind the process-wide pool, with mysql.connector's transaction
+rules, so the suite needs no MySQL server.
+
+    python -m pytest -q
+"""
+import os
+import re
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import DB           # noqa: E402
+import catalog      # noqa: E402
+import migrations   # noqa: E402
+import pool         # noqa: E402
+import versions     # noqa: E402
+from availability import get_index   # noqa: E402
+
+# InnoDB opens a transaction on the first statement that reads or writes a table
+_OPENS_TRANSACTION = re.compile(r"^\s*(INSERT|UPDATE|DELETE|REPLACE)\b|\bFROM\b", re.IGNORECASE)
+
+
+class ProgrammingError(Exception):
+    """Stands in for mysql.connector.errors.ProgrammingError."""
+
+
+class MySQLLikeCursor:
+    def __init__(self, conn, raw):
+        self._conn = conn
+        self._raw = raw
+
+    def execute(self, operation, params=()):
+        self._conn._touch(operation)
+        self._raw.execute(operation, params)
+        return self
+
+    def executemany(self, operation, seq_params):
+        self._conn._touch(operation)
+        self._raw.executemany(operation, seq_params)
+        return self
+
+    def __iter__(self):
+        return iter(self._raw)
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+
+class MySQLLikeConnection(DB.SQLiteConnection):
+    """
+    SQLite connection that, like mysql.connector with autocommit off, is in a
+    transaction from the first table read or write until commit/rollback, and
+    refuses start_transaction() while one is open. (sqlite3 only opens
+    implicit transactions for writes, which hides read-then-begin bugs.)
+    """
+
+    def __init__(self, raw):
+        super().__init__(raw)
+        self._open = False
+
+    def _touch(self, operation):
+        if _OPENS_TRANSACTION.search(operation):
+            self._open = True
+
+    def cursor(self, dictionary=False, **kwargs):
+        return MySQLLikeCursor(self, super().cursor(dictionary=dictionary, **kwargs))
+
+    def start_transaction(self):
+        if self.in_transaction:
+            raise ProgrammingError("Transaction already in progress")
+        super().start_transaction()
+        self._open = True
+
+    @property
+    def in_transaction(self):
+        return self._open or self._raw.in_transaction
+
+    def commit(self):
+        super().commit()
+        self._open = False
+
+    def rollback(self):
+        super().rollback()
+        self._open = False
+
+
+class MySQLLikeBackend(DB.SQLiteBackend):
+    def connect(self):
+        return MySQLLikeConnection(super().connect()._raw)
+
+
+def migrated_backend(path):
+    """
+    A MySQLLikeBackend on a new SQLite file at `path`, migrated to the latest schema.
+    """
+    backend = MySQLLikeBackend(str(path))
+    conn = backend.connect()
+    try:
+        migrations.migrate(conn, log=lambda _: None, backend=backend)
+    finally:
+        conn.close()
+    return backend
+
+
+@pytest.fixture(scope="session", autouse=True)
+def database(tmp_path_factory):
+    backend = migrated_backend(tmp_path_factory.mktemp("db") / "bookmyclassroom.db")
+    DB.set_backend(backend)
+    yield backend
+    pool.get_pool().close_all()
+
+
+@pytest.fixture
+def scratch_backend(tmp_path):
+    """
+    A separate migrated database for tests that fill or wipe whole tables;
+    connect with scratch_backend.connect() (not through the pool).
+    """
+    return migrated_backend(tmp_path / "scratch.db")
+
+
+@pytest.fixture(autouse=True)
+def fresh_caches():
+    # Process-wide caches outlive a test; start every test from the database
+    catalog.invalidate()
+    get_index().invalidate()
+    versions.invalidate()
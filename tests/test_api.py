@@ -0,0 +1,140 @@
+"""
+JSON API handlers, called directly and through Api.respond() (no socket).
+"""
+import asyncio
+import base64
+import datetime
+import json
+import time
+
+import pytest
+
+import api
+import catalog
+import perf
+import pool
+import repository
+
+DATE = (datetime.date.today() + datetime.timedelta(days=500)).isoformat()
+AUTH = {"authorization": "Basic " + base64.b64encode(b"api-teacher:secret").decode()}
+
+
+@pytest.fixture(scope="module", autouse=True)
+def resources():
+    conn = repository.connect()
+    try:
+        repository.register_faculty(conn, "API Teacher", "api-teacher", "secret", "teacher")
+        conn.commit()
+    finally:
+        conn.close()
+    catalog.add_classroom("A-101", "1st", 40, "projector")
+    catalog.add_lab("A-Lab", "1st")
+
+
+def respond(method, target, body=None, headers=AUTH):
+    status, _, payload = asyncio.run(api.Api().respond(method, target, headers, json.dumps(body).encode()
+                                                       if body is not None else b""))
+    return status, json.loads(payload) if payload else None
+
+
+def test_book_after_login_on_the_same_connection():
+    # The login SELECT opens a transaction (MySQL rules, see conftest); booking must still work
+    conn = repository.connect()
+    try:
+        result = api.book(conn, AUTH, {"bookings": [
+            {"kind": "classroom", "name": "A-101", "date": DATE, "start": "09:00", "end": "10:00"},
+            {"kind": "lab", "name": "A-Lab", "date": DATE, "start": "09:00", "end": "10:00"},
+        ]})
+    finally:
+        conn.close()
+    assert [r["status"] for r in result["results"]] == ["booked", "booked"]
+
+
+def test_atomic_booking_conflict():
+    status, payload = respond("POST", "/v1/bookings", {"atomic": True, "bookings": [
+        {"kind": "classroom", "name": "A-101", "date": DATE, "start": "11:00", "end": "12:00"},
+        {"kind": "lab", "name": "A-Lab", "date": DATE, "start": "09:30", "end": "10:30"},
+    ]})
+    assert status == 409, payload
+    status, payload = respond("POST", "/v1/bookings", {"bookings": [
+        {"kind": "classroom", "name": "A-101", "date": DATE, "start": "11:00", "end": "12:00"},
+    ]})
+    assert status == 200, payload
+
+
+def test_unknown_paths_share_one_metric_label():
+    for i in range(3):
+        assert respond("GET", f"/junk{i}")[0] == 404
+    assert respond("GET", "/health")[0] == 200
+    pages = perf.totals()
+    assert "api unknown" in pages and "api /health" in pages
+    assert not [p for p in pages if p.startswith("api /junk")]
+
+
+def test_other_users_history_is_forbidden_for_teachers():
+    status, payload = respond("GET", "/v1/history?username=someone-else")
+    assert status == 403, payload
+    assert respond("GET", "/v1/history?username=api-teacher")[0] == 200
+
+
+@pytest.mark.parametrize("method, target, body", [
+    ("GET", "/v1/history?page_size=abc", None),
+    ("POST", "/v1/bookings", {"bookings": [{"name": ["A-101"], "date": DATE, "start": "09:00", "end": "10:00"}]}),
+    ("POST", "/v1/bookings", {"bookings": [{"name": {"a": 1}, "date": DATE, "start": "09:00", "end": "10:00"}]}),
+    ("POST", "/v1/bookings", {"bookings": [{"name": "A-101", "date": DATE, "start": "09:00", "end": "10:00",
+                                            "description": 5}]}),
+    ("POST", "/v1/bookings", {"bookings": "A-101"}),
+    ("POST", "/v1/bookings", {"bookings": [1, 2]}),
+    ("POST", "/v1/availability", {"resources": [["A-101"]], "slots": []}),
+    ("POST", "/v1/availability", {"resources": {"A-101": 1}, "slots": []}),
+    ("POST", "/v1/availability", {"slots": ["09:00"]}),
+])
+def test_malformed_input_is_a_400(method, target, body):
+    status, payload = respond(method, target, body)
+    assert status == 400, payload
+
+
+class _Writer:
+    def __init__(self):
+        self.data = b""
+
+    def write(self, data):
+        self.data += data
+
+    async def drain(self):
+        pass
+
+    def close(self):
+        pass
+
+
+@pytest.mark.parametrize("length", [b"abc", b"-5"])
+def test_bad_content_length_is_a_400(length):
+    async def send():
+        reader = asyncio.StreamReader()
+        reader.feed_data(b"POST /v1/availability HTTP/1.1\r\nContent-Length: " + length + b"\r\n\r\n{}")
+        reader.feed_eof()
+        writer = _Writer()
+        await api.Api().handle(reader, writer)
+        return writer.data
+
+    assert asyncio.run(send()).startswith(b"HTTP/1.1 400 ")
+
+
+def test_nested_borrows_never_exhaust_the_pool(monkeypatch, database):
+    small = pool.ConnectionPool(database.connect, size=2, timeout=0.5)
+    monkeypatch.setattr(pool, "_pool", small)
+
+    def work(conn):
+        time.sleep(0.05)
+        nested = pool.get_connection()   # e.g. a catalogue cache miss inside a handler
+        nested.close()
+        return True
+
+    async def burst():
+        db = api.AsyncPool()
+        return await asyncio.gather(*(db.run(work) for _ in range(4)))
+
+    assert asyncio.run(burst()) == [True] * 4
+    assert small.stats()["exhausted"] == 0
+    small.close_all()
@@ -0,0 +1,103 @@
+"""
+The availability index must answer exactly like the SQL overlap predicate
+(repository.has_overlap) for every window, including touching, contained,
+zero-length and inverted ones, before and after write-through updates.
+"""
+import datetime
+
+import availability
+import booking
+import repository
+from availability import AvailabilityIndex, get_index
+
+BASE_DATE = datetime.date.today() + datetime.timedelta(days=400)
+# Every quarter hour from 08:00 to 13:00 as start and as end: touching,
+# containing, zero-length (start == end) and inverted (start > end) windows
+GRID = [datetime.timedelta(minutes=m) for m in range(8 * 60, 13 * 60 + 1, 15)]
+
+
+def _time(text):
+    return datetime.time.fromisoformat(text)
+
+
+def _insert(kind, name, date, rows):
+    """
+    Store raw rows (no validation, like legacy data) and return their ids.
+    """
+    conn = repository.connect()
+    try:
+        ids = [repository.insert_booking(conn, kind, "tester", name, "1st", date, _time(start), _time(end),
+                                         "", "parity") for start, end in rows]
+        conn.commit()
+    finally:
+        conn.close()
+    return ids
+
+
+def assert_parity(index, kind, name, date):
+    conn = repository.connect()
+    try:
+        for start in GRID:
+            for end in GRID:
+                sql_free = not repository.has_overlap(conn, kind, name, date, start, end)
+                assert index.is_free(kind, name, date, start, end) == sql_free, (kind, name, str(start), str(end))
+    finally:
+        conn.close()
+
+
+def test_touching_boundaries():
+    date = BASE_DATE
+    _insert("classroom", "P-touch", date, [("09:00", "10:00"), ("10:00", "11:00")])
+    index = AvailabilityIndex(ttl=float("inf"))
+
+    assert_parity(index, "classroom", "P-touch", date)
+    assert index.is_free("classroom", "P-touch", date, _time("08:00"), _time("09:00"))
+    assert index.is_free("classroom", "P-touch", date, _time("11:00"), _time("12:00"))
+    assert not index.is_free("classroom", "P-touch", date, _time("10:45"), _time("11:15"))
+
+
+def test_containment():
+    date = BASE_DATE + datetime.timedelta(days=1)
+    # Legacy lab rows were never validated and may overlap each other
+    _insert("lab", "P-contain", date, [("09:00", "12:00"), ("10:00", "10:30")])
+    index = AvailabilityIndex(ttl=float("inf"))
+
+    assert_parity(index, "lab", "P-contain", date)
+    assert not index.is_free("lab", "P-contain", date, _time("11:00"), _time("11:30"))   # inside a booking
+    assert not index.is_free("lab", "P-contain", date, _time("08:00"), _time("13:00"))   # around both
+
+
+def test_zero_length_and_degenerate_rows():
+    date = BASE_DATE + datetime.timedelta(days=2)
+    _insert("lab", "P-degenerate", date, [("10:00", "10:00"), ("12:00", "11:00")])
+    index = AvailabilityIndex(ttl=float("inf"))
+
+    assert_parity(index, "lab", "P-degenerate", date)
+    assert not index.is_free("lab", "P-degenerate", date, _time("09:30"), _time("10:30"))
+    assert index.is_free("lab", "P-degenerate", date, _time("11:15"), _time("11:45"))
+
+
+def test_add_and_remove_after_load(monkeypatch):
+    date = BASE_DATE + datetime.timedelta(days=3)
+    kind, name = "classroom", "P-write"
+    (long_id,) = _insert(kind, name, date, [("09:00", "12:00")])
+    # Never re-validated, so every answer below comes from write-through updates
+    monkeypatch.setattr(availability, "_index", AvailabilityIndex(ttl=float("inf")))
+    index = get_index()
+    assert not index.is_free(kind, name, date, _time("10:00"), _time("11:00"))   # loads the day
+
+    conn = repository.connect()
+    try:
+        booking.reserve(conn, kind, "tester", name, "1st", date, _time("12:00"), _time("12:30"), "0:30:00", "added")
+        assert_parity(index, kind, name, date)
+
+        booking.request_cancellation(conn, kind, long_id, "tester", "parity")
+        (request,) = [r for r in repository.pending_queue(conn, kind, resource=name) if r["booking_id"] == long_id]
+        conn.rollback()
+        assert booking.approve_cancellations(conn, kind, [request["request_id"]]) == (1, 1)
+    finally:
+        conn.close()
+
+    assert_parity(index, kind, name, date)
+    assert index.is_free(kind, name, date, _time("10:00"), _time("11:00"))
+    assert not index.is_free(kind, name, date, _time("12:15"), _time("13:00"))
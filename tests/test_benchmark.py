@@ -0,0 +1,23 @@
+"""
+The benchmark generator only wipes databases it was told it may wipe.
+"""
+import datetime
+
+import pytest
+
+import benchmark
+
+
+def test_generate_refuses_a_database_with_archived_bookings(scratch_backend):
+    conn = scratch_backend.connect()
+    try:
+        conn.cursor().execute("""
+            INSERT INTO bookings_archive (id, username, room_name, floor, date, start_time, end_time)
+            VALUES (1, 'old', 'Room 1', '1st', %s, '09:00:00', '10:00:00')
+        """, (datetime.date(2020, 1, 6),))
+        conn.commit()
+        with pytest.raises(ValueError, match="bookings_archive"):
+            benchmark.generate(conn, floors=1, rooms_per_floor=1, labs=1, teachers=1, days=1, per_day=1,
+                               pending=0, log=lambda _: None)
+    finally:
+        conn.close()
@@ -0,0 +1,28 @@
+"""
+No query the app issues may fall back to a full table scan (explain_check.py)
+on a migrated, seeded database.
+"""
+import benchmark
+import explain_check
+
+
+def test_no_query_scans_a_whole_table(scratch_backend):
+    conn = scratch_backend.connect()
+    try:
+        benchmark.generate(conn, floors=2, rooms_per_floor=5, labs=3, teachers=10, days=30, per_day=4,
+                           pending=20, log=lambda _: None)
+        assert explain_check.full_scans(conn, backend=scratch_backend) == []
+    finally:
+        conn.close()
+
+
+def test_aliased_scans_are_reported_by_table(scratch_backend):
+    conn = scratch_backend.connect()
+    try:
+        queries = [
+            ("aliased", "SELECT * FROM bookings b WHERE b.description = %s", ("x",), False),
+            ("derived", "SELECT * FROM (SELECT id FROM bookings WHERE id > %s) AS page ORDER BY id", (1,), False),
+        ]
+        assert explain_check.full_scans(conn, queries, backend=scratch_backend) == [("aliased", "bookings")]
+    finally:
+        conn.close()
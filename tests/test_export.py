@@ -0,0 +1,93 @@
+"""
+Bulk import of exported files: bookings get new ids and their cancellation
+requests follow them through the id map.
+"""
+import csv
+import datetime
+
+import pytest
+
+import catalog
+import export
+import repository
+
+DATE = (datetime.date.today() + datetime.timedelta(days=700)).isoformat()
+BOOKING_COLUMNS = ["id", "username", "room_name", "floor", "date", "start_time", "end_time", "duration", "description"]
+REQUEST_COLUMNS = ["id", "booking_id", "teacher_username", "reason", "status", "created_at"]
+
+
+@pytest.fixture(scope="module", autouse=True)
+def resources():
+    catalog.add_classroom("E-101", "1st", 30, "")
+
+
+def _write(path, columns, rows):
+    with open(path, "w", newline="", encoding="utf-8") as out:
+        writer = csv.writer(out)
+        writer.writerow(columns)
+        writer.writerows(rows)
+    return path
+
+
+def _import(path, table, id_map=None):
+    conn = repository.connect()
+    try:
+        return export.import_file(conn, path, table, id_map=id_map)
+    finally:
+        conn.close()
+
+
+def test_requests_follow_their_bookings_new_ids(tmp_path):
+    bookings = _write(tmp_path / "bookings.csv", BOOKING_COLUMNS, [
+        [90001, "exporter", "E-101", "1st", DATE, "09:00:00", "10:00:00", "1:00:00", "kept"],
+        [90002, "exporter", "E-101", "1st", DATE, "10:00:00", "11:00:00", "1:00:00", "cancelled"],
+    ])
+    requests = _write(tmp_path / "requests.csv", REQUEST_COLUMNS, [
+        [7, 90002, "exporter", "moved", "", ""],             # empty status/created_at: column defaults
+        [8, 99999, "exporter", "gone", "Pending", ""],       # its booking was not exported
+    ])
+
+    id_map = {}
+    assert _import(bookings, "bookings", id_map) == (2, [])
+    assert set(id_map) == {90001, 90002}
+
+    count, rejected = _import(requests, "cancel_requests", id_map)
+    assert count == 1
+    assert [row[1] for row in rejected] == ["booking 99999"]
+
+    conn = repository.connect()
+    try:
+        (row,) = repository.fetch_all(conn, "test_imported_requests", (id_map[90002],), sql="""
+            SELECT b.description, c.status, c.created_at
+            FROM cancel_requests c JOIN bookings b ON b.id = c.booking_id
+            WHERE c.booking_id = %s
+        """)
+    finally:
+        conn.close()
+    description, status, created_at = row
+    assert description == "cancelled"
+    assert status == "Pending" and created_at is not None
+
+
+def test_requests_need_the_id_map(tmp_path):
+    requests = _write(tmp_path / "requests.csv", REQUEST_COLUMNS, [[1, 1, "exporter", "", "Pending", ""]])
+    with pytest.raises(ValueError):
+        _import(requests, "cancel_requests")
+
+
+def test_invalid_bookings_are_rejected_and_history_is_allowed(tmp_path):
+    past = (datetime.date.today() - datetime.timedelta(days=30)).isoformat()
+    bookings = _write(tmp_path / "bookings.csv", BOOKING_COLUMNS, [
+        [1, "exporter", "E-101", "1st", past, "09:00:00", "10:00:00", "1:00:00", "history"],
+        [2, "exporter", "No-Such-Room", "1st", DATE, "09:00:00", "10:00:00", "1:00:00", ""],
+        [3, "exporter", "E-101", "1st", DATE, "14:00:00", "14:00:00", "0:00:00", "zero length"],
+        [4, "exporter", "E-101", "1st", DATE, "14:00:00", "14:00:00", "0:00:00", "zero length"],
+        [5, "exporter", "E-101", "1st", "", "15:00:00", "16:00:00", "1:00:00", "no date"],
+    ])
+
+    id_map = {}
+    count, rejected = _import(bookings, "bookings", id_map)
+    assert count == 1 and set(id_map) == {1}
+    assert [row[4] for row in rejected[:3]] == ["Unknown classroom.", "End time must be after start time.",
+                                                "End time must be after start time."]
+    assert rejected[3][4].startswith("Unreadable row")
@@ -0,0 +1,58 @@
+"""
+Migrations upgrade databases created before them and can be re-run after
+failing half-way.
+"""
+import DB
+import migrations
+
+
+def _migrate(backend):
+    conn = backend.connect()
+    try:
+        return migrations.migrate(conn, log=lambda _: None, backend=backend)
+    finally:
+        conn.close()
+
+
+def test_pre_migration_lab_requests_are_upgraded(tmp_path):
+    backend = DB.SQLiteBackend(str(tmp_path / "legacy.db"))
+    conn = backend.connect()
+    try:
+        cursor = conn.cursor()
+        cursor.execute("""
+            CREATE TABLE cancel_lab_requests (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                lab_booking_id INT NOT NULL,
+                teacher_username VARCHAR(100) NOT NULL,
+                reason TEXT,
+                status VARCHAR(20) NOT NULL DEFAULT 'Pending'
+            )
+        """)
+        cursor.execute("INSERT INTO cancel_lab_requests (lab_booking_id, teacher_username) VALUES (7, 'old')")
+        conn.commit()
+    finally:
+        conn.close()
+
+    assert _migrate(backend) == migrations.MIGRATIONS[-1][0]
+    conn = backend.connect()
+    try:
+        cursor = conn.cursor()
+        assert backend.has_index(cursor, "cancel_lab_requests", "ix_cancel_lab_requests_booking")
+        cursor.execute("SELECT booking_id FROM cancel_lab_requests")
+        assert cursor.fetchall() == [(7,)]
+    finally:
+        conn.close()
+
+
+def test_half_applied_migration_is_rerun(tmp_path):
+    backend = DB.SQLiteBackend(str(tmp_path / "half.db"))
+    latest = _migrate(backend)
+    conn = backend.connect()
+    try:
+        # As if every index migration's steps ran but recording them failed
+        conn.cursor().execute("DELETE FROM schema_migrations WHERE version >= 2")
+        conn.commit()
+    finally:
+        conn.close()
+
+    assert _migrate(backend) == latest
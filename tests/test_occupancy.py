@@ -0,0 +1,49 @@
+"""
+The occupancy grid: one row per room and floor, rebuilt after bookings or
+the catalogue change.
+"""
+import datetime
+
+import pandas as pd
+
+import booking
+import catalog
+import occupancy
+import repository
+
+FIRST = datetime.date.today() + datetime.timedelta(days=800)
+
+
+def _bookings(*rows):
+    return pd.DataFrame(list(rows), columns=["kind", "floor", "resource", "date", "start_time", "end_time"])
+
+
+def test_rooms_with_the_same_name_on_two_floors():
+    rows = pd.MultiIndex.from_tuples([("classroom", "1st", "Room 1"), ("classroom", "2nd", "Room 1"),
+                                      ("lab", "1st", "Lab 1")], names=["kind", "floor", "resource"])
+    grid = occupancy.build_grid(_bookings(
+        ("classroom", "2nd", "Room 1", FIRST, "09:00:00", "10:00:00"),
+        ("lab", None, "Lab 1", FIRST, "08:00:00", "08:30:00"),          # no floor: matched by its unique name
+    ), rows, FIRST, FIRST)
+
+    day = grid[FIRST]
+    assert day.loc[("classroom", "1st", "Room 1")].sum() == 0
+    assert list(day.loc[("classroom", "2nd", "Room 1"), ["09:00", "09:30", "10:00"]]) == [1, 1, 0]
+    assert day.loc[("lab", "1st", "Lab 1"), "08:00"] == 1
+
+
+def test_grid_follows_catalogue_and_booking_writes():
+    grid = occupancy.occupancy_grid(FIRST, FIRST)
+    assert ("classroom", "3rd", "O-301") not in grid.index
+
+    catalog.add_classroom("O-301", "3rd", 20, "")
+    grid = occupancy.occupancy_grid(FIRST, FIRST)
+    assert grid.loc[("classroom", "3rd", "O-301")].sum() == 0
+
+    conn = repository.connect()
+    try:
+        booking.reserve(conn, "classroom", "tester", "O-301", "3rd", FIRST, datetime.time(9), datetime.time(10),
+                        "1:00:00", "grid")
+    finally:
+        conn.close()
+    assert occupancy.occupancy_grid(FIRST, FIRST).loc[("classroom", "3rd", "O-301"), (FIRST, "09:00")] == 1
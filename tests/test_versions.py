@@ -0,0 +1,51 @@
+"""
+Data versions move after every committed write, and cached() results follow them.
+"""
+import datetime
+
+import booking
+import repository
+import versions
+
+DATE = datetime.date.today() + datetime.timedelta(days=600)
+
+
+def _version(scopes):
+    conn = repository.connect()
+    try:
+        return versions.current(conn, scopes, DATE, DATE)
+    finally:
+        conn.close()
+
+
+def test_booking_bumps_each_kind_after_commit():
+    before = {kind: _version([kind]) for kind in repository.KINDS}
+    conn = repository.connect()
+    try:
+        booking.reserve_together(conn, "tester", [("lab", "V-Lab", "1st"), ("classroom", "V-101", "1st")], DATE,
+                                 datetime.time(9), datetime.time(10), "1:00:00", "versions")
+        assert not conn.in_transaction   # the bump committed its own short transaction
+    finally:
+        conn.close()
+    assert {kind: _version([kind]) for kind in repository.KINDS} == {kind: v + 1 for kind, v in before.items()}
+
+
+def test_cached_reloads_after_a_write():
+    loads = []
+
+    def load(conn):
+        loads.append(1)
+        return repository.fetch_all(conn, "day_bookings", (DATE, DATE))
+
+    first = versions.cached("test_day", list(repository.KINDS), DATE, DATE, load)
+    assert versions.cached("test_day", list(repository.KINDS), DATE, DATE, load) == first
+    assert len(loads) == 1
+
+    conn = repository.connect()
+    try:
+        booking.reserve(conn, "classroom", "tester", "V-102", "1st", DATE, datetime.time(11), datetime.time(12),
+                        "1:00:00", "versions")
+    finally:
+        conn.close()
+    assert len(versions.cached("test_day", list(repository.KINDS), DATE, DATE, load)) == len(first) + 1
+    assert len(loads) == 2
@@ -0,0 +1,180 @@
+"""
+Data versions: change counters that let pages reuse their query results.
+
+Every write path bumps a counter per (scope, date) in `data_versions` right
+after its transaction commits:
+
+    classroom, lab                     bookings on that date were inserted or
+                                       deleted (cancellation, archival)
+    classroom_requests, lab_requests   a cancellation request was sent or
+                                       processed (keyed by the day of the change)
+
+Counters only ever grow, so their sum over a set of scopes and a date range
+changes whenever anything in it does. current() reads that sum with one
+primary-key range query, and cached() reruns a page's queries only when it
+moves. Cached entries also expire after VERSION_CACHE_TTL, as a safety net
+for rows changed outside the app (manual SQL).
+
+Bumping after the commit, in a short transaction of its own, keeps the
+version rows out of the write's locks: bookings of different rooms on the
+same date never wait on each other's counter. Readers read the version
+before loading, so a bump that lands after the commit costs at most one
+extra reload, never a stale result.
+"""
+import datetime
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import DB
+import repository
+
+MAX_CACHED_RESULTS = int(os.environ.get("BMC_VERSION_CACHE_SIZE", "256"))
+VERSION_CACHE_TTL = float(os.environ.get("BMC_VERSION_CACHE_TTL", "300"))   # seconds
+
+# Bounds for open-ended ranges (valid DATE values on every backend)
+FIRST_DATE = datetime.date(1000, 1, 1)
+LAST_DATE = datetime.date(9999, 12, 31)
+
+
+def requests_scope(kind):
+    return f"{kind}_requests"
+
+
+_upserts = {}
+
+
+def _upsert_sql():
+    backend = DB.get_backend()
+    if id(backend) not in _upserts:
+        _upserts[id(backend)] = backend.upsert_add("data_versions", ("scope", "date"), ("version",))
+    return _upserts[id(backend)]
+
+
+# =========================================================
+# COUNTERS
+# =========================================================
+_bump_failures = 0
+
+
+def bump(conn, changes):
+    """
+    Bump the version of every (scope, date) in `changes` and commit. Call it
+    right after the write it announces has committed.
+
+    Rows are bumped in sorted order, so concurrent bumps lock them in the
+    same order and cannot deadlock. A failed bump is rolled back and counted
+    (stats()) rather than raised: the write itself is already committed, and
+    cached results still expire after VERSION_CACHE_TTL.
+    """
+    global _bump_failures
+    rows = [(scope, date, 1) for scope, date in sorted(set(changes), key=lambda c: (c[0], str(c[1])))]
+    if not rows:
+        return
+    try:
+        repository.run_many(conn, "data_version_bump", rows, sql=_upsert_sql())
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        _bump_failures += 1
+
+
+def current_sql(scope_count):
+    """
+    Sum of the versions of `scope_count` scopes between two dates (see current()).
+    """
+    return f"""
+        SELECT COALESCE(SUM(version), 0) FROM data_versions
+        WHERE scope IN ({", ".join(["%s"] * scope_count)}) AND date BETWEEN %s AND %s
+    """
+
+
+def current(conn, scopes, first=None, last=None):
+    """
+    Version of `scopes` over [first, last] (open-ended where None), as one integer.
+    """
+    (version,) = repository.fetch_one(conn, f"data_version_{len(scopes)}",
+                                      (*scopes, first or FIRST_DATE, last or LAST_DATE),
+                                      sql=current_sql(len(scopes)))
+    return int(version)
+
+
+# =========================================================
+# RESULT CACHE
+# =========================================================
+class VersionedCache:
+    """
+    Thread-safe LRU of loaded results, each stored with the data version it
+    was loaded at; a lookup with any other version (or after `ttl`) reloads.
+    """
+
+    def __init__(self, max_entries=MAX_CACHED_RESULTS, ttl=VERSION_CACHE_TTL):
+        self._max_entries = max_entries
+        self._ttl = ttl
+        self._entries = OrderedDict()   # key -> (version, loaded_at, value)
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+
+    def get(self, key, version, load):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == version and time.monotonic() - entry[1] < self._ttl:
+                self._entries.move_to_end(key)
+                self._hits += 1
+                return entry[2]
+            self._misses += 1
+
+        value = load()
+        with self._lock:
+            self._entries[key] = (version, time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+        return value
+
+    def invalidate(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self._hits, "misses": self._misses}
+
+
+_cache = VersionedCache()
+
+
+def cached(key, scopes, first, last, load):
+    """
+    Result of load(conn) for `key`, reused while the version of `scopes`
+    over [first, last] is unchanged; shared by every session in the process.
+
+    The version is read before loading, so a write that races with the load
+    costs one extra reload later, never a stale result.
+    """
+    conn = repository.connect()
+    try:
+        version = current(conn, scopes, first, last)
+        return _cache.get((key, tuple(scopes), first, last), version, lambda: load(conn))
+    finally:
+        conn.close()
+
+
+def minute_of(date=None):
+    """
+    Extra cache key for results filtered to upcoming bookings: the current
+    minute when they cover today (finished bookings drop off as time passes),
+    None for future dates.
+    """
+    now = datetime.datetime.now()
+    return now.strftime("%H:%M") if date is None or date <= now.date() else None
+
+
+def stats():
+    return {**_cache.stats(), "bump_failures": _bump_failures}
+
+
+def invalidate():
+    _cache.invalidate()